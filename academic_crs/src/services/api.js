@@ -27,3 +27,45 @@ export const askQuestion = async (question, context, openrouter_key, serper_key)
   });
   return res.data;
 };
+
+export const runPipeline = async (profile, openrouter_key, serper_key) => {
+  const res = await axios.post(`${API_BASE}/run-pipeline`, {
+    profile,
+    openrouter_key,
+    serper_key,
+  });
+  return res.data;
+};
+
+// Server-side sessions: after createSession, pass sessionId instead of
+// re-sending the profile and earlier results with every request.
+export const createSession = async (profile) => {
+  const res = await axios.post(`${API_BASE}/sessions`, { profile });
+  return res.data.session_id;
+};
+
+export const updateSession = async (sessionId, { profile = {}, results = {} } = {}) => {
+  const res = await axios.patch(`${API_BASE}/sessions/${sessionId}`, { profile, results });
+  return res.data;
+};
+
+export const runAgentInSession = async (sessionId, step, delta, openrouter_key, serper_key) => {
+  const res = await axios.post(`${API_BASE}/run-agent`, {
+    step,
+    session_id: sessionId,
+    profile: delta || {},
+    openrouter_key,
+    serper_key,
+  });
+  return res.data;
+};
+
+export const askQuestionInSession = async (sessionId, question, openrouter_key, serper_key) => {
+  const res = await axios.post(`${API_BASE}/qa`, {
+    question,
+    session_id: sessionId,
+    openrouter_key,
+    serper_key,
+  });
+  return res.data;
+};
@@ -1,42 +1,27 @@
 # agents.py
-import os
+from typing import Any, Dict
 from crewai import Agent, Task, Crew, LLM
-from crewai_tools import SerperDevTool, ScrapeWebsiteTool
 
+from llm_cache import CachedLLM, ScheduledLLM, llm_response_cache
+from tools import BatchSearchTool, CachedScrapeTool, CatalogLookupTool, SerperSearchTool
 
-def create_agents_and_tasks(
-    openrouter_api_key: str, 
-    serper_api_key: str, 
-    llm_model_name: str = "openrouter/mistralai/devstral-2512:free",
-    agent_settings: dict = None
-):
-    os.environ["OPENROUTER_API_KEY"] = openrouter_api_key
-    os.environ["SERPER_API_KEY"] = serper_api_key
+DEFAULT_MODEL_NAME = "openrouter/mistralai/devstral-2512:free"
+DEFAULT_EXTRACTOR_MODEL_NAME = "openrouter/meta-llama/llama-3.3-70b-instruct:free"
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
-    serper_tool = SerperDevTool()
-    scrape_tool = ScrapeWebsiteTool()
-
-    # Helper to fetch settings safely with defaults
-    settings = agent_settings or {}
-
-    # Auto-fix: Prepend 'openrouter/' if missing but looks like a vendor/model string
-    if not llm_model_name.startswith("openrouter/") and "/" in llm_model_name and "gpt" not in llm_model_name:
-        llm_model_name = f"openrouter/{llm_model_name}"
+# Stage names in pipeline order; the index is the `step` used by /run-agent.
+PIPELINE_STAGES = ["normalizer", "matcher", "specialist", "scholarship", "reviews"]
 
-    # Main LLM
-    llm = LLM(
-        model=llm_model_name,
-        temperature=settings.get("temperature", 0.1),
-        base_url="https://openrouter.ai/api/v1",
-        api_key=openrouter_api_key,
-    )
+# Agent and task definitions live at module level so they are assembled once
+# per process instead of on every request. `tools` holds tool names that are
+# resolved against the dict returned by `create_tools`.
 
-    # =========================
-    # NORMALIZER AGENT (kept, but verbose off)
-    # =========================
-    normalizer_agent = Agent(
-        role="Search-Optimized Data Normalizer",
-        goal="""Clean and standardize student profile data for optimal university search queries.
+# =========================
+# NORMALIZER AGENT (kept, but verbose off)
+# =========================
+NORMALIZER_AGENT = dict(
+    role="Search-Optimized Data Normalizer",
+    goal="""Clean and standardize student profile data for optimal university search queries.
 
 You will receive a JSON-like profile object that MAY contain:
 - academic_level (e.g., "high_school", "undergraduate", "postgraduate", "working_professional")
@@ -70,24 +55,22 @@ CRITICAL RULES:
 - Include all fields with meaningful values, even if brief
 - Focus on data that helps create precise search queries like "University Program international tuition 2024"
 - **FLATTEN OBJECTS**: Ensure `competitive_exams` is a list of strings, NOT objects.""",
-        backstory="""You are a data quality specialist focused on optimizing student profiles for accurate university searches.
+    backstory="""You are a data quality specialist focused on optimizing student profiles for accurate university searches.
 You understand how search engines work and ensure data consistency that leads to better match results.
 You prioritize search relevance over presentation aesthetics.""",
-        tools=[],
-        llm=llm,
-        verbose=False,
-    )
+    tools=[],
+)
 
-    # =========================
-    # MATCHER AGENT (OPTIMIZED)
-    # =========================
-    matcher_agent = Agent(
+# =========================
+# MATCHER AGENT (OPTIMIZED)
+# =========================
+MATCHER_AGENT = dict(
     role="University Matcher",
     goal="""
 Recommend accurate university–program matches using REAL data from Serper search. Output MUST be a valid JSON array.
 
 CRITICAL RULES FOR ACCURACY:
-- Use Serper 1–3 times max; reuse results.
+- Use Serper 1–3 times max; reuse results. Prefer ONE batch search call with all your queries.
 - **NO HALLUCINATIONS**: Do NOT invent fees or programs. Only use info found in snippets. If exact fee not found, state "Not available". DO NOT ESTIMATE OR RANDOMIZE FEES.
 - **BUDGET & ACHIEVABILITY**: Prioritize programs that actually fit the student's budget and academic profile (GPA, exams). If a university is too expensive or competitive (e.g., Ivy League without SATs), do not recommend it unless explicitly asked, and label it as "High Reach".
 - Undergrad students → recommend Bachelor programs.
@@ -97,6 +80,9 @@ CRITICAL RULES FOR ACCURACY:
 - **FEEDBACK HANDLING**: If `user_feedback` is provided, YOU MUST prioritize it. If the user specifies a Rank (e.g. "JEE Rank 1500") or Budget, ONLY recommend options that realistically accept that rank/budget. Do NOT ignore constraints.
 
 SEARCH BEHAVIOR:
+- FIRST look up the local program catalog (e.g. "MS Computer Science Germany"). Use its entries as real data,
+  and only search with Serper for programs or details it does not have or marks as outdated.
+  For a program taken from the catalog without re-checking it, keep its "updated" value in the object.
 - Form precise queries like:
   "<University> <Program> duration tuition fees 2024" (Use 'international' ONLY if studying abroad)
   "<Program> colleges in <Location> fees"
@@ -124,17 +110,15 @@ Example structure:
 ]
 """,
     backstory="You provide verified, budget-aware study-abroad recommendations. You are realistic about admission chances.",
-    tools=[serper_tool],
-    llm=llm,
-    verbose=False,
+    tools=["catalog", "batch_search", "serper"],
 )
 
-    # =========================
-    # SPECIALIST AGENT (OPTIMIZED – no tools)
-    # =========================
-    specialist_agent = Agent(
-        role="University Program Specialist",
-        goal="""
+# =========================
+# SPECIALIST AGENT (OPTIMIZED – no tools)
+# =========================
+SPECIALIST_AGENT = dict(
+    role="University Program Specialist",
+    goal="""
 From the matcher's results, evaluate and rank the top programs (aim for top 5–6),
 whether they are undergraduate or postgraduate.
 
@@ -159,23 +143,22 @@ explaining which one or two programs are the best fit and WHY.
 You MUST base all facts on the matcher's output; do NOT invent new hard facts or fees.
 exact fee numbers or admission cutoffs. Be critical about "Reach" schools.
 If `user_feedback` is provided, ensure the ranking and explanation directly address the user's concerns.""",
-        backstory="""
+    backstory="""
 You are a highly experienced academic consultant specializing in global university programs,
 rankings, ROI, graduate outcomes, and curriculum evaluation. You help students understand which
 programs suit their goals, budget, and interests, while explaining trade-offs clearly.""",
-        tools=[],  # no extra web calls here – just reason over matcher output
-        llm=llm,
-        verbose=False,
-    )
+    tools=[],  # no extra web calls here – just reason over matcher output
+)
 
-    # =========================
-    # SCHOLARSHIP AGENT (OPTIMIZED)
-    # =========================
-    scholarship_agent = Agent(
-        role="Scholarship Finder",
-        goal="""Find at least 3-5 relevant scholarships based on the student profile and top-ranked universities.
+# =========================
+# SCHOLARSHIP AGENT (OPTIMIZED)
+# =========================
+SCHOLARSHIP_AGENT = dict(
+    role="Scholarship Finder",
+    goal="""Find at least 3-5 relevant scholarships based on the student profile and top-ranked universities.
 
 Adapt to both undergraduate and postgraduate cases.
+Run your searches (per university and general funding) together in ONE batch search call.
 
 Provide a concise overview of 3-5 good funding opportunities. Do NOT stop after just one.
 For each scholarship, include:
@@ -191,25 +174,23 @@ If you cannot find good matches, say so honestly and suggest general funding str
 OUTPUT RULES:
 - Return the Final Answer as a clean, formatted list.
 - STOP immediately after providing the list. Do NOT output internal thoughts, "Observation:", or "Thought:" after the final answer.""",
-        backstory="""You are a funding advisor with access to global scholarship data.
+    backstory="""You are a funding advisor with access to global scholarship data.
 You excel at surfacing accurate, recent opportunities that match the student's profile.
 You communicate funding options in an encouraging, practical way using natural language.""",
-        # Keep Serper for light search, drop Scrape to avoid heavy scraping
-        tools=[serper_tool],
-        llm=llm,
-        verbose=False,
-    )
+    # Keep Serper for light search, drop Scrape to avoid heavy scraping
+    tools=["batch_search", "serper"],
+)
 
-    # =========================
-    # REVIEWS AGENT (OPTIMIZED)
-    # =========================
-    reviews_agent = Agent(
-        role="Reviews Collector",
-        goal="""Gather a brief, balanced review summary for the top-ranked universities/programs
+# =========================
+# REVIEWS AGENT (OPTIMIZED)
+# =========================
+REVIEWS_AGENT = dict(
+    role="Reviews Collector",
+    goal="""Gather a brief, balanced review summary for the top-ranked universities/programs
 (undergraduate or postgraduate).
 
 Use a small number of credible sources (forums, student platforms, review sites).
-Avoid over-searching; find patterns, not exhaustiveness.
+Avoid over-searching; find patterns, not exhaustiveness. Search for all universities in ONE batch search call.
 
 For each recommended program/university, provide:
 - Overall Sentiment (Positive/Mixed/Negative)
@@ -219,20 +200,18 @@ For each recommended program/university, provide:
 
 Be concise and avoid long essays. Do NOT fabricate precise statistics or fake quotes.
 Do NOT include citation markers (e.g. [REF], [1]) in the output.""",
-        backstory="""You are a student experience researcher who specializes in finding balanced,
+    backstory="""You are a student experience researcher who specializes in finding balanced,
 multi-source reviews. You avoid bias and provide a reliable picture of academic and campus life.
 You share insights in an engaging, relatable way that helps students understand what to expect.""",
-        tools=[serper_tool],
-        llm=llm,
-        verbose=False,
-    )
+    tools=["batch_search", "serper"],
+)
 
-    # =========================
-    # Q&A AGENT (KEPT, slight tightening)
-    # =========================
-    qa_agent = Agent(
-        role="Application Guide & Consultant",
-        goal="""Answer student questions clearly and professionally based on research context.
+# =========================
+# Q&A AGENT (KEPT, slight tightening)
+# =========================
+QA_AGENT = dict(
+    role="Application Guide & Consultant",
+    goal="""Answer student questions clearly and professionally based on research context.
 
 CRITICAL OUTPUT RULES:
 1. **STRICT MARKDOWN**: Use `##` for headers. Use `-` for bullet points.
@@ -241,18 +220,43 @@ CRITICAL OUTPUT RULES:
 4. **DIRECT ANSWER**: Start with a direct answer.
 5. **NO META-TALK**: Do not output "Thought:", "Action:", or "I will now answer".
 6. **ACCURACY**: Use the provided context. If info is missing, search for it.""",
-        backstory="""You are a friendly and articulate academic counselor. You excel at explaining complex university details in simple, structured, and easy-to-read formats.""",
-        tools=[serper_tool, scrape_tool],
-        llm=llm,
-        verbose=False,
-    )
+    backstory="""You are a friendly and articulate academic counselor. You excel at explaining complex university details in simple, structured, and easy-to-read formats.""",
+    tools=["serper", "scrape"],
+)
+
+# =========================
+# PROFILE EXTRACTOR AGENT (UNCHANGED, LLM-BASED)
+# =========================
+PROFILE_EXTRACTOR_AGENT = dict(
+    role="Profile Information Extractor",
+    goal="""Extract and structure student profile information from natural language text
+for ANY academic level (high-school, undergraduate, postgraduate, working professional).
 
-    # =========================
-    # TASKS (SHORTENED DESCRIPTIONS → SPEED)
-    # =========================
+Identify all relevant details about the student's background, goals, and preferences.
+Provide accurate, complete extraction with proper validation, but do NOT invent values.
+
+If the input text is too vague to determine at least an academic level and a subject/career goal, you MUST ask a follow-up question in the `missing_info` field.
+
+OUTPUT:
+Return ONLY a single valid JSON object with keys such as:
+student_name, academic_level, current_degree, graduation_year, board, class12_score,
+cgpa, competitive_exams (list of strings, e.g. ["Exam: Score"], NOT objects), career_goal, preferred_locations, budget, specialization,
+intended_degree_level, missing_info.
+
+IMPORTANT: Include ONLY keys for fields where the user has provided information. Do NOT include keys with null, "unknown", or empty values (except `missing_info` if needed).
+If info is missing, set "missing_info" to a string containing the follow-up question. Do not output markdown formatting.""",
+    backstory="""You are an expert at analyzing student profiles and extracting structured information.
+You carefully parse text to identify academic background, test scores, career goals, financial constraints,
+and country/field preferences.""",
+    tools=[],
+)
 
-    normalize_task = Task(
-        description="""You are given a student profile object under {{profile}} (may include structured fields and raw text).
+# =========================
+# TASKS (SHORTENED DESCRIPTIONS → SPEED)
+# =========================
+
+NORMALIZE_TASK = dict(
+    description="""You are given a student profile object under {{profile}} (may include structured fields and raw text).
 Clean it, standardize the key fields, and produce a search-optimized JSON output.
 
 Focus on:
@@ -263,43 +267,39 @@ Focus on:
 5. **Context Preservation**: Keep competitive exam details and specific scores
 
 Return ONLY a valid JSON object with standardized profile fields. No markdown formatting, no bold text, no explanatory content.""",
-        expected_output="""A clean JSON object with standardized profile fields optimized for university search queries.""",
-        agent=normalizer_agent,
-    )
+    expected_output="""A clean JSON object with standardized profile fields optimized for university search queries.""",
+)
 
-    match_universities_task = Task(
-        description="""Use the normalized student profile from {{profile}} and, following your goal as University Matcher,
+MATCH_UNIVERSITIES_TASK = dict(
+    description="""Use the normalized student profile from {{profile}} and, following your goal as University Matcher,
 identify a small set (about 6–8) of the best-fit universities and programs that are achievable and within budget.
 If {{user_feedback}} is provided and not "None", use it to DRASTICALLY refine the search. If the user mentions a specific Rank or Score, filter out universities that require a better rank.
 
 Return ONLY a valid JSON array as specified in your goal.""",
-        expected_output="""A valid JSON array of university-program matches.""",
-        agent=matcher_agent,
-    )
+    expected_output="""A valid JSON array of university-program matches.""",
+)
 
-    rank_programs_task = Task(
-        description="""Analyze the university + program recommendations provided in the 'matched_programs' field within {{profile}}.
+RANK_PROGRAMS_TASK = dict(
+    description="""Analyze the university + program recommendations provided in the 'matched_programs' field within {{profile}}.
 (This field contains the JSON output from the University Matcher).
 
 Evaluate and rank the top ~5 programs, following your specialist goal.
 If {{user_feedback}} is provided and not "None", ensure the ranking reflects these new preferences.
 Keep the output clear, structured, and not excessively long.""",
-        expected_output="""A ranked list of top programs with pros, cons, and a final recommendation summary.""",
-        agent=specialist_agent,
-    )
+    expected_output="""A ranked list of top programs with pros, cons, and a final recommendation summary.""",
+)
 
-    find_scholarships_task = Task(
-        description="""Find scholarships relevant to the student's profile and the ranked programs in {{profile}}.
+FIND_SCHOLARSHIPS_TASK = dict(
+    description="""Find scholarships relevant to the student's profile and the ranked programs in {{profile}}.
 If {{user_feedback}} is provided, prioritize scholarships that align with it.
 
 Provide a small set of the most relevant opportunities, with key details as per your goal.
 Be concise.""",
-        expected_output="""A concise list of relevant scholarships and/or funding options.""",
-        agent=scholarship_agent,
-    )
+    expected_output="""A concise list of relevant scholarships and/or funding options.""",
+)
 
-    collect_reviews_task = Task(
-        description="""Analyze the 'ranked_programs' section (or Specialist Agent output) in {{profile}}.
+COLLECT_REVIEWS_TASK = dict(
+    description="""Analyze the 'ranked_programs' section (or Specialist Agent output) in {{profile}}.
 Identify ONLY the universities and programs that were recommended in that specific list.
 Do NOT fetch reviews for any other universities (e.g. from the broader matcher list).
 
@@ -307,79 +307,121 @@ Gather short, balanced review summaries for ONLY those top-ranked universities/p
 Consider {{user_feedback}} if relevant.
 
 Provide balanced, honest, and concise review overviews, following your goal.""",
-        expected_output="""Brief review summaries for ONLY the universities/programs recommended by the Specialist Agent.""",
-        agent=reviews_agent,
-    )
-
-    crew = Crew(
-        agents=[
-            normalizer_agent,
-            matcher_agent,
-            specialist_agent,
-            scholarship_agent,
-            reviews_agent,
-        ],
-        tasks=[
-            normalize_task,
-            match_universities_task,
-            rank_programs_task,
-            find_scholarships_task,
-            collect_reviews_task,
-        ],
-        verbose=True,  # this is crew-level logging; agents themselves are quieter now
-    )
+    expected_output="""Brief review summaries for ONLY the universities/programs recommended by the Specialist Agent.""",
+)
 
-    return crew, qa_agent, llm  # qa_agent is created above
+AGENT_SPECS = {
+    "normalizer": NORMALIZER_AGENT,
+    "matcher": MATCHER_AGENT,
+    "specialist": SPECIALIST_AGENT,
+    "scholarship": SCHOLARSHIP_AGENT,
+    "reviews": REVIEWS_AGENT,
+    "qa": QA_AGENT,
+    "extractor": PROFILE_EXTRACTOR_AGENT,
+}
+
+TASK_SPECS = {
+    "normalizer": NORMALIZE_TASK,
+    "matcher": MATCH_UNIVERSITIES_TASK,
+    "specialist": RANK_PROGRAMS_TASK,
+    "scholarship": FIND_SCHOLARSHIPS_TASK,
+    "reviews": COLLECT_REVIEWS_TASK,
+}
 
 
 # =========================
-# PROFILE EXTRACTOR AGENT (UNCHANGED, LLM-BASED)
+# BUILDERS
 # =========================
-def create_profile_extractor_agent(
-    openrouter_api_key: str, 
-    llm_model_name: str = "openrouter/meta-llama/llama-3.3-70b-instruct:free",
-    agent_settings: dict = None
-):
-    settings = agent_settings or {}
-
-    # Auto-fix: Prepend 'openrouter/' if missing
+def normalize_model_name(llm_model_name: str) -> str:
+    # Auto-fix: Prepend 'openrouter/' if missing but looks like a vendor/model string
     if not llm_model_name.startswith("openrouter/") and "/" in llm_model_name and "gpt" not in llm_model_name:
         llm_model_name = f"openrouter/{llm_model_name}"
+    return llm_model_name
+
 
-    llm = LLM(
-        model=llm_model_name,
+def create_llm(
+    openrouter_api_key: str,
+    llm_model_name: str = DEFAULT_MODEL_NAME,
+    agent_settings: dict = None,
+    stream: bool = False
+):
+    settings = agent_settings or {}
+    # The response cache is opt-in (CRS_LLM_CACHE_STAGES); both go through the upstream scheduler
+    llm_class = CachedLLM if llm_response_cache.enabled else ScheduledLLM
+    return llm_class(
+        model=normalize_model_name(llm_model_name),
         temperature=settings.get("temperature", 0.1),
-        base_url="https://openrouter.ai/api/v1",
+        base_url=OPENROUTER_BASE_URL,
         api_key=openrouter_api_key,
+        stream=stream,
     )
 
-    profile_extractor_agent = Agent(
-        role="Profile Information Extractor",
-        goal="""Extract and structure student profile information from natural language text
-for ANY academic level (high-school, undergraduate, postgraduate, working professional).
-
-Identify all relevant details about the student's background, goals, and preferences.
-Provide accurate, complete extraction with proper validation, but do NOT invent values.
 
-If the input text is too vague to determine at least an academic level and a subject/career goal, you MUST ask a follow-up question in the `missing_info` field.
+def create_tools(serper_api_key: str) -> Dict[str, Any]:
+    """Search/scrape tools by name, as referenced from the agent specs."""
+    serper = SerperSearchTool(api_key=serper_api_key)
+    return {
+        "serper": serper,
+        "batch_search": BatchSearchTool(search_tool=serper),
+        "catalog": CatalogLookupTool(),
+        "scrape": CachedScrapeTool(),
+    }
 
-OUTPUT:
-Return ONLY a single valid JSON object with keys such as:
-student_name, academic_level, current_degree, graduation_year, board, class12_score,
-cgpa, competitive_exams (list of strings, e.g. ["Exam: Score"], NOT objects), career_goal, preferred_locations, budget, specialization,
-intended_degree_level, missing_info.
 
-IMPORTANT: Include ONLY keys for fields where the user has provided information. Do NOT include keys with null, "unknown", or empty values (except `missing_info` if needed).
-If info is missing, set "missing_info" to a string containing the follow-up question. Do not output markdown formatting.""",
-        backstory="""You are an expert at analyzing student profiles and extracting structured information.
-You carefully parse text to identify academic background, test scores, career goals, financial constraints,
-and country/field preferences.""",
-        tools=[],
+def create_agent(stage: str, llm, tools: Dict[str, Any]) -> Agent:
+    spec = dict(AGENT_SPECS[stage])
+    tool_names = spec.pop("tools")
+    return Agent(
+        **spec,
+        tools=[tools[name] for name in tool_names],
         llm=llm,
         verbose=False,
     )
 
-    return profile_extractor_agent
+
+def create_stage_task(stage: str, agent: Agent) -> Task:
+    return Task(**TASK_SPECS[stage], agent=agent)
+
+
+def create_agents_and_tasks(
+    openrouter_api_key: str, 
+    serper_api_key: str, 
+    llm_model_name: str = DEFAULT_MODEL_NAME,
+    agent_settings: dict = None
+):
+    """Build the full five-stage crew plus the QA agent in one go.
+
+    The API endpoints go through `registry.agent_registry` instead, which only
+    builds the stage that is requested and reuses it across requests.
+    """
+    # Credentials are passed explicitly to the LLM and tools; nothing is
+    # written to os.environ, so concurrent requests cannot see each other's keys.
+    tools = create_tools(serper_api_key)
+
+    # Main LLM
+    llm = create_llm(openrouter_api_key, llm_model_name, agent_settings)
+
+    agents = {stage: create_agent(stage, llm, tools) for stage in PIPELINE_STAGES + ["qa"]}
+
+    crew = Crew(
+        agents=[agents[stage] for stage in PIPELINE_STAGES],
+        tasks=[create_stage_task(stage, agents[stage]) for stage in PIPELINE_STAGES],
+        verbose=True,  # this is crew-level logging; agents themselves are quieter now
+    )
+
+    return crew, agents["qa"], llm
+
+
+# =========================
+# PROFILE EXTRACTOR AGENT (UNCHANGED, LLM-BASED)
+# =========================
+def create_profile_extractor_agent(
+    openrouter_api_key: str, 
+    llm_model_name: str = DEFAULT_EXTRACTOR_MODEL_NAME,
+    agent_settings: dict = None
+):
+    llm = create_llm(openrouter_api_key, llm_model_name, agent_settings)
+    return create_agent("extractor", llm, {})
 
 
 def extract_profile_with_llm(profile_extractor_agent, text: str):
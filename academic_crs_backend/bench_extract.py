@@ -0,0 +1,51 @@
+# bench_extract.py
+"""
+Microbenchmark for the regex profile extractor in utils.py.
+
+    python bench_extract.py [--rounds 2000]
+
+Reports per-profile latency and profiles/second for single calls and for the
+`extract_info_from_texts` batch API.
+"""
+import argparse
+import time
+
+import utils
+
+SAMPLE_PROFILES = [
+    "My name is Rahul Sharma. I completed my 12th from CBSE with 92%. JEE Main 95 percentile, BITSAT 300. "
+    "I want to become a software engineer. Budget 20 lakhs. Interested in US, Canada and Germany.",
+    "I am doing B.Tech in computer science, graduating in 2025 with CGPA 8.5/10. I want to pursue MS in USA or UK. "
+    "Specialization in machine learning. My budget is around 40 lakhs.",
+    "Working as a software engineer at TCS with 3 years work experience. Planning an MBA in Singapore or Ireland, "
+    "budget 35 lakhs. My goal is to become a product manager.",
+    "Class XII state board, 480/500 marks. NEET score 600. I want to study medicine in India.",
+    "I finished my bachelor of science in 2023. I aim to be a data scientist. Focus in data science. "
+    "Looking at the Netherlands, France or Australia.",
+]
+
+
+def _bench(label: str, fn, n_profiles: int):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<8} {elapsed / n_profiles * 1e6:8.1f} us/profile  {n_profiles / elapsed:10.0f} profiles/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    texts = SAMPLE_PROFILES * args.rounds
+    # Warm up regex/automaton caches before timing
+    for text in SAMPLE_PROFILES:
+        utils.extract_info_from_text(text)
+
+    _bench("single", lambda: [utils.extract_info_from_text(t) for t in texts], len(texts))
+    if hasattr(utils, "extract_info_from_texts"):
+        _bench("batch", lambda: list(utils.extract_info_from_texts(texts)), len(texts))
+
+
+if __name__ == "__main__":
+    main()
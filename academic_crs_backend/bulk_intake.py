@@ -0,0 +1,145 @@
+# bulk_intake.py
+"""
+Bulk profile intake: rows of a CSV or JSONL upload are run through the
+profile extractor on a fixed number of workers, and one NDJSON line is
+streamed back per row as soon as it finishes.
+
+Rows are read lazily through bounded queues, so only a few rows per worker
+are held at once and memory stays flat however large the upload is.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+BULK_INTAKE_WORKERS = int(os.environ.get("CRS_BULK_INTAKE_WORKERS", "4"))
+# Column (CSV) or key (JSONL) holding the free-text description, in order of preference
+TEXT_FIELDS = ("text", "description", "profile")
+ID_FIELDS = ("id", "student_id", "name")
+
+# (row number, caller-supplied id, text, error)
+Row = Tuple[int, Optional[str], Optional[str], Optional[str]]
+
+
+def _pick(record: Dict[str, Any], fields) -> Optional[str]:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def _iter_csv(stream: io.TextIOBase) -> Iterator[Row]:
+    reader = csv.DictReader(stream)
+    columns = [c.strip().lower() for c in reader.fieldnames or []]
+    reader.fieldnames = columns
+    # Without a known text column, fall back to the first one
+    text_fields = TEXT_FIELDS if any(f in columns for f in TEXT_FIELDS) else tuple(columns[:1])
+    for row_no, record in enumerate(reader, start=1):
+        text = _pick(record, text_fields)
+        yield row_no, _pick(record, ID_FIELDS), text, None if text else "Empty text"
+
+
+def _iter_jsonl(stream: io.TextIOBase) -> Iterator[Row]:
+    row_no = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row_no += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_no, None, None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(record, str):
+            record = {"text": record}
+        if not isinstance(record, dict):
+            yield row_no, None, None, "Expected a JSON object or string"
+            continue
+        text = _pick(record, TEXT_FIELDS)
+        yield row_no, _pick(record, ID_FIELDS), text, None if text else "Empty text"
+
+
+def iter_upload_rows(fileobj: BinaryIO, filename: Optional[str]) -> Iterator[Row]:
+    """Lazily yield the rows of a CSV or JSONL (.jsonl/.ndjson) upload."""
+    stream = io.TextIOWrapper(fileobj, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        if (filename or "").lower().endswith((".jsonl", ".ndjson", ".json")):
+            yield from _iter_jsonl(stream)
+        else:
+            yield from _iter_csv(stream)
+    finally:
+        # Leave the underlying upload open; its owner closes it
+        stream.detach()
+
+
+async def stream_bulk_intake(
+    rows: Iterator[Row],
+    process: Callable[[str], Awaitable[Dict[str, Any]]],
+    workers: int = BULK_INTAKE_WORKERS,
+) -> AsyncIterator[str]:
+    """
+    Run `process(text)` over `rows` on `workers` concurrent workers and yield
+    one NDJSON line per row in completion order, then a summary line.
+    """
+    pending: "asyncio.Queue" = asyncio.Queue(maxsize=workers)
+    done: "asyncio.Queue" = asyncio.Queue(maxsize=workers)
+    summary = {"rows": 0, "succeeded": 0, "failed": 0, "paths": {}}
+    started = time.monotonic()
+
+    async def feed():
+        try:
+            for row in rows:
+                await pending.put(row)
+        except Exception as e:
+            await done.put({"row": None, "id": None, "error": f"Could not read upload: {e}"})
+        finally:
+            for _ in range(workers):
+                await pending.put(None)
+
+    async def work():
+        while True:
+            row = await pending.get()
+            if row is None:
+                break
+            row_no, row_id, text, error = row
+            line: Dict[str, Any] = {"row": row_no, "id": row_id}
+            row_started = time.monotonic()
+            if error is None:
+                try:
+                    line.update(await process(text))
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+            if error is not None:
+                line["error"] = error
+            line["elapsed_ms"] = round((time.monotonic() - row_started) * 1000, 1)
+            await done.put(line)
+        await done.put(None)
+
+    tasks = [asyncio.create_task(feed())] + [asyncio.create_task(work()) for _ in range(workers)]
+    try:
+        running = workers
+        while running:
+            line = await done.get()
+            if line is None:
+                running -= 1
+                continue
+            summary["rows"] += 1
+            if "error" in line:
+                summary["failed"] += 1
+            else:
+                summary["succeeded"] += 1
+                path = line.get("path", "unknown")
+                summary["paths"][path] = summary["paths"].get(path, 0) + 1
+            yield json.dumps(line) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    elapsed = time.monotonic() - started
+    summary["elapsed_s"] = round(elapsed, 2)
+    summary["rows_per_second"] = round(summary["rows"] / elapsed, 2) if elapsed else 0.0
+    yield json.dumps({"summary": summary}) + "\n"
@@ -0,0 +1,132 @@
+# config_store.py
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+CONFIG_FILE = os.environ.get("CRS_CONFIG_FILE", "config.json")
+
+
+class ConfigStore:
+    """
+    In-memory view of the admin config file.
+
+    The file is only re-read when its mtime (or size) changes, and writes go
+    through a temp file plus `os.replace` so readers never see a partial file.
+
+    Layout::
+
+        {"model_name": "...", "stage_models": {"normalizer": "...", "matcher": "..."}}
+
+    `model_name` is the global override; `stage_models` routes individual
+    stages (pipeline stages plus "qa" and "extractor") to their own model.
+    """
+
+    def __init__(self, path: str = CONFIG_FILE):
+        self.path = path
+        self._data: Dict[str, Any] = {}
+        self._version: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+            version = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            version = None
+        if version == self._version:
+            return
+        data: Dict[str, Any] = {}
+        if version is not None:
+            try:
+                with open(self.path, "r") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    data = loaded
+            except (OSError, ValueError) as e:
+                print(f"Could not read {self.path}: {e}")
+        self._data, self._version = data, version
+        self.reloads += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return dict(self._data)
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return self.snapshot().get("model_name") or None
+
+    @property
+    def stage_models(self) -> Dict[str, str]:
+        return dict(self.snapshot().get("stage_models") or {})
+
+    def model_for(self, stage: str, default: str) -> str:
+        """Model for `stage`: its routed model, else the global override, else `default`."""
+        data = self.snapshot()
+        return (data.get("stage_models") or {}).get(stage) or data.get("model_name") or default
+
+    def _write(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Write `data` atomically and make it current; the caller holds the lock."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._data = data
+        st = os.stat(self.path)
+        self._version = (st.st_mtime_ns, st.st_size)
+        return dict(data)
+
+    def update(self, **changes) -> Dict[str, Any]:
+        """Merge `changes` into the config and write it atomically; None values remove keys."""
+        with self._lock:
+            self._refresh()
+            data = dict(self._data)
+            for key, value in changes.items():
+                if value is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = value
+            return self._write(data)
+
+    def update_stage_models(self, changes: Dict[str, Optional[str]]) -> Dict[str, str]:
+        """
+        Route (or, with an empty model, un-route) the given stages and return
+        the resulting `stage_models`. Read, merge and write happen under one
+        lock, so concurrent admin updates cannot overwrite each other.
+        """
+        with self._lock:
+            self._refresh()
+            data = dict(self._data)
+            stage_models = dict(data.get("stage_models") or {})
+            for stage, model in changes.items():
+                if model:
+                    stage_models[stage] = model
+                else:
+                    stage_models.pop(stage, None)
+            if stage_models:
+                data["stage_models"] = stage_models
+            else:
+                data.pop("stage_models", None)
+            self._write(data)
+            return stage_models
+
+    def stats(self) -> Dict[str, Any]:
+        data = self.snapshot()
+        return {
+            "model_name": data.get("model_name"),
+            "stage_models": data.get("stage_models") or {},
+            "reloads": self.reloads,
+        }
+
+
+config_store = ConfigStore()
@@ -0,0 +1,70 @@
+# crew_runs.py
+"""
+Blocking crew executions submitted to `executor.crew_executor` via `key_pool`.
+
+These are plain module-level functions taking and returning simple values so
+they can run on either the thread pool or the process pool.
+"""
+import json
+
+from crewai import Crew
+
+from agents import PIPELINE_STAGES, create_llm, create_stage_task, extract_profile_with_llm, create_qa_task
+from registry import agent_registry
+from streaming import watch_task
+from tool_budget import tool_budgets
+
+
+def _raw(result) -> str:
+    return result.raw if hasattr(result, "raw") else str(result)
+
+
+def run_stage(api_key: str, step: int, profile: dict, serper_key: str, model_name: str, channel=None) -> str:
+    """Run one pipeline stage. With a `streaming.EventChannel`, tokens and tool calls are forwarded to it."""
+    stage = PIPELINE_STAGES[step]
+
+    # Reuse the cached agent for this stage only; the task is cheap to build
+    with agent_registry.lease(stage, api_key, serper_key, model_name, stream=channel is not None) as agent:
+        task = create_stage_task(stage, agent)
+
+        # Run ONLY this one agent using a temp crew
+        temp_crew = Crew(
+            agents=[agent],
+            tasks=[task],
+            verbose=True,
+            cache=False,
+        )
+
+        # Debug: Print keys received in profile to verify data flow
+        print(f"Agent {step} received profile keys: {list(profile.keys())}")
+
+        inputs = {
+            "profile": json.dumps(profile),
+            "user_feedback": profile.get("user_feedback") or "None"
+        }
+        # Search/scrape calls are capped per task; see tool_budget
+        with tool_budgets.task(stage), watch_task(task, channel, stage):
+            return _raw(temp_crew.kickoff(inputs=inputs))
+
+
+def run_qa(api_key: str, question: str, context: str, serper_key: str, model_name: str, channel=None) -> str:
+    """Answer `question` from the prepared `context` text (see `qa_context.ContextCompactor`)."""
+    with agent_registry.lease("qa", api_key, serper_key, model_name, stream=channel is not None) as qa_agent:
+        qa_crew = create_qa_task(
+            qa_agent=qa_agent,
+            question=question,
+            context=context,
+        )
+        with tool_budgets.task("qa"), watch_task(qa_crew.tasks[0], channel, "qa"):
+            return _raw(qa_crew.kickoff())
+
+
+def run_extract(api_key: str, text: str, serper_key: str, model_name: str) -> str:
+    with agent_registry.lease("extractor", api_key, serper_key, model_name) as extractor_agent:
+        return _raw(extract_profile_with_llm(extractor_agent, text))
+
+
+def run_repair(api_key: str, prompt: str, model_name: str) -> str:
+    """Single tool-free completion, used to fix malformed records of a stage's output."""
+    llm = create_llm(api_key, model_name)
+    return str(llm.call([{"role": "user", "content": prompt}]))
@@ -0,0 +1,166 @@
+# executor.py
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# "thread" (default) or "process". In process mode the submitted callables and
+# their arguments/results must be picklable, i.e. module-level functions.
+EXECUTOR_MODE = os.environ.get("CRS_EXECUTOR_MODE", "thread")
+EXECUTOR_WORKERS = int(os.environ.get("CRS_EXECUTOR_WORKERS", "8"))
+# Max requests allowed to wait for a slot on each endpoint before new ones are rejected
+EXECUTOR_QUEUE_SIZE = int(os.environ.get("CRS_EXECUTOR_QUEUE_SIZE", "32"))
+
+
+def parse_limits(value: str) -> Dict[str, int]:
+    """Parse "run_agent=4,qa=8" into {"run_agent": 4, "qa": 8}."""
+    limits: Dict[str, int] = {}
+    for part in value.split(","):
+        name, _, limit = part.partition("=")
+        if name.strip() and limit.strip().isdigit():
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+ENDPOINT_LIMITS = parse_limits(os.environ.get("CRS_CONCURRENCY_LIMITS", ""))
+
+
+class QueueFullError(Exception):
+    """Raised when an endpoint already has `max_queue` requests waiting for a slot."""
+
+
+class _Lane:
+    """Concurrency cap, wait queue and counters for one endpoint."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        started = self.completed + self.failed
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / started * 1000, 1) if started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+class CrewExecutor:
+    """
+    Runs blocking crew kickoffs on a worker pool so the event loop stays free.
+
+    Every call goes through a per-endpoint lane that caps how many runs of that
+    endpoint execute at once; callers beyond the cap wait in a bounded queue and
+    get `QueueFullError` once it is full.
+    """
+
+    def __init__(
+        self,
+        mode: str = EXECUTOR_MODE,
+        max_workers: int = EXECUTOR_WORKERS,
+        max_queue: int = EXECUTOR_QUEUE_SIZE,
+        limits: Optional[Dict[str, int]] = None,
+    ):
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.limits = limits if limits is not None else dict(ENDPOINT_LIMITS)
+        self._lanes: Dict[str, _Lane] = {}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                if self.mode == "process":
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crew")
+            return self._pool
+
+    def _get_lane(self, endpoint: str) -> _Lane:
+        lane = self._lanes.get(endpoint)
+        if lane is None:
+            lane = _Lane(self.limits.get(endpoint, self.max_workers))
+            self._lanes[endpoint] = lane
+        if lane.semaphore is None:
+            lane.semaphore = asyncio.Semaphore(lane.limit)
+        return lane
+
+    async def run(self, endpoint: str, fn: Callable, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool under the `endpoint` lane."""
+        lane = self._get_lane(endpoint)
+        if lane.waiting >= self.max_queue and lane.active >= lane.limit:
+            lane.rejected += 1
+            raise QueueFullError(f"Too many pending '{endpoint}' requests, please retry shortly.")
+
+        lane.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            await lane.semaphore.acquire()
+        finally:
+            lane.waiting -= 1
+        waited = time.monotonic() - queued_at
+        lane.total_wait += waited
+        lane.max_wait = max(lane.max_wait, waited)
+
+        lane.active += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._get_pool().submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            lane.active -= 1
+            lane.semaphore.release()
+            raise
+
+        def finished(done):
+            # The slot follows the worker, not the awaiting coroutine: a cancelled
+            # caller (client disconnect, fan-out timeout) must not free it while
+            # the crew is still running.
+            if done.cancelled() or done.exception() is not None:
+                lane.failed += 1
+            else:
+                lane.completed += 1
+            lane.active -= 1
+            lane.semaphore.release()
+
+        def notify(done):
+            try:
+                loop.call_soon_threadsafe(finished, done)
+            except RuntimeError:
+                pass  # the loop is already closed (shutdown)
+
+        future.add_done_callback(notify)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "endpoints": {name: lane.stats() for name, lane in self._lanes.items()},
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+crew_executor = CrewExecutor()
@@ -0,0 +1,161 @@
+# fanout.py
+"""
+Per-university fan-out for the scholarship and reviews stages.
+
+Instead of one agent researching every ranked university in a single long
+reasoning loop, the ranked list is split into one subtask per university.
+Subtasks run concurrently under a cap, and their outputs are merged back into
+the stage's usual result format: one JSON array when every output is a JSON
+list, otherwise one Markdown section per university. A university that fails
+or times out gets an error entry (or a short note in its section) instead of
+failing the whole stage.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from program_parser import parse_programs
+
+# Stages that fan out per university; empty turns fan-out off
+FANOUT_STAGES = {s.strip() for s in os.environ.get("CRS_FANOUT_STAGES", "scholarship,reviews").split(",") if s.strip()}
+# Subtasks of one stage run that may be in flight at once
+FANOUT_CONCURRENCY = int(os.environ.get("CRS_FANOUT_CONCURRENCY", "3"))
+# Per-university time limit; a late university gets a note instead of its section
+FANOUT_TIMEOUT_SECONDS = float(os.environ.get("CRS_FANOUT_TIMEOUT_SECONDS", "180"))
+FANOUT_MAX_UNIVERSITIES = int(os.environ.get("CRS_FANOUT_MAX_UNIVERSITIES", "8"))
+
+
+def split_by_university(stage_input: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    One `(university, subtask_input)` per ranked university, in ranking order.
+
+    University names come from the matcher's programs; the specialist's ranked
+    text is cut at the first mention of each one, and each subtask only sees its
+    own university's part. Returns [] when fewer than two can be told apart,
+    in which case the stage runs as a single task.
+    """
+    ranked = stage_input.get("ranked_programs")
+    matched = stage_input.get("matched_programs")
+    if not isinstance(ranked, str) or not isinstance(matched, str):
+        return []
+    programs, _ = parse_programs(matched)
+    names = list(dict.fromkeys(p["university"].strip() for p in programs))
+
+    lowered = ranked.lower()
+    positions = []
+    for name in names:
+        index = lowered.find(name.lower())
+        if index >= 0:
+            # Start the section at the beginning of the line (e.g. a "### 1." heading)
+            positions.append((ranked.rfind("\n", 0, index) + 1, name))
+    positions.sort()
+    # Several matched names can point into the same line (e.g. a campus and its university)
+    positions = [p for i, p in enumerate(positions) if i == 0 or p[0] != positions[i - 1][0]]
+    positions = positions[:FANOUT_MAX_UNIVERSITIES]
+    if len(positions) < 2:
+        return []
+
+    subtasks = []
+    for i, (start, name) in enumerate(positions):
+        end = positions[i + 1][0] if i + 1 < len(positions) else len(ranked)
+        subtask_input = {k: v for k, v in stage_input.items() if k != "matched_programs"}
+        subtask_input["ranked_programs"] = ranked[start:end].strip()
+        subtasks.append((name, subtask_input))
+    return subtasks
+
+
+_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+
+
+def _json_items(output: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    The records of a sub-output that is a JSON list of objects (in code fences,
+    with prose around it, or wrapped as {"reviews": [...]}), else None.
+    Mirrors how the frontend parses a stage result.
+    """
+    text = _FENCE.sub("", output).strip()
+    candidates = [text]
+    start, end = output.find("["), output.rfind("]")
+    if start != -1 and end > start:
+        candidates.append(output[start:end + 1])
+    for candidate in candidates:
+        try:
+            parsed = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            parsed = next((v for v in parsed.values() if isinstance(v, list)), None)
+        if isinstance(parsed, list) and all(isinstance(item, dict) for item in parsed):
+            return parsed
+    return None
+
+
+def merge_outputs(stage: str, parts: List[Tuple[str, Optional[str], Optional[str]]]) -> str:
+    """
+    Join `(university, output, error)` parts into one result. If every
+    successful output is a JSON list, the result is a single JSON array whose
+    items carry their `university`, with an `error` item per failed
+    university; free-text outputs become one Markdown section per university.
+    """
+    items_per_part = [_json_items(output) if output is not None else None for _, output, _ in parts]
+    if all(items is not None for (_, output, _), items in zip(parts, items_per_part) if output is not None):
+        merged: List[Dict[str, Any]] = []
+        for (university, output, error), items in zip(parts, items_per_part):
+            if output is None:
+                merged.append({"university": university, "error": f"Could not complete {stage} research ({error})"})
+                continue
+            merged += [{"university": university, **item} if "university" not in item else item for item in items]
+        return json.dumps(merged, ensure_ascii=False)
+
+    sections = []
+    for university, output, error in parts:
+        body = output.strip() if output is not None else f"_Could not complete {stage} research for this university ({error})._"
+        sections.append(f"### {university}\n\n{body}")
+    return "\n\n".join(sections)
+
+
+async def fan_out(
+    stage: str,
+    subtasks: List[Tuple[str, Dict[str, Any]]],
+    run: Callable[[Dict[str, Any]], Awaitable[str]],
+    on_done: Optional[Callable[[str, bool, float], None]] = None,
+    concurrency: int = FANOUT_CONCURRENCY,
+    timeout: float = FANOUT_TIMEOUT_SECONDS,
+) -> Tuple[str, List[str]]:
+    """
+    Run `run(subtask_input)` for every university, at most `concurrency` at a
+    time, and return the merged output plus the universities that failed.
+    Raises the first error only if every university failed.
+
+    A timed-out subtask is no longer waited for, but a crew already running on
+    a worker thread finishes in the background.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run_one(university: str, subtask_input: Dict[str, Any]):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                output = await asyncio.wait_for(run(subtask_input), timeout)
+            except asyncio.TimeoutError:
+                print(f"{stage}: {university} timed out after {timeout:.0f}s")
+                error: Optional[BaseException] = TimeoutError(f"timed out after {timeout:.0f}s")
+                output = None
+            except Exception as e:
+                print(f"{stage}: {university} failed: {e}")
+                error, output = e, None
+            else:
+                error = None
+            if on_done:
+                on_done(university, error is None, time.perf_counter() - started)
+            return university, output, error
+
+    outcomes = await asyncio.gather(*(run_one(u, s) for u, s in subtasks))
+    failed = [university for university, output, _ in outcomes if output is None]
+    if len(failed) == len(outcomes):
+        raise outcomes[0][2]
+    parts = [(university, output, str(error) if error else None) for university, output, error in outcomes]
+    return merge_outputs(stage, parts), failed
@@ -0,0 +1,168 @@
+# http_clients.py
+"""
+Process-wide keep-alive HTTP clients for the upstreams every request talks to.
+
+OpenRouter (through LiteLLM) and Serper share pooled httpx clients, with
+HTTP/2 when the `h2` package is installed; page scraping uses a pooled
+requests session. Clients are created lazily, so each worker process of the
+process executor builds its own.
+"""
+import http.cookiejar
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("CRS_HTTP_MAX_CONNECTIONS", "32"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("CRS_HTTP_MAX_KEEPALIVE", "16"))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("CRS_HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("CRS_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_LLM_TIMEOUT = float(os.environ.get("CRS_HTTP_LLM_TIMEOUT", "120"))
+HTTP_SEARCH_TIMEOUT = float(os.environ.get("CRS_HTTP_SEARCH_TIMEOUT", "10"))
+HTTP_SCRAPE_TIMEOUT = float(os.environ.get("CRS_HTTP_SCRAPE_TIMEOUT", "15"))
+# Scraping talks to many different hosts: pools kept, and connections per host
+HTTP_SCRAPE_HOSTS = int(os.environ.get("CRS_HTTP_SCRAPE_HOSTS", "64"))
+HTTP_SCRAPE_CONNECTIONS_PER_HOST = int(os.environ.get("CRS_HTTP_SCRAPE_CONNECTIONS_PER_HOST", "4"))
+# HTTP/2 needs the `h2` package (pinned in requirements.txt); set CRS_HTTP2=0 to force HTTP/1.1
+HTTP2 = os.environ.get("CRS_HTTP2", "1") == "1"
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+    if HTTP2:
+        print("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1 (pip install h2)")
+
+
+class HTTPClients:
+    """Lazily built shared clients: `llm` and `search` (httpx) and `scrape` (requests)."""
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_seconds: float = HTTP_KEEPALIVE_SECONDS,
+        http2: bool = HTTP2 and HTTP2_AVAILABLE,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_seconds = keepalive_seconds
+        self.http2 = http2
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._versions: Dict[str, Counter] = {}
+
+    def _httpx_client(self, name: str, timeout: float) -> httpx.Client:
+        versions = self._versions.setdefault(name, Counter())
+
+        def record(response: httpx.Response):
+            with self._stats_lock:
+                versions[response.http_version] += 1
+
+        return httpx.Client(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_seconds,
+            ),
+            timeout=httpx.Timeout(timeout, connect=HTTP_CONNECT_TIMEOUT),
+            event_hooks={"response": [record]},
+        )
+
+    def _scrape_session(self) -> requests.Session:
+        session = requests.Session()
+        # Per-request cookies only: nothing a site sets may leak into other users' scrapes
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=HTTP_SCRAPE_HOSTS, pool_maxsize=HTTP_SCRAPE_CONNECTIONS_PER_HOST)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _get(self, name: str, build):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = build()
+        return client
+
+    @property
+    def llm(self) -> httpx.Client:
+        return self._get("llm", lambda: self._httpx_client("llm", HTTP_LLM_TIMEOUT))
+
+    @property
+    def search(self) -> httpx.Client:
+        return self._get("search", lambda: self._httpx_client("search", HTTP_SEARCH_TIMEOUT))
+
+    @property
+    def scrape(self) -> requests.Session:
+        return self._get("scrape", self._scrape_session)
+
+    def _httpx_stats(self, name: str, client: httpx.Client) -> Dict[str, Any]:
+        with self._stats_lock:
+            versions = dict(self._versions.get(name, {}))
+        stats: Dict[str, Any] = {"requests": sum(versions.values()), "http_versions": versions}
+        # httpx does not expose its pool publicly; report open connections when we can see them
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["open_connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for c in connections if c.is_idle())
+        return stats
+
+    def _scrape_stats(self, session: requests.Session) -> Dict[str, Any]:
+        requests_made = connections_made = hosts = 0
+        for adapter in session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                hosts += 1
+                requests_made += pool.num_requests
+                connections_made += pool.num_connections
+        return {
+            "hosts": hosts,
+            "requests": requests_made,
+            "connections_opened": connections_made,
+            "reuse_rate": round(1 - connections_made / requests_made, 3) if requests_made else 0.0,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        clients: Dict[str, Any] = {}
+        for name, client in list(self._clients.items()):
+            if isinstance(client, httpx.Client):
+                clients[name] = self._httpx_stats(name, client)
+            else:
+                clients[name] = self._scrape_stats(client)
+        return {
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "clients": clients,
+        }
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+http_clients = HTTPClients()
+
+
+def use_shared_llm_client():
+    """Have LiteLLM send its OpenAI-compatible requests (OpenRouter) through `http_clients.llm`."""
+    import litellm
+
+    litellm.client_session = http_clients.llm
+
@@ -0,0 +1,209 @@
+# key_pool.py
+"""
+Shared OpenRouter key failover for crew runs.
+
+Every endpoint hands its primary and backup keys to `key_pool.run`, which
+tracks each key's health, skips keys whose circuit is open, fails over to
+the next key on error and can hedge a slow attempt with the next key.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from executor import QueueFullError, crew_executor
+from registry import credential_fingerprint
+from scheduler import ENDPOINT_PRIORITIES, is_rate_limit, run_with_priority
+
+# Consecutive failures that open a key's circuit
+KEY_CIRCUIT_FAILURES = int(os.environ.get("CRS_KEY_CIRCUIT_FAILURES", "3"))
+# How long an open circuit keeps a key out of rotation (a 429 opens it at once)
+KEY_CIRCUIT_SECONDS = float(os.environ.get("CRS_KEY_CIRCUIT_SECONDS", "60"))
+# Hedging: once an attempt runs longer than HEDGE_FACTOR x that key's usual
+# latency for the endpoint (and at least HEDGE_MIN_SECONDS), start the next
+# key in parallel and keep whichever finishes first. Off unless CRS_KEY_HEDGE=1.
+KEY_HEDGE = os.environ.get("CRS_KEY_HEDGE", "0") == "1"
+KEY_HEDGE_FACTOR = float(os.environ.get("CRS_KEY_HEDGE_FACTOR", "2.0"))
+KEY_HEDGE_MIN_SECONDS = float(os.environ.get("CRS_KEY_HEDGE_MIN_SECONDS", "15"))
+EWMA_ALPHA = 0.3
+
+
+class KeyHealth:
+    """Counters, latency EWMA per endpoint and circuit state for one key."""
+
+    def __init__(self):
+        self.successes = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.latency: Dict[str, float] = {}
+
+    def is_open(self, now: float) -> bool:
+        return now < self.open_until
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "successes": self.successes,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "circuit": "open" if self.is_open(now) else "closed",
+            "latency_ewma_ms": {e: round(s * 1000) for e, s in self.latency.items()},
+        }
+
+
+class KeyPool:
+    """
+    Per-key health tracking with circuit breaking and optional hedged failover.
+
+    Keys are identified by fingerprint only. A cancelled hedge stops waiting on
+    its attempt, but a crew already running on a worker thread cannot be
+    interrupted and finishes in the background.
+    """
+
+    def __init__(
+        self,
+        circuit_failures: int = KEY_CIRCUIT_FAILURES,
+        circuit_seconds: float = KEY_CIRCUIT_SECONDS,
+        hedge: bool = KEY_HEDGE,
+        hedge_factor: float = KEY_HEDGE_FACTOR,
+        hedge_min_seconds: float = KEY_HEDGE_MIN_SECONDS,
+    ):
+        self.circuit_failures = circuit_failures
+        self.circuit_seconds = circuit_seconds
+        self.hedge = hedge
+        self.hedge_factor = hedge_factor
+        self.hedge_min_seconds = hedge_min_seconds
+        self._health: Dict[str, KeyHealth] = {}
+        self._lock = threading.Lock()
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _get(self, fingerprint: str) -> KeyHealth:
+        health = self._health.get(fingerprint)
+        if health is None:
+            health = self._health[fingerprint] = KeyHealth()
+        return health
+
+    def _order(self, keys: List[Optional[str]]) -> List[str]:
+        """Distinct keys in the given order, keys with an open circuit last."""
+        distinct = list(dict.fromkeys(k for k in keys if k))
+        now = time.monotonic()
+        with self._lock:
+            return sorted(distinct, key=lambda k: self._get(credential_fingerprint(k)).is_open(now))
+
+    def _record_success(self, key: str, endpoint: str, elapsed: float):
+        with self._lock:
+            health = self._get(credential_fingerprint(key))
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+            previous = health.latency.get(endpoint)
+            health.latency[endpoint] = elapsed if previous is None else EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * previous
+
+    def _record_failure(self, key: str, error: BaseException):
+        with self._lock:
+            health = self._get(credential_fingerprint(key))
+            health.errors += 1
+            health.consecutive_failures += 1
+            if is_rate_limit(error):
+                health.rate_limited += 1
+                health.open_until = time.monotonic() + self.circuit_seconds
+            elif health.consecutive_failures >= self.circuit_failures:
+                health.open_until = time.monotonic() + self.circuit_seconds
+
+    def _hedge_delay(self, key: str, endpoint: str) -> float:
+        with self._lock:
+            usual = self._get(credential_fingerprint(key)).latency.get(endpoint)
+        return max(self.hedge_min_seconds, self.hedge_factor * usual) if usual else self.hedge_min_seconds
+
+    async def _attempt(self, endpoint: str, fn: Callable, key: str, args, kwargs):
+        started = time.perf_counter()
+        priority = ENDPOINT_PRIORITIES.get(endpoint, "background")
+        try:
+            result = await crew_executor.run(endpoint, run_with_priority, priority, fn, key, *args, **kwargs)
+        except (asyncio.CancelledError, QueueFullError):
+            raise
+        except Exception as e:
+            self._record_failure(key, e)
+            raise
+        self._record_success(key, endpoint, time.perf_counter() - started)
+        return result
+
+    async def run(self, endpoint: str, fn: Callable, keys: List[Optional[str]], *args, hedge: bool = True, **kwargs):
+        """
+        Run `fn(key, *args, **kwargs)` on the executor's `endpoint` lane with
+        the first usable key from `keys`, failing over to the next on error.
+        Upstream calls made by `fn` are scheduled in the endpoint's priority
+        class (see `scheduler.ENDPOINT_PRIORITIES`).
+        Pass `hedge=False` for runs that must not be duplicated (e.g. streamed ones).
+        """
+        candidates = self._order(keys)
+        if not candidates:
+            raise ValueError("No OpenRouter API key provided.")
+        hedge = hedge and self.hedge
+        pending: Dict[asyncio.Future, str] = {}
+        next_index = 0
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch():
+            nonlocal next_index
+            key = candidates[next_index]
+            next_index += 1
+            pending[asyncio.ensure_future(self._attempt(endpoint, fn, key, args, kwargs))] = key
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if hedge and len(pending) == 1 and next_index < len(candidates):
+                    timeout = self._hedge_delay(next(iter(pending.values())), endpoint)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    print(f"Key attempt in {endpoint} slower than {timeout:.0f}s, hedging with next key...")
+                    with self._lock:
+                        self.hedges += 1
+                    hedged = True
+                    launch()
+                    continue
+
+                for task in done:
+                    key = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except QueueFullError:
+                        raise
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if hedged and key != candidates[0]:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return result
+
+                if not pending and next_index < len(candidates):
+                    print(f"Key failed in {endpoint}: {last_error}. Retrying with backup key...")
+                    with self._lock:
+                        self.failovers += 1
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "keys": {fp: health.stats(now) for fp, health in self._health.items()},
+                "failovers": self.failovers,
+                "hedging": self.hedge,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+
+
+key_pool = KeyPool()
@@ -0,0 +1,157 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from crewai import LLM
+
+from cache_backends import MemoryLRUCache, SQLiteTTLCache
+from http_clients import use_shared_llm_client
+from scheduler import upstream_scheduler
+
+# Comma-separated stages whose LLM calls are cached, e.g. "normalizer,extractor",
+# or "*" for every stage. Empty (the default) leaves the cache off.
+LLM_CACHE_STAGES = os.environ.get("CRS_LLM_CACHE_STAGES", "")
+LLM_CACHE_BACKEND = os.environ.get("CRS_LLM_CACHE_BACKEND", "memory")  # "memory" or "sqlite"
+LLM_CACHE_PATH = os.environ.get("CRS_LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = float(os.environ.get("CRS_LLM_CACHE_TTL_SECONDS", str(6 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("CRS_LLM_CACHE_MAX_ENTRIES", "2000"))
+
+
+class LLMResponseCache:
+    """
+    Exact-match cache of LLM completions, keyed by model, sampling parameters
+    and a hash of the fully rendered messages.
+    """
+
+    def __init__(
+        self,
+        stages: str = LLM_CACHE_STAGES,
+        backend: str = LLM_CACHE_BACKEND,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        path: str = LLM_CACHE_PATH,
+    ):
+        self.stages = {s.strip() for s in stages.split(",") if s.strip()}
+        self.backend = backend
+        if backend == "sqlite":
+            self.store = SQLiteTTLCache(path, table="llm_responses", ttl_seconds=ttl_seconds, max_entries=max_entries)
+        else:
+            self.store = MemoryLRUCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._stage_by_role: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._miss_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.stages)
+
+    def stage_for_role(self, role: Optional[str]) -> Optional[str]:
+        if self._stage_by_role is None:
+            # Imported lazily: agents imports this module to build its LLMs
+            from agents import AGENT_SPECS
+            self._stage_by_role = {spec["role"]: stage for stage, spec in AGENT_SPECS.items()}
+        return self._stage_by_role.get(role) if role else None
+
+    def enabled_for(self, stage: Optional[str]) -> bool:
+        return "*" in self.stages or (stage is not None and stage in self.stages)
+
+    @staticmethod
+    def make_key(model: str, messages: Any, params: Dict[str, Any]) -> str:
+        rendered = json.dumps(messages, sort_keys=True, default=str)
+        prompt_hash = hashlib.sha256(rendered.encode("utf-8")).hexdigest()
+        payload = json.dumps({"model": model, "prompt": prompt_hash, **params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.store.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                # Credit each hit with the average cost of a miss
+                if self.misses:
+                    self.saved_seconds += self._miss_seconds / self.misses
+        return value
+
+    def set(self, key: str, value: str, elapsed: float):
+        self.store.set(key, value)
+        with self._lock:
+            self._miss_seconds += elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled_stages": sorted(self.stages),
+                "backend": self.backend,
+                "entries": len(self.store),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "est_saved_seconds": round(self.saved_seconds, 1),
+            }
+
+
+llm_response_cache = LLMResponseCache()
+
+
+# Every LLM built from this module reuses the pooled OpenRouter connections
+use_shared_llm_client()
+
+
+class ScheduledLLM(LLM):
+    """
+    LLM whose completions go through `upstream_scheduler`, so they respect the
+    per-key OpenRouter rate and priority classes and back off on 429s.
+    """
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        def complete():
+            return super(ScheduledLLM, self).call(
+                messages, tools, callbacks, available_functions, from_task, from_agent, response_model
+            )
+
+        return upstream_scheduler.call("openrouter", self.api_key or "", complete)
+
+
+class CachedLLM(ScheduledLLM):
+    """
+    LLM that answers repeated prompts from `llm_response_cache` for the stages
+    it is enabled for. The stage is recognised from the calling agent's role.
+    Only used for LiteLLM-routed models such as the OpenRouter ones.
+    """
+
+    def _sampling_params(self) -> Dict[str, Any]:
+        return {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens,
+            "seed": self.seed,
+            "stop": self.stop,
+        }
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        stage = llm_response_cache.stage_for_role(getattr(from_agent, "role", None))
+        if not llm_response_cache.enabled_for(stage) or tools or response_model:
+            return super().call(messages, tools, callbacks, available_functions, from_task, from_agent, response_model)
+
+        key = llm_response_cache.make_key(self.model, messages, self._sampling_params())
+        cached = llm_response_cache.get(key)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        result = super().call(messages, tools, callbacks, available_functions, from_task, from_agent, response_model)
+        if isinstance(result, str) and result:
+            llm_response_cache.set(key, result, time.perf_counter() - started)
+        return result
@@ -1,35 +1,62 @@
 import os
-from fastapi import FastAPI, Form
+import time
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from sse_starlette.sse import EventSourceResponse
+from typing import Dict, Any, List, Optional, Tuple
 from fastapi.middleware.cors import CORSMiddleware
-from crewai import Crew
 
-from agents import (
-    create_agents_and_tasks,
-    create_profile_extractor_agent,
-    extract_profile_with_llm,
-    create_qa_task
-)
-from utils import extract_info_from_text
+from agents import AGENT_SPECS, DEFAULT_MODEL_NAME, DEFAULT_EXTRACTOR_MODEL_NAME, PIPELINE_STAGES
+from bulk_intake import iter_upload_rows, stream_bulk_intake
+from config_store import config_store
+from crew_runs import run_extract, run_qa, run_repair, run_stage
+from executor import QueueFullError, crew_executor
+from fanout import FANOUT_CONCURRENCY, FANOUT_STAGES, fan_out, split_by_university
+from http_clients import http_clients
+from key_pool import key_pool
+from llm_cache import llm_response_cache
+from normalizer import NORMALIZER_ENGINE, llm_fallback_input, merge_llm_fields, normalize_profile
+from pipeline import RESULT_KEYS, build_stage_input, consumed_input, descendants, run_dag
+from program_catalog import program_catalog
+from program_parser import MATCHER_REPAIR, parse_programs, repair_prompt
+from qa_cache import context_fingerprint, qa_answer_cache
+from qa_context import context_compactor
+from registry import agent_registry
+from scheduler import upstream_scheduler
+from scrape_cache import page_cache
+from search_cache import search_cache
+from session_store import qa_context, session_store, stage_input
+from stage_memo import stage_memo
+from streaming import EventChannel, event_stream, worker_channel
+from tool_budget import tool_budgets
+from utils import assess_regex_extraction, extract_info_with_confidence
 import json
 
 app = FastAPI()
 
-# ==========================================
-# CONFIGURATION MANAGEMENT
-# ==========================================
-CONFIG_FILE = "config.json"
 
-def get_saved_model_name():
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                data = json.load(f)
-                return data.get("model_name")
-        except:
-            pass
-    return None
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    return JSONResponse(status_code=503, content={"error": str(exc)}, headers={"Retry-After": "5"})
+
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    crew_executor.shutdown()
+    http_clients.close()
+
+# Minimum per-field confidence for /extract-profile to trust the regex pass
+# alone and skip the LLM extractor; set above 1 to always run the LLM.
+REGEX_BYPASS_THRESHOLD = float(os.environ.get("CRS_REGEX_BYPASS_THRESHOLD", "0.7"))
+# Intakes per extraction path ("regex" or "regex+llm")
+intake_paths: Dict[str, int] = {"regex": 0, "regex+llm": 0}
+# Stage-0 runs per normalizer path ("rules", "rules+llm" or "llm")
+normalizer_paths: Dict[str, int] = {"rules": 0, "rules+llm": 0, "llm": 0}
+# Matcher program objects by outcome; "unparsed" counts outputs with no JSON array at all
+matcher_objects: Dict[str, int] = {"valid": 0, "repaired": 0, "dropped": 0, "unparsed": 0}
+# Per-university fan-out runs of the scholarship/reviews stages
+fanout_counts: Dict[str, int] = {"runs": 0, "partial_runs": 0, "subtasks": 0, "failed_subtasks": 0}
 
 class ProfileRequest(BaseModel):
     text: str
@@ -37,23 +64,47 @@ class ProfileRequest(BaseModel):
     openrouter_key_backup: Optional[str] = None
     serper_key: str
 
+# With a session_id, `profile` / `context` only carry changes on top of the stored session
 class AgentRequest(BaseModel):
     step: int
-    profile: dict
+    profile: dict = {}
+    session_id: Optional[str] = None
+    # Recompute even if an output for identical inputs is memoized
+    force: bool = False
+    openrouter_key: str
+    openrouter_key_backup: Optional[str] = None
+    serper_key: str
+
+class PipelineRequest(BaseModel):
+    profile: dict = {}
+    session_id: Optional[str] = None
+    force: bool = False
+    # Stage that user_feedback is about; only it and its downstream stages see the feedback
+    feedback_stage: Optional[str] = None
     openrouter_key: str
     openrouter_key_backup: Optional[str] = None
     serper_key: str
 
 class QARequest(BaseModel):
     question: str
-    context: dict
+    context: dict = {}
+    session_id: Optional[str] = None
     openrouter_key: str
     openrouter_key_backup: Optional[str] = None
     serper_key: str
 
+class SessionRequest(BaseModel):
+    profile: dict = {}
+    # Stage outputs keyed like agentResults, e.g. "ranked_programs"; null removes one
+    results: dict = {}
+
 class AdminModelRequest(BaseModel):
     model_name: str
 
+class AdminStageModelsRequest(BaseModel):
+    # stage -> model; an empty value falls the stage back to the global model
+    stage_models: Dict[str, Optional[str]]
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://127.0.0.1:5173", "*"],
@@ -67,49 +118,124 @@ app.add_middleware(
 # ==========================================
 @app.get("/admin/model-name")
 async def get_model_name():
-    saved = get_saved_model_name()
+    saved = config_store.model_name
     return {"model_name": saved if saved else "Default (Hardcoded)"}
 
 @app.post("/admin/model-name")
 async def update_model_name(data: AdminModelRequest):
     try:
-        with open(CONFIG_FILE, "w") as f:
-            json.dump({"model_name": data.model_name}, f)
+        config_store.update(model_name=data.model_name)
         return {"status": "success", "model_name": data.model_name}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-@app.post("/extract-profile")
-async def extract_profile_route(
-    text: str = Form(...),
-    openrouter_key: str = Form(...),
-    openrouter_key_backup: Optional[str] = Form(None),
-    serper_key: str = Form(...)
-):
-    profile: Dict[str, Any] = {}
+def stage_default_model(stage: str) -> str:
+    return DEFAULT_EXTRACTOR_MODEL_NAME if stage == "extractor" else DEFAULT_MODEL_NAME
+
+@app.get("/admin/stage-models")
+async def get_stage_models():
+    return {
+        "stage_models": config_store.stage_models,
+        "resolved": {stage: config_store.model_for(stage, stage_default_model(stage)) for stage in AGENT_SPECS},
+    }
+
+@app.post("/admin/stage-models")
+async def update_stage_models(data: AdminStageModelsRequest):
+    unknown = sorted(set(data.stage_models) - set(AGENT_SPECS))
+    if unknown:
+        return {"status": "error", "message": f"Unknown stages: {unknown}. Valid stages: {list(AGENT_SPECS)}"}
+    try:
+        stage_models = config_store.update_stage_models(data.stage_models)
+        return {"status": "success", "stage_models": stage_models}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/admin/stats")
+async def get_stats():
+    intakes = sum(intake_paths.values())
+    return {
+        "agent_registry": agent_registry.stats(),
+        "executor": crew_executor.stats(),
+        "key_pool": key_pool.stats(),
+        "scheduler": upstream_scheduler.stats(),
+        "http_clients": http_clients.stats(),
+        "search_cache": search_cache.stats(),
+        "tool_budgets": tool_budgets.stats(),
+        "page_cache": page_cache.stats(),
+        "llm_cache": llm_response_cache.stats(),
+        "qa_cache": qa_answer_cache.stats(),
+        "qa_context": context_compactor.stats(),
+        "sessions": session_store.stats(),
+        "stage_memo": stage_memo.stats(),
+        "config": config_store.stats(),
+        "normalizer": {"engine": NORMALIZER_ENGINE, **normalizer_paths},
+        "matcher_output": {"repair": MATCHER_REPAIR, **matcher_objects},
+        "program_catalog": program_catalog.stats(),
+        "fanout": {"stages": sorted(FANOUT_STAGES), "concurrency": FANOUT_CONCURRENCY, **fanout_counts},
+        "profile_intake": {
+            **intake_paths,
+            "llm_bypass_rate": round(intake_paths["regex"] / intakes, 3) if intakes else 0.0,
+        },
+    }
 
+# ==========================================
+# SESSIONS
+# ==========================================
+def load_session(session_id: str) -> Dict[str, Any]:
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    return session
+
+@app.post("/sessions")
+async def create_session(data: SessionRequest):
+    session_id = session_store.create(data.profile)
+    if data.results:
+        session_store.update(session_id, results=data.results)
+    return {"session_id": session_id}
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    return load_session(session_id)
+
+@app.patch("/sessions/{session_id}")
+async def update_session(session_id: str, data: SessionRequest):
+    session = session_store.update(session_id, profile=data.profile, results=data.results)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    return session
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    session_store.delete(session_id)
+    return {"status": "deleted"}
+
+
+async def intake_profile(
+    text: str, openrouter_key: str, openrouter_key_backup: Optional[str], serper_key: str,
+    endpoint: str = "extract_profile",
+) -> Dict[str, Any]:
+    """
+    Regex extraction, plus the LLM extractor only when the regex result is not
+    sufficient. `endpoint` picks the executor lane and scheduler priority.
+    """
     # Step 1: Regex extraction
-    profile = extract_info_from_text(text)
+    profile, confidence = extract_info_with_confidence(text)
+    assessment = assess_regex_extraction(profile, confidence, REGEX_BYPASS_THRESHOLD)
+
+    # Complete and confident enough: skip the LLM round trip
+    if assessment["sufficient"]:
+        intake_paths["regex"] += 1
+        return {"profile": profile, "path": "regex", "confidence": confidence}
 
     # Check for admin override model
-    saved_model = get_saved_model_name()
-    agent_kwargs = {}
-    if saved_model:
-        agent_kwargs["llm_model_name"] = saved_model
+    model_name = config_store.model_for("extractor", DEFAULT_EXTRACTOR_MODEL_NAME)
 
     # Step 2: LLM extraction (merge results)
-    try:
-        extractor_agent = create_profile_extractor_agent(openrouter_key, **agent_kwargs)
-        llm_result = extract_profile_with_llm(extractor_agent, text)
-    except Exception as e:
-        if openrouter_key_backup:
-            print(f"Primary key failed in extract_profile: {e}. Retrying with backup key...")
-            extractor_agent = create_profile_extractor_agent(openrouter_key_backup, **agent_kwargs)
-            llm_result = extract_profile_with_llm(extractor_agent, text)
-        else:
-            raise e
-
-    output_text = llm_result.raw if hasattr(llm_result, "raw") else str(llm_result)
+    output_text = await key_pool.run(
+        endpoint, run_extract, [openrouter_key, openrouter_key_backup],
+        text, serper_key, model_name,
+    )
     try:
         extracted_json = json.loads(output_text)
         if isinstance(extracted_json, dict):
@@ -119,57 +245,178 @@ async def extract_profile_route(
     except:
         pass
 
-    return {"profile": profile}
+    intake_paths["regex+llm"] += 1
+    return {
+        "profile": profile,
+        "path": "regex+llm",
+        "confidence": confidence,
+        "missing_fields": assessment["missing_fields"],
+        "low_confidence_fields": assessment["low_confidence_fields"],
+    }
 
 
-@app.post("/run-agent")
-async def run_agent(data: AgentRequest):
-    try:
-        def execute_run(api_key):
-            # Check for admin override model
-            saved_model = get_saved_model_name()
-            agent_kwargs = {}
-            if saved_model:
-                agent_kwargs["llm_model_name"] = saved_model
-
-            # Create all agents & tasks (same as before)
-            crew, qa_agent, _ = create_agents_and_tasks(
-                api_key,
-                data.serper_key,
-                **agent_kwargs
-            )
+@app.post("/extract-profile")
+async def extract_profile_route(
+    text: str = Form(...),
+    openrouter_key: str = Form(...),
+    openrouter_key_backup: Optional[str] = Form(None),
+    serper_key: str = Form(...)
+):
+    return await intake_profile(text, openrouter_key, openrouter_key_backup, serper_key)
 
-            # Select only the specific task
-            task = crew.tasks[data.step]
-            temp_agent = task.agent
 
-            # Run ONLY this one agent using a temp crew
-            temp_crew = Crew(
-                agents=[temp_agent],
-                tasks=[task],
-                verbose=True,
-                cache=False,
+@app.post("/extract-profile/bulk")
+async def extract_profile_bulk(
+    file: UploadFile = File(...),
+    openrouter_key: str = Form(...),
+    openrouter_key_backup: Optional[str] = Form(None),
+    serper_key: str = Form(...)
+):
+    """
+    Extract profiles from a CSV (a "text"/"description" column) or JSONL upload.
+    Streams one NDJSON line per row as it completes, then a summary line.
+    """
+    rows = iter_upload_rows(file.file, file.filename)
+
+    async def process(text: str) -> Dict[str, Any]:
+        # Bulk rows queue behind interactive extractions for the same keys
+        return await intake_profile(text, openrouter_key, openrouter_key_backup, serper_key, endpoint="bulk_intake")
+
+    return StreamingResponse(stream_bulk_intake(rows, process), media_type="application/x-ndjson")
+
+
+async def structure_matcher_output(endpoint: str, data, model_name: str, raw: str) -> str:
+    """
+    Parse the matcher's output into schema-valid programs and return them as a
+    clean JSON array. Only malformed objects are sent back to the LLM for repair;
+    output without any JSON array is returned unchanged.
+    """
+    programs, invalid = parse_programs(raw)
+    if not programs and not invalid:
+        matcher_objects["unparsed"] += 1
+        return raw
+    matcher_objects["valid"] += len(programs)
+
+    if invalid and MATCHER_REPAIR:
+        print(f"Matcher returned {len(invalid)} malformed program(s), repairing only those...")
+        try:
+            repaired_text = await key_pool.run(
+                endpoint, run_repair, [data.openrouter_key, data.openrouter_key_backup],
+                repair_prompt(invalid), model_name,
             )
+            repaired, invalid = parse_programs(repaired_text)
+            programs += repaired
+            matcher_objects["repaired"] += len(repaired)
+        except QueueFullError:
+            raise
+        except Exception as e:
+            print(f"Matcher repair failed: {e}")
+    matcher_objects["dropped"] += len(invalid)
+    # Validated programs feed the local catalog the matcher consults before searching
+    if programs:
+        program_catalog.add_programs(programs)
+    # Nothing usable even after repair: keep the raw output rather than an empty list
+    return json.dumps(programs, ensure_ascii=False) if programs else raw
+
+
+async def run_fanout_stage(
+    stage: str, subtasks, run_llm_stage, channel: Optional[EventChannel] = None
+) -> Tuple[str, List[str]]:
+    """Run one subtask per university concurrently; returns the merged output and the failed universities."""
+    def on_done(university: str, ok: bool, seconds: float):
+        fanout_counts["subtasks"] += 1
+        if not ok:
+            fanout_counts["failed_subtasks"] += 1
+        if channel:
+            channel.emit("subtask_end", {
+                "stage": stage, "university": university, "ok": ok, "duration_ms": round(seconds * 1000, 1),
+            })
+
+    print(f"{stage}: fanning out over {len(subtasks)} universities")
+    fanout_counts["runs"] += 1
+    result, failed = await fan_out(stage, subtasks, run_llm_stage, on_done)
+    if failed:
+        fanout_counts["partial_runs"] += 1
+    return result, failed
+
+
+async def execute_stage(
+    endpoint: str, data, step: int, profile: dict, channel: Optional[EventChannel] = None
+) -> Tuple[str, bool]:
+    """
+    Run pipeline stage `step` on the executor and return `(result, cached)`.
+
+    Outputs are memoized by a hash of exactly the input the stage consumes, so
+    a rerun whose input did not change returns the earlier output. Stage 0 is
+    normalized with local rules unless CRS_NORMALIZER_ENGINE is "llm"; in
+    "hybrid" mode the LLM normalizer only sees the fields the rules could not
+    handle. The matcher's output is reduced to its schema-valid programs (see
+    `structure_matcher_output`); scholarship and reviews fan out per
+    university (see `fanout`). With a session, the result is stored in it
+    and, if it changed, the stored outputs of downstream stages are dropped as
+    stale.
+    """
+    stage = PIPELINE_STAGES[step]
+    # Check for admin override model
+    model_name = config_store.model_for(stage, DEFAULT_MODEL_NAME)
+    profile = consumed_input(stage, profile)
+    memo_key = stage_memo.make_key(stage, profile, model_name, NORMALIZER_ENGINE if stage == "normalizer" else "")
+    result = None if data.force else stage_memo.get(stage, memo_key)
+    cached = result is not None
+    memoize = True
+
+    async def run_llm_stage(stage_profile: dict) -> str:
+        return await key_pool.run(
+            endpoint, run_stage, [data.openrouter_key, data.openrouter_key_backup],
+            step, stage_profile, data.serper_key, model_name, worker_channel(channel),
+            hedge=channel is None,
+        )
 
-            # Debug: Print keys received in profile to verify data flow
-            print(f"Agent {data.step} received profile keys: {list(data.profile.keys())}")
+    if not cached:
+        # Feedback on a rerun can change any field, so it needs the LLM
+        if stage != "normalizer" or NORMALIZER_ENGINE == "llm" or (
+            NORMALIZER_ENGINE == "hybrid" and "user_feedback" in profile
+        ):
+            if stage == "normalizer":
+                normalizer_paths["llm"] += 1
+            subtasks = split_by_university(profile) if stage in FANOUT_STAGES else []
+            if subtasks:
+                result, failed = await run_fanout_stage(stage, subtasks, run_llm_stage, channel)
+                # A partial answer is returned but not memoized, so the next run retries it
+                memoize = not failed
+            else:
+                result = await run_llm_stage(profile)
+            if stage == "matcher":
+                result = await structure_matcher_output(endpoint, data, model_name, result)
+        else:
+            normalized, unresolved = normalize_profile(profile)
+            if unresolved and NORMALIZER_ENGINE == "hybrid":
+                llm_output = await run_llm_stage(llm_fallback_input(normalized, unresolved))
+                normalized = merge_llm_fields(normalized, unresolved, llm_output)
+                normalizer_paths["rules+llm"] += 1
+            else:
+                normalizer_paths["rules"] += 1
+            result = json.dumps(normalized, ensure_ascii=False)
+        if memoize:
+            stage_memo.set(memo_key, result)
 
-            inputs = {
-                "profile": json.dumps(data.profile),
-                "user_feedback": data.profile.get("user_feedback") or "None"
-            }
-            return temp_crew.kickoff(inputs=inputs)
+    if data.session_id:
+        key = RESULT_KEYS[stage]
+        session = session_store.get(data.session_id)
+        changes = {key: result}
+        if session and session["results"].get(key) not in (None, result):
+            changes.update({RESULT_KEYS[s]: None for s in descendants(stage)})
+        session_store.update(data.session_id, results=changes)
+    return result, cached
 
-        try:
-            result = execute_run(data.openrouter_key)
-        except Exception as e:
-            if data.openrouter_key_backup:
-                print(f"Primary key failed in run_agent: {e}. Retrying with backup key...")
-                result = execute_run(data.openrouter_key_backup)
-            else:
-                raise e
 
-        raw_result = getattr(result, "raw", str(result))
+@app.post("/run-agent")
+async def run_agent(data: AgentRequest):
+    if data.session_id:
+        data.profile = stage_input(load_session(data.session_id), data.profile)
+    try:
+        raw_result, cached = await execute_stage("run_agent", data, data.step, data.profile)
+
         # Use ASCII-safe printing to avoid Windows console encoding issues
         try:
             preview = raw_result[:500] if isinstance(raw_result, str) else str(raw_result)[:500]
@@ -178,55 +425,170 @@ async def run_agent(data: AgentRequest):
             print(f"Agent {data.step} raw result preview: {preview.encode('ascii', 'replace').decode('ascii')}")
         except Exception as e:
             print(f"Agent {data.step} completed (preview unavailable due to encoding: {e})")
-        return {"result": raw_result}
+        response = {"result": raw_result, "cached": cached}
+        if PIPELINE_STAGES[data.step] == "matcher":
+            response["programs"], _ = parse_programs(raw_result)
+        return response
+    except QueueFullError:
+        raise
     except Exception as e:
         print(f"Error in run_agent for step {data.step}: {str(e)}")
         import traceback
         traceback.print_exc()
         return {"error": str(e), "step": data.step}
-    finally:
-        # Cleanup API keys from environment variables to ensure they don't persist
-        os.environ.pop("OPENROUTER_API_KEY", None)
-        os.environ.pop("SERPER_API_KEY", None)
+
+@app.post("/run-agent/stream")
+async def run_agent_stream(data: AgentRequest):
+    """SSE variant of /run-agent: stage, tool-call and token events, then the result."""
+    if data.session_id:
+        data.profile = stage_input(load_session(data.session_id), data.profile)
+    channel = EventChannel()
+
+    async def work():
+        stage = PIPELINE_STAGES[data.step]
+        channel.emit("stage_start", {"stage": stage, "step": data.step})
+        started = time.perf_counter()
+        result, cached = await execute_stage("run_agent", data, data.step, data.profile, channel)
+        channel.emit("stage_end", {
+            "stage": stage,
+            "step": data.step,
+            "cached": cached,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        return result
+
+    return EventSourceResponse(event_stream(channel, work()))
+
+
+def pipeline_stage_runner(
+    data: PipelineRequest, channel: Optional[EventChannel] = None, cached_stages: Optional[List[str]] = None
+):
+    """
+    Build the `run_dag` callback that runs one stage on the executor. Stages
+    answered from the memo are appended to `cached_stages`.
+    """
+    feedback_stages = None
+    if data.feedback_stage:
+        feedback_stages = {data.feedback_stage, *descendants(data.feedback_stage)}
+
+    async def run_pipeline_stage(stage, results):
+        if channel:
+            channel.emit("stage_start", {"stage": stage})
+        started = time.perf_counter()
+        stage_profile = build_stage_input(stage, data.profile, results)
+        if feedback_stages is not None and stage not in feedback_stages:
+            # Upstream of the stage the feedback targets: unchanged input, memoized output
+            stage_profile.pop("user_feedback", None)
+        try:
+            result, cached = await execute_stage(
+                "run_pipeline", data, PIPELINE_STAGES.index(stage), stage_profile, channel,
+            )
+        except Exception as e:
+            if channel:
+                channel.emit("stage_error", {"stage": stage, "error": str(e)})
+            raise
+        if cached and cached_stages is not None:
+            cached_stages.append(stage)
+        if channel:
+            channel.emit("stage_end", {
+                "stage": stage,
+                "result_key": RESULT_KEYS[stage],
+                "result": result,
+                "cached": cached,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+        return result
+
+    return run_pipeline_stage
+
+
+def validate_feedback_stage(data: PipelineRequest):
+    if data.feedback_stage and data.feedback_stage not in PIPELINE_STAGES:
+        raise HTTPException(status_code=400, detail=f"feedback_stage must be one of {PIPELINE_STAGES}.")
+
+
+@app.post("/run-pipeline")
+async def run_pipeline(data: PipelineRequest):
+    """
+    Run all five stages server-side; scholarships and reviews run concurrently.
+    Stages whose inputs are unchanged since an earlier run return their memoized output.
+    """
+    validate_feedback_stage(data)
+    if data.session_id:
+        data.profile = {**load_session(data.session_id)["profile"], **data.profile}
+    cached_stages: List[str] = []
+    outcome = await run_dag(pipeline_stage_runner(data, cached_stages=cached_stages))
+    outcome["cached_stages"] = [s for s in PIPELINE_STAGES if s in cached_stages]
+    outcome["recomputed_stages"] = [
+        s for s in PIPELINE_STAGES if RESULT_KEYS[s] in outcome["results"] and s not in cached_stages
+    ]
+    print(f"Pipeline finished in {outcome['timings']['total_ms']} ms, errors: {list(outcome['errors'])}")
+    return outcome
+
+
+@app.post("/run-pipeline/stream")
+async def run_pipeline_stream(data: PipelineRequest):
+    """SSE variant of /run-pipeline; each stage's output is sent in its stage_end event."""
+    validate_feedback_stage(data)
+    if data.session_id:
+        data.profile = {**load_session(data.session_id)["profile"], **data.profile}
+    channel = EventChannel()
+    return EventSourceResponse(event_stream(channel, run_dag(pipeline_stage_runner(data, channel))))
 
 @app.post("/qa")
 async def qa_route(data: QARequest):
-    def execute_qa(api_key):
-        # Check for admin override model
-        saved_model = get_saved_model_name()
-        agent_kwargs = {}
-        if saved_model:
-            agent_kwargs["llm_model_name"] = saved_model
-
-        # Create QA agent properly
-        _, qa_agent, _ = create_agents_and_tasks(
-            api_key,
-            data.serper_key,
-            **agent_kwargs
-        )
-
-        qa_crew = create_qa_task(
-            qa_agent=qa_agent,
-            question=data.question,
-            context=json.dumps(data.context),
+    if data.session_id:
+        data.context = {**qa_context(load_session(data.session_id)), **data.context}
+    # Check for admin override model
+    model_name = config_store.model_for("qa", DEFAULT_MODEL_NAME)
+
+    # Near-duplicate questions about the same context reuse the earlier answer
+    fingerprint = context_fingerprint(data.context, model_name)
+    cached = qa_answer_cache.lookup(fingerprint, data.question)
+    if cached:
+        return {"answer": cached["answer"], "cached": True}
+
+    # Only the profile core and the chunks relevant to the question go into the prompt
+    context_text, context_report = context_compactor.compact(data.context, data.question)
+    started = time.perf_counter()
+    answer = await key_pool.run(
+        "qa", run_qa, [data.openrouter_key, data.openrouter_key_backup],
+        data.question, context_text, data.serper_key, model_name,
+    )
+    elapsed = time.perf_counter() - started
+    context_compactor.record_answer(elapsed)
+    context_report["answer_ms"] = round(elapsed * 1000, 1)
+    qa_answer_cache.store(fingerprint, data.question, answer)
+    return {"answer": answer, "context": context_report}
+
+
+@app.post("/qa/stream")
+async def qa_stream(data: QARequest):
+    """SSE variant of /qa: tool-call and token events, then the answer."""
+    if data.session_id:
+        data.context = {**qa_context(load_session(data.session_id)), **data.context}
+    model_name = config_store.model_for("qa", DEFAULT_MODEL_NAME)
+    channel = EventChannel()
+
+    async def work():
+        channel.emit("stage_start", {"stage": "qa"})
+        fingerprint = context_fingerprint(data.context, model_name)
+        cached = qa_answer_cache.lookup(fingerprint, data.question)
+        if cached:
+            return cached["answer"]
+        context_text, context_report = context_compactor.compact(data.context, data.question)
+        channel.emit("context", context_report)
+        started = time.perf_counter()
+        answer = await key_pool.run(
+            "qa", run_qa, [data.openrouter_key, data.openrouter_key_backup],
+            data.question, context_text, data.serper_key, model_name, worker_channel(channel),
+            hedge=False,
         )
-        return qa_crew.kickoff()
-
-    try:
-        try:
-            result = execute_qa(data.openrouter_key)
-        except Exception as e:
-            if data.openrouter_key_backup:
-                print(f"Primary key failed in qa: {e}. Retrying with backup key...")
-                result = execute_qa(data.openrouter_key_backup)
-            else:
-                raise e
+        context_compactor.record_answer(time.perf_counter() - started)
+        qa_answer_cache.store(fingerprint, data.question, answer)
+        return answer
 
-        return {"answer": result.raw if hasattr(result, "raw") else str(result)}
-    finally:
-        # Cleanup API keys from environment variables
-        os.environ.pop("OPENROUTER_API_KEY", None)
-        os.environ.pop("SERPER_API_KEY", None)
+    return EventSourceResponse(event_stream(channel, work()))
 
 
 @app.get("/")
@@ -0,0 +1,346 @@
+# normalizer.py
+"""
+Rule-based profile normalizer for pipeline stage 0.
+
+Does the mechanical part of the normalizer agent's job locally: drops empty
+fields, flattens competitive exams to strings, expands country names, turns
+budgets into searchable ranges and standardises academic levels and
+specializations. Fields it cannot interpret are reported back so only those
+need to go to the LLM normalizer.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import clean_user_pref_locations
+
+# "rules": local only; "hybrid": local, with the LLM for fields the rules
+# cannot handle; "llm": always the LLM normalizer agent (previous behaviour)
+NORMALIZER_ENGINE = os.environ.get("CRS_NORMALIZER_ENGINE", "hybrid")
+
+_EMPTY_MARKERS = {
+    "", "-", "na", "n/a", "none", "null", "nil", "unknown", "not specified", "not applicable",
+    "not mentioned", "not provided",
+}
+# Free text that is passed through untouched apart from stripping
+_VERBATIM_FIELDS = {"raw_user_text", "user_feedback"}
+
+_ACADEMIC_LEVELS = {
+    "high_school": ["high school", "high_school", "highschool", "school", "12th", "class 12", "hsc", "secondary"],
+    "undergraduate": ["undergraduate", "undergrad", "ug", "bachelor", "bachelors", "college"],
+    "postgraduate": ["postgraduate", "post graduate", "pg", "graduate", "masters", "master", "phd", "doctorate"],
+    "working_professional": ["working_professional", "working professional", "professional", "working", "employed"],
+}
+_ACADEMIC_LEVEL_ALIASES = {alias: level for level, aliases in _ACADEMIC_LEVELS.items() for alias in aliases}
+
+_COUNTRY_ALIASES = {
+    "us": "United States", "usa": "United States", "u.s.": "United States", "u.s.a.": "United States",
+    "u.s": "United States", "america": "United States", "united states of america": "United States",
+    "uk": "United Kingdom", "u.k.": "United Kingdom", "britain": "United Kingdom",
+    "great britain": "United Kingdom", "england": "United Kingdom",
+    "uae": "United Arab Emirates", "dubai": "United Arab Emirates",
+    "nz": "New Zealand", "holland": "Netherlands", "the netherlands": "Netherlands",
+    "south korea": "South Korea", "korea": "South Korea",
+}
+
+_SPECIALIZATION_SYNONYMS = {
+    "cs": "Computer Science", "cse": "Computer Science", "comp sci": "Computer Science",
+    "computer science": "Computer Science", "computer science engineering": "Computer Science",
+    "computer science and engineering": "Computer Science",
+    "it": "Information Technology", "information technology": "Information Technology",
+    "ai": "Artificial Intelligence", "artificial intelligence": "Artificial Intelligence",
+    "ml": "Machine Learning", "machine learning": "Machine Learning",
+    "ai/ml": "Artificial Intelligence and Machine Learning", "ai ml": "Artificial Intelligence and Machine Learning",
+    "aiml": "Artificial Intelligence and Machine Learning",
+    "ds": "Data Science", "data science": "Data Science", "data analytics": "Data Analytics",
+    "se": "Software Engineering", "software engineering": "Software Engineering",
+    "cyber security": "Cybersecurity", "cybersecurity": "Cybersecurity",
+    "ece": "Electronics and Communication Engineering", "electronics": "Electronics and Communication Engineering",
+    "electronics and communication": "Electronics and Communication Engineering",
+    "eee": "Electrical and Electronics Engineering", "ee": "Electrical Engineering",
+    "electrical": "Electrical Engineering", "electrical engineering": "Electrical Engineering",
+    "mech": "Mechanical Engineering", "mechanical": "Mechanical Engineering",
+    "mechanical engineering": "Mechanical Engineering",
+    "civil": "Civil Engineering", "civil engineering": "Civil Engineering",
+    "chem": "Chemical Engineering", "chemical": "Chemical Engineering",
+    "biotech": "Biotechnology", "biotechnology": "Biotechnology",
+    "mba": "Business Administration", "bba": "Business Administration",
+    "business administration": "Business Administration",
+    "mbbs": "Medicine", "medicine": "Medicine", "medical": "Medicine",
+}
+
+_EXAM_NAME_KEYS = ("name", "exam", "exam_name", "title", "test")
+_EXAM_VALUE_KEYS = (
+    ("percentile", "{} percentile"), ("rank", "Rank {}"), ("score", "{}"), ("marks", "{}"), ("result", "{}"),
+    # The regex extractor's free-text snippet, e.g. "JEE Main 95 percentile"
+    ("details", "{}"),
+)
+
+# ==========================================
+# BUDGET PARSING
+# ==========================================
+# Longer and more specific spellings first so "C$" is not read as "$"
+_CURRENCY_PATTERNS = [
+    (re.compile(r"₹|\brs\.?|\binr\b|\brupees?\b", re.IGNORECASE), "INR"),
+    (re.compile(r"\bcad\b|\bc\$|canadian dollars?", re.IGNORECASE), "CAD"),
+    (re.compile(r"\baud\b|\ba\$|australian dollars?", re.IGNORECASE), "AUD"),
+    (re.compile(r"\bsgd\b|\bs\$|singapore dollars?", re.IGNORECASE), "SGD"),
+    (re.compile(r"\busd\b|\$|\bdollars?\b", re.IGNORECASE), "USD"),
+    (re.compile(r"€|\beur\b|\beuros?\b", re.IGNORECASE), "EUR"),
+    (re.compile(r"£|\bgbp\b|\bpounds?\b", re.IGNORECASE), "GBP"),
+]
+_AMOUNT = r"(\d+(?:,\d+)*(?:\.\d+)?)\s*(lakhs?|lacs?|lpa|l|crores?|cr|k|thousand|m|mn|million)?\b"
+_AMOUNT_PATTERN = re.compile(_AMOUNT, re.IGNORECASE)
+# Two amounts joined by "-" or "to", e.g. "15-20 lakhs", "$50k to $75k"
+_RANGE_PATTERN = re.compile(_AMOUNT + r"\s*(?:-|–|to)\s*(?:[₹$€£]|rs\.?|inr|usd)?\s*" + _AMOUNT, re.IGNORECASE)
+_UNIT_MULTIPLIERS = {
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5, "lpa": 1e5, "l": 1e5,
+    "crore": 1e7, "crores": 1e7, "cr": 1e7,
+    "k": 1e3, "thousand": 1e3, "m": 1e6, "mn": 1e6, "million": 1e6,
+}
+_INDIAN_UNITS = {"lakh", "lakhs", "lac", "lacs", "lpa", "l", "crore", "crores", "cr"}
+_CEILING_WORDS = re.compile(r"\b(?:under|below|less than|up ?to|max(?:imum)?|within|not more than)\b", re.IGNORECASE)
+_FLOOR_WORDS = re.compile(r"\b(?:above|over|more than|at least|min(?:imum)?)\b|\+", re.IGNORECASE)
+# A single amount is read as a ceiling and searched as the band just below it
+_SINGLE_AMOUNT_FLOOR = 0.75
+
+
+def _fmt(number: float) -> str:
+    return f"{number:.2f}".rstrip("0").rstrip(".")
+
+
+def parse_budget(value: Any) -> Optional[str]:
+    """
+    "20 lakhs" -> "15-20 lakhs", "15 to 20 lakh" -> "15-20 lakhs",
+    "$50k-75k" -> "50000-75000 USD", "above 1 crore" -> "1+ crores".
+    Returns None when the amount or currency cannot be determined.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+
+    range_match = _RANGE_PATTERN.search(value)
+    if range_match:
+        low_n, low_u, high_n, high_u = range_match.groups()
+        amounts = [(low_n, low_u or ""), (high_n, high_u or "")]
+    else:
+        single = _AMOUNT_PATTERN.search(value)
+        if not single:
+            return None
+        amounts = [(single.group(1), single.group(2) or "")]
+    numbers = [float(n.replace(",", "")) for n, _ in amounts]
+    units = [u.lower() for _, u in amounts]
+    # "15-20 lakhs": the trailing unit applies to both ends
+    if len(units) == 2 and not units[0]:
+        units[0] = units[1]
+    rupees_unit = any(u in _INDIAN_UNITS for u in units)
+    numbers = [n * _UNIT_MULTIPLIERS.get(u, 1) for n, u in zip(numbers, units)]
+
+    currency = next((code for pattern, code in _CURRENCY_PATTERNS if pattern.search(value)), None)
+    if currency is None:
+        # Indian units, or an amount only plausible in rupees
+        if rupees_unit or min(numbers) >= 1e5:
+            currency = "INR"
+        else:
+            return None
+
+    if len(numbers) == 2:
+        low, high, open_ended = min(numbers), max(numbers), False
+    elif _FLOOR_WORDS.search(value) and not _CEILING_WORDS.search(value):
+        low, high, open_ended = numbers[0], None, True
+    else:
+        low, high, open_ended = numbers[0] * _SINGLE_AMOUNT_FLOOR, numbers[0], False
+
+    if currency == "INR":
+        scale, unit = (1e7, "crores") if (high or low) >= 1e7 else (1e5, "lakhs")
+        low_text = _fmt(low / scale)
+        high_text = _fmt(high / scale) if high is not None else None
+    else:
+        unit = currency
+        low_text = str(int(round(low)))
+        high_text = str(int(round(high))) if high is not None else None
+
+    if open_ended:
+        return f"{low_text}+ {unit}"
+    return f"{low_text}-{high_text} {unit}"
+
+
+# ==========================================
+# FIELD NORMALIZERS
+# ==========================================
+def _is_empty(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in _EMPTY_MARKERS
+    if isinstance(value, (list, dict, tuple, set)):
+        return len(value) == 0
+    return False
+
+
+def _clean_text(value: str) -> str:
+    return re.sub(r"\s+", " ", value).strip()
+
+
+def _flatten_exam(exam: Any) -> Optional[str]:
+    if isinstance(exam, str):
+        return _clean_text(exam) or None
+    if not isinstance(exam, dict):
+        return None
+    name = next((exam[k] for k in _EXAM_NAME_KEYS if not _is_empty(exam.get(k))), None)
+    if name is None:
+        return None
+    # A key we do not know how to render would be silently lost: leave the field to the LLM
+    consumed = set(_EXAM_NAME_KEYS) | {k for k, _ in _EXAM_VALUE_KEYS}
+    if any(k not in consumed and not _is_empty(v) for k, v in exam.items()):
+        return None
+    name = _clean_text(str(name))
+    details = []
+    for key, fmt in _EXAM_VALUE_KEYS:
+        if _is_empty(exam.get(key)):
+            continue
+        detail = _clean_text(str(exam[key]))
+        # "JEE Main 95 percentile" under "JEE MAIN" -> "95 percentile"
+        if detail.lower().startswith(name.lower()):
+            detail = detail[len(name):].strip(" :-,")
+        if detail:
+            details.append(fmt.format(detail))
+    return f"{name}: {', '.join(details)}" if details else name
+
+
+def normalize_exams(value: Any) -> Optional[List[str]]:
+    """Competitive exams as a list of "Exam: score" strings, or None if some entry is not understood."""
+    if isinstance(value, str):
+        items: List[Any] = [part for part in re.split(r"[;\n]|,(?![^()]*\))", value) if part.strip()]
+    elif isinstance(value, dict):
+        # Either one exam object or a {"JEE Main": "95 percentile"} mapping
+        if any(k in value for k in _EXAM_NAME_KEYS):
+            items = [value]
+        else:
+            items = [f"{name}: {score}" for name, score in value.items() if not _is_empty(score)]
+    elif isinstance(value, list):
+        items = value
+    else:
+        return None
+
+    exams: List[str] = []
+    for item in items:
+        if _is_empty(item):
+            continue
+        flat = _flatten_exam(item)
+        if flat is None:
+            return None
+        if flat not in exams:
+            exams.append(flat)
+    return exams
+
+
+def normalize_locations(value: Any) -> Optional[List[str]]:
+    locations = clean_user_pref_locations(value)
+    if locations is None:
+        return None
+    normalized: List[str] = []
+    for location in locations:
+        if not isinstance(location, str):
+            return None
+        cleaned = _clean_text(location)
+        if _is_empty(cleaned):
+            continue
+        country = _COUNTRY_ALIASES.get(cleaned.lower())
+        if country is None:
+            country = cleaned.title() if cleaned.islower() else cleaned
+        if country not in normalized:
+            normalized.append(country)
+    return normalized
+
+
+def normalize_academic_level(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    return _ACADEMIC_LEVEL_ALIASES.get(_clean_text(value).lower().replace("-", " "))
+
+
+def normalize_specialization(value: Any) -> Any:
+    if isinstance(value, list):
+        return [normalize_specialization(v) for v in value if not _is_empty(v)]
+    if not isinstance(value, str):
+        return value
+    cleaned = _clean_text(value)
+    return _SPECIALIZATION_SYNONYMS.get(cleaned.lower(), cleaned)
+
+
+def normalize_profile(profile: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Normalize `profile` with local rules.
+
+    Returns the normalized profile and the fields the rules could not
+    interpret; those are left as given in the normalized profile.
+    """
+    normalized: Dict[str, Any] = {}
+    unresolved: List[str] = []
+
+    for field, value in profile.items():
+        if _is_empty(value):
+            continue
+
+        if field in _VERBATIM_FIELDS:
+            result = value.strip() if isinstance(value, str) else value
+        elif field == "academic_level":
+            result = normalize_academic_level(value)
+        elif field == "competitive_exams":
+            result = normalize_exams(value)
+        elif field == "preferred_locations":
+            result = normalize_locations(value)
+        elif field == "budget":
+            result = parse_budget(value)
+        elif field == "specialization":
+            result = normalize_specialization(value)
+        elif isinstance(value, str):
+            result = _clean_text(value)
+        elif isinstance(value, dict) or (isinstance(value, list) and any(isinstance(v, dict) for v in value)):
+            # Arbitrary nested objects are left to the LLM to flatten
+            result = None
+        else:
+            result = value
+
+        if result is None:
+            unresolved.append(field)
+            result = value
+        if not _is_empty(result):
+            normalized[field] = result
+
+    return normalized, unresolved
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """The JSON object in an LLM reply, tolerating markdown fences and surrounding prose."""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        parsed = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def llm_fallback_input(normalized: Dict[str, Any], unresolved: List[str]) -> Dict[str, Any]:
+    """The reduced profile sent to the LLM normalizer: unresolved fields plus a little context."""
+    subset = {field: normalized[field] for field in unresolved if field in normalized}
+    for field in ("academic_level", "preferred_locations"):
+        if field in normalized and field not in subset:
+            subset[field] = normalized[field]
+    return subset
+
+
+def merge_llm_fields(normalized: Dict[str, Any], unresolved: List[str], llm_output: str) -> Dict[str, Any]:
+    """Take the LLM's values for the unresolved fields; anything it omits keeps its original value."""
+    merged = dict(normalized)
+    llm_profile = parse_json_object(llm_output or "") or {}
+    for field in unresolved:
+        value = llm_profile.get(field)
+        if not _is_empty(value):
+            merged[field] = value
+    return merged
@@ -0,0 +1,112 @@
+# pipeline.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from agents import PIPELINE_STAGES
+
+# Key each stage's output is stored under, matching the frontend's agentResults
+RESULT_KEYS = {
+    "normalizer": "normalized_profile",
+    "matcher": "matched_programs",
+    "specialist": "ranked_programs",
+    "scholarship": "scholarships",
+    "reviews": "reviews",
+}
+
+# Scholarships and reviews both only need the ranked programs, so they run side by side
+STAGE_DEPENDENCIES = {
+    "normalizer": [],
+    "matcher": ["normalizer"],
+    "specialist": ["matcher"],
+    "scholarship": ["specialist"],
+    "reviews": ["specialist"],
+}
+
+
+class UpstreamFailed(Exception):
+    """A stage was skipped because one of its dependencies failed."""
+
+
+def ancestors(stage: str) -> List[str]:
+    """All stages `stage` transitively depends on, in pipeline order."""
+    seen = set()
+    pending = list(STAGE_DEPENDENCIES[stage])
+    while pending:
+        dep = pending.pop()
+        if dep not in seen:
+            seen.add(dep)
+            pending.extend(STAGE_DEPENDENCIES[dep])
+    return [s for s in PIPELINE_STAGES if s in seen]
+
+
+def descendants(stage: str) -> List[str]:
+    """All stages that transitively depend on `stage`, i.e. go stale when its output changes."""
+    return [s for s in PIPELINE_STAGES if stage in ancestors(s)]
+
+
+def consumed_input(stage: str, stage_input: dict) -> dict:
+    """
+    Exactly what `stage` reads from `stage_input`: the profile fields and its
+    upstream stages' outputs. Other stages' outputs, which clients often send
+    along, and empty feedback are dropped.
+    """
+    upstream = {RESULT_KEYS[dep] for dep in ancestors(stage)}
+    result_keys = set(RESULT_KEYS.values())
+    consumed = {k: v for k, v in stage_input.items() if k not in result_keys or k in upstream}
+    if consumed.get("user_feedback") in (None, "", "None"):
+        consumed.pop("user_feedback", None)
+    return consumed
+
+
+def build_stage_input(stage: str, profile: dict, results: Dict[str, Any]) -> dict:
+    """The profile plus the outputs of every upstream stage, as the frontend sends it."""
+    stage_input = dict(profile)
+    for dep in ancestors(stage):
+        stage_input[RESULT_KEYS[dep]] = results[dep]
+    return stage_input
+
+
+async def run_dag(run_fn: Callable[[str, Dict[str, Any]], Awaitable[Any]]) -> Dict[str, Any]:
+    """
+    Run every pipeline stage as soon as its dependencies have finished.
+
+    `run_fn(stage, results)` receives the outputs of all stages completed so far.
+    Returns results, per-stage timings and errors; stages downstream of a
+    failure are reported as skipped.
+    """
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    timings: Dict[str, Dict[str, float]] = {}
+    futures: Dict[str, asyncio.Future] = {}
+    started = time.perf_counter()
+
+    async def run_node(stage: str):
+        deps = [futures[d] for d in STAGE_DEPENDENCIES[stage]]
+        outcomes = await asyncio.gather(*deps, return_exceptions=True)
+        if any(isinstance(o, Exception) for o in outcomes):
+            errors[stage] = "Skipped: an upstream stage failed."
+            raise UpstreamFailed(stage)
+
+        stage_start = time.perf_counter()
+        try:
+            results[stage] = await run_fn(stage, results)
+        except Exception as e:
+            errors[stage] = str(e)
+            raise
+        finally:
+            timings[stage] = {
+                "start_ms": round((stage_start - started) * 1000, 1),
+                "duration_ms": round((time.perf_counter() - stage_start) * 1000, 1),
+            }
+
+    # PIPELINE_STAGES is topologically ordered, so dependencies are scheduled first
+    for stage in PIPELINE_STAGES:
+        futures[stage] = asyncio.ensure_future(run_node(stage))
+    await asyncio.gather(*futures.values(), return_exceptions=True)
+
+    return {
+        "results": {RESULT_KEYS[s]: results[s] for s in PIPELINE_STAGES if s in results},
+        "timings": {**timings, "total_ms": round((time.perf_counter() - started) * 1000, 1)},
+        "errors": errors,
+    }
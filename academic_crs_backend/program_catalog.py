@@ -0,0 +1,308 @@
+# program_catalog.py
+"""
+Local catalog of university programs, searched before going to Serper.
+
+Validated matcher programs (and optional seed files) are stored in SQLite,
+one record per university + program, with a full-text index over the names,
+degree, location and requirements. The matcher's catalog tool answers
+queries like "MS CS Germany" from it; entries older than the freshness
+window are reported as needing a re-check instead of being served.
+"""
+import calendar
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from normalizer import _COUNTRY_ALIASES, _SPECIALIZATION_SYNONYMS
+from program_parser import OPTIONAL_FIELDS, validate_program
+
+CATALOG_PATH = os.environ.get("CRS_CATALOG_PATH", "program_catalog.sqlite3")
+# Entries older than this are not served; the matcher re-checks them with a live search
+CATALOG_MAX_AGE_SECONDS = float(os.environ.get("CRS_CATALOG_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+# Comma-separated JSON/JSONL files of program records loaded into the catalog at startup
+CATALOG_SEED_FILES = [p.strip() for p in os.environ.get("CRS_CATALOG_SEED_FILES", "").split(",") if p.strip()]
+CATALOG_LOOKUP_LIMIT = int(os.environ.get("CRS_CATALOG_LOOKUP_LIMIT", "8"))
+
+# Stored per record, besides the university and program names
+RECORD_FIELDS = [f for f in OPTIONAL_FIELDS if f != "fit_reason"]
+_INDEXED_FIELDS = ["university", "program", "degree_level", "location", "requirements"]
+_MISSING_VALUES = {"", "not available", "n/a", "na", "unknown", "check website", "none"}
+
+_DEGREE_TERMS = {
+    # "m sc" etc. match dotted spellings in stored records ("M.Sc." is indexed as "m", "sc")
+    "master": [
+        "master", "masters", "msc", "ms", "ma", "meng", "mtech", "mba", "postgraduate", "m sc", "m eng", "m tech",
+    ],
+    "bachelor": ["bachelor", "bachelors", "bsc", "bs", "ba", "beng", "btech", "undergraduate", "b sc", "b eng", "b tech"],
+    "phd": ["phd", "doctorate", "doctoral", "ph d"],
+}
+# Query words that never narrow the result; required as AND terms they only cause misses
+_QUERY_STOPWORDS = {
+    "a", "an", "the", "in", "of", "for", "at", "to", "and", "or", "with", "on", "by", "from", "near",
+    "program", "programs", "programme", "programmes", "degree", "degrees", "course", "courses",
+    "study", "studies", "abroad", "best", "top", "university", "universities", "college", "colleges",
+}
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _alias_groups(*tables: Dict[str, str]) -> Dict[str, List[str]]:
+    """
+    Alias -> every spelling of its concept, in both directions: "cs" and
+    "computer science" each expand to the canonical name and all its aliases.
+    """
+    groups: Dict[str, List[str]] = {}
+    for table in tables:
+        spellings: Dict[str, List[str]] = {}
+        for alias, canonical in table.items():
+            spellings.setdefault(canonical.lower(), [canonical.lower()]).append(alias)
+        for terms in spellings.values():
+            for term in terms:
+                groups.setdefault(_key(term), list(dict.fromkeys(terms)))
+    return groups
+
+
+def _key(text: str) -> str:
+    return " ".join(_WORD.findall(text.lower()))
+
+
+_QUERY_ALIASES = _alias_groups(_COUNTRY_ALIASES, _SPECIALIZATION_SYNONYMS)
+_QUERY_ALIASES.update({term: terms for terms in _DEGREE_TERMS.values() for term in terms})
+_MAX_ALIAS_WORDS = max(len(alias.split()) for alias in _QUERY_ALIASES)
+
+
+def _has_value(value: Any) -> bool:
+    return value is not None and str(value).strip().lower() not in _MISSING_VALUES
+
+
+def _unchanged(values: Dict[str, Any], existing: List[Any]) -> bool:
+    """True if every known incoming value equals the stored one (ignoring case, spacing and punctuation)."""
+    return all(
+        values[field] is None or _key(str(values[field])) == _key(str(old or ""))
+        for field, old in zip(RECORD_FIELDS, existing)
+    )
+
+
+def _parse_day(value: Any) -> Optional[float]:
+    """Timestamp of a "YYYY-MM-DD" date (as reported in `search` results), else None."""
+    try:
+        return float(calendar.timegm(time.strptime(str(value).strip(), "%Y-%m-%d")))
+    except (TypeError, ValueError):
+        return None
+
+
+def _phrase(text: str) -> str:
+    return '"' + " ".join(_WORD.findall(text.lower())) + '"'
+
+
+def _query_words(query: str) -> List[str]:
+    text = query.lower()
+    # "M.Sc." -> "msc", "U.S." -> "us", "master's" -> "masters"
+    text = re.sub(r"(?<=[a-z])\.(?=[a-z])", "", text)
+    text = re.sub(r"(?<=[a-z])['’](?=[a-z])", "", text)
+    return _WORD.findall(text)
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression for a free-text query: every concept must match, and
+    degree, country and subject spellings match each other in both directions
+    (e.g. "MS CS USA" -> master/msc/... AND "computer science"/cs AND "united states"/usa).
+    Stopwords and single characters are ignored.
+    """
+    words = _query_words(query)
+    groups: List[str] = []
+    i = 0
+    while i < len(words):
+        # Longest alias first ("computer science and engineering")
+        for size in range(min(_MAX_ALIAS_WORDS, len(words) - i), 0, -1):
+            phrase = " ".join(words[i:i + size])
+            terms = _QUERY_ALIASES.get(phrase)
+            if terms is None and size == 1 and phrase not in _QUERY_STOPWORDS and len(phrase) > 1:
+                terms = [phrase]
+            if terms is not None:
+                group = "(" + " OR ".join(dict.fromkeys(_phrase(t) for t in terms)) + ")"
+                if group not in groups:
+                    groups.append(group)
+                i += size
+                break
+        else:
+            i += 1
+    return " AND ".join(groups) if groups else None
+
+
+class ProgramCatalog:
+    """SQLite program records with an FTS5 index; one connection shared behind a lock."""
+
+    def __init__(
+        self,
+        path: str = CATALOG_PATH,
+        max_age_seconds: float = CATALOG_MAX_AGE_SECONDS,
+        seed_files: Optional[List[str]] = None,
+    ):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.seed_files = seed_files if seed_files is not None else list(CATALOG_SEED_FILES)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upserts = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so importing the module does not touch disk
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = ", ".join(f"{f} TEXT" for f in RECORD_FIELDS)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS programs ("
+                "id INTEGER PRIMARY KEY, university_key TEXT, program_key TEXT, university TEXT, program TEXT, "
+                f"{columns}, source TEXT, updated_at REAL, UNIQUE (university_key, program_key))"
+            )
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS programs_fts USING fts5({', '.join(_INDEXED_FIELDS)})")
+            self._conn = conn
+            for seed in self.seed_files:
+                self._load_seed(seed)
+        return self._conn
+
+    def _load_seed(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            stripped = text.lstrip()
+            records = json.loads(stripped) if stripped.startswith("[") else [
+                json.loads(line) for line in text.splitlines() if line.strip()
+            ]
+        except (OSError, ValueError) as e:
+            print(f"Could not load catalog seed {path}: {e}")
+            return
+        mtime = os.path.getmtime(path)
+        stored = self._upsert(records, f"seed:{os.path.basename(path)}", default_time=mtime)
+        print(f"Loaded {stored} catalog record(s) from {path}")
+
+    def _upsert(self, records: List[Dict[str, Any]], source: str, default_time: Optional[float] = None) -> int:
+        """Insert or merge records; newer known values win and missing values never replace known ones."""
+        conn = self._conn
+        stored = 0
+        for record in records:
+            program, _ = validate_program(record)
+            if program is None:
+                continue
+            updated_at = program.get("updated_at")
+            if not isinstance(updated_at, (int, float)):
+                # A program copied from a lookup carries the catalog's own date: it was not re-checked
+                updated_at = _parse_day(program.get("updated")) or default_time or time.time()
+            keys = (_key(program["university"]), _key(program["program"]))
+            row = conn.execute(
+                f"SELECT id, updated_at, {', '.join(RECORD_FIELDS)} FROM programs "
+                "WHERE university_key = ? AND program_key = ?", keys,
+            ).fetchone()
+            values = {f: program.get(f) if _has_value(program.get(f)) else None for f in RECORD_FIELDS}
+            if row is not None:
+                row_id, existing_time, *existing = row
+                if _unchanged(values, existing):
+                    # Nothing new (e.g. the matcher echoed a catalog answer): keep the record's age,
+                    # so it still goes stale and gets re-checked with a live search
+                    continue
+                newer = updated_at >= (existing_time or 0)
+                for field, old in zip(RECORD_FIELDS, existing):
+                    if values[field] is None or (not newer and old is not None):
+                        values[field] = old
+                updated_at = max(updated_at, existing_time or 0)
+                assignments = ", ".join(f"{f} = ?" for f in RECORD_FIELDS)
+                conn.execute(
+                    f"UPDATE programs SET {assignments}, source = COALESCE(?, source), updated_at = ? WHERE id = ?",
+                    [values[f] for f in RECORD_FIELDS] + [source if newer else None, updated_at, row_id],
+                )
+                conn.execute("DELETE FROM programs_fts WHERE rowid = ?", (row_id,))
+            else:
+                row = [*keys, program["university"].strip(), program["program"].strip()]
+                row += [values[f] for f in RECORD_FIELDS] + [source, updated_at]
+                row_id = conn.execute(
+                    f"INSERT INTO programs (university_key, program_key, university, program, "
+                    f"{', '.join(RECORD_FIELDS)}, source, updated_at) VALUES ({', '.join('?' * len(row))})",
+                    row,
+                ).lastrowid
+            indexed = {"university": program["university"], "program": program["program"], **values}
+            conn.execute(
+                f"INSERT INTO programs_fts (rowid, {', '.join(_INDEXED_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(_INDEXED_FIELDS))})",
+                [row_id] + [indexed.get(f) or "" for f in _INDEXED_FIELDS],
+            )
+            stored += 1
+        conn.commit()
+        return stored
+
+    def add_programs(self, programs: List[Dict[str, Any]], source: str = "matcher") -> int:
+        """
+        Store validated programs (e.g. a matcher run's output); returns how many
+        were added or changed. Programs identical to their stored record are
+        left alone, so echoing a lookup result does not make it look fresh.
+        """
+        with self._lock:
+            self._connect()
+            stored = self._upsert(programs, source)
+            self.upserts += stored
+            return stored
+
+    def search(
+        self, query: str, limit: int = CATALOG_LOOKUP_LIMIT
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Best matches for `query`, split into fresh records and stale ones that need a re-check."""
+        match = build_match_query(query)
+        fresh: List[Dict[str, Any]] = []
+        stale: List[Dict[str, Any]] = []
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            self.lookups += 1
+            rows = []
+            if match:
+                try:
+                    rows = conn.execute(
+                        f"SELECT p.university, p.program, {', '.join('p.' + f for f in RECORD_FIELDS)}, p.updated_at "
+                        "FROM programs_fts JOIN programs p ON p.id = programs_fts.rowid "
+                        "WHERE programs_fts MATCH ? ORDER BY bm25(programs_fts) LIMIT ?",
+                        (match, limit),
+                    ).fetchall()
+                except sqlite3.OperationalError as e:
+                    print(f"Catalog query {match!r} failed: {e}")
+            for university, program, *values, updated_at in rows:
+                record = {"university": university, "program": program}
+                record.update({f: v for f, v in zip(RECORD_FIELDS, values) if v is not None})
+                record["updated"] = time.strftime("%Y-%m-%d", time.gmtime(updated_at))
+                (fresh if now - updated_at <= self.max_age_seconds else stale).append(record)
+            if fresh:
+                self.hits += 1
+            elif stale:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+        return fresh, stale
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect()
+            entries, fresh = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(updated_at >= ?), 0) FROM programs",
+                (time.time() - self.max_age_seconds,),
+            ).fetchone()
+            return {
+                "entries": entries,
+                "fresh_entries": fresh,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "upserts": self.upserts,
+            }
+
+
+program_catalog = ProgramCatalog()
@@ -0,0 +1,163 @@
+# program_parser.py
+"""
+Incremental, tolerant parsing of the matcher's JSON array of programs.
+
+LLM output is fed in as it arrives (stream tokens or the finished text). Code
+fences and prose around the array are skipped, and every object is parsed and
+validated as soon as its closing brace arrives, so a malformed entry only
+costs that entry instead of the whole stage.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Ask the LLM to repair malformed program objects instead of dropping them
+MATCHER_REPAIR = os.environ.get("CRS_MATCHER_REPAIR", "1") == "1"
+
+REQUIRED_FIELDS = ["university", "program"]
+OPTIONAL_FIELDS = [
+    "degree_level", "location", "duration", "tuition", "living_cost", "total_cost",
+    "requirements", "website", "fit_reason",
+]
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def validate_program(obj: Any) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Check one program object against the matcher schema. Returns the program
+    with scalar fields coerced to strings, or None and the list of problems.
+    """
+    if not isinstance(obj, dict):
+        return None, [f"expected an object, got {type(obj).__name__}"]
+    errors = []
+    program = dict(obj)
+    for field in REQUIRED_FIELDS:
+        value = obj.get(field)
+        if not isinstance(value, str) or not value.strip():
+            errors.append(f"'{field}' must be a non-empty string")
+    for field in OPTIONAL_FIELDS:
+        value = obj.get(field)
+        if value is None:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            program[field] = str(value)
+        elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+            program[field] = ", ".join(value)
+        elif not isinstance(value, str):
+            errors.append(f"'{field}' must be a string")
+    return (None, errors) if errors else (program, [])
+
+
+def _loads(text: str) -> Any:
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        # The most common slip: a trailing comma before a closing bracket
+        return json.loads(_TRAILING_COMMA.sub(r"\1", text), strict=False)
+
+
+class ProgramStreamParser:
+    """
+    Feed LLM output with `feed()`; each call returns the items completed by
+    that chunk as `("program", program)` or `("invalid", raw_text, errors)`.
+    """
+
+    def __init__(self):
+        self.programs: List[Dict[str, Any]] = []
+        self.invalid: List[Tuple[str, List[str]]] = []
+        self.closed = False
+        self._state = "seek"  # seek -> open (just saw "[") -> items -> done
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._current: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple]:
+        items: List[Tuple] = []
+        for ch in chunk:
+            if self._state == "done":
+                break
+            if self._state == "seek":
+                if ch == "[":
+                    self._state = "open"
+                continue
+            if self._state == "open":
+                # "[" only starts the array if an object or "]" follows, not e.g. "[1]" in prose
+                if ch.isspace():
+                    continue
+                if ch != "{" and ch != "]":
+                    self._state = "seek"
+                    continue
+                self._state = "items"
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._current = [ch]
+                elif ch == "]":
+                    self._state = "done"
+                    self.closed = True
+                continue
+
+            self._current.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(self._complete("".join(self._current)))
+                    self._current = []
+        return items
+
+    def _complete(self, text: str) -> Tuple:
+        try:
+            obj = _loads(text)
+        except ValueError as e:
+            errors = [f"invalid JSON: {e}"]
+        else:
+            program, errors = validate_program(obj)
+            if program is not None:
+                self.programs.append(program)
+                return ("program", program)
+        self.invalid.append((text, errors))
+        return ("invalid", text, errors)
+
+    def finish(self) -> Dict[str, Any]:
+        """End of output: an object cut off mid-way counts as invalid."""
+        if self._current:
+            self.invalid.append(("".join(self._current), ["truncated object"]))
+            self._current = []
+        return {"programs": self.programs, "invalid": self.invalid, "closed": self.closed}
+
+
+def parse_programs(text: str) -> Tuple[List[Dict[str, Any]], List[Tuple[str, List[str]]]]:
+    """Parse a complete matcher output into valid programs and malformed (raw_text, errors) pairs."""
+    parser = ProgramStreamParser()
+    parser.feed(text)
+    summary = parser.finish()
+    return summary["programs"], summary["invalid"]
+
+
+def repair_prompt(invalid: List[Tuple[str, List[str]]]) -> str:
+    """Prompt asking the LLM to fix only the malformed program objects."""
+    fields = ", ".join(REQUIRED_FIELDS + OPTIONAL_FIELDS)
+    entries = "\n\n".join(f"Object {i + 1} (problems: {'; '.join(errors)}):\n{text}" for i, (text, errors) in enumerate(invalid))
+    return f"""The following university-program objects are malformed.
+Fix each one so it is valid JSON with the string fields: {fields}.
+"university" and "program" are required. Keep every value that is present; use "Not available" for
+missing optional values and do NOT invent facts.
+
+{entries}
+
+Return ONLY a JSON array containing the fixed objects in the same order. No markdown."""
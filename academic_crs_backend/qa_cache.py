@@ -0,0 +1,243 @@
+# qa_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+QA_CACHE_THRESHOLD = float(os.environ.get("CRS_QA_CACHE_THRESHOLD", "0.82"))
+QA_CACHE_PER_CONTEXT = int(os.environ.get("CRS_QA_CACHE_PER_CONTEXT", "64"))
+QA_CACHE_MAX_CONTEXTS = int(os.environ.get("CRS_QA_CACHE_MAX_CONTEXTS", "256"))
+EMBEDDING_DIM = 2048
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+(?:['’][A-Za-z]+)?")
+# Words that carry no meaning for matching questions against each other
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "do", "does", "did", "what", "whats", "how",
+    "much", "many", "of", "for", "at", "in", "on", "to", "me", "my", "i", "can", "you", "please",
+    "tell", "about", "there", "it", "its", "and", "or", "this", "that", "which", "will", "would",
+    "should", "could", "we", "our", "us", "your", "need", "get", "any", "with", "from", "by",
+    "if", "when", "where", "who", "why", "hows", "know", "give", "per",
+}
+# Words and phrases folded onto one term, so that paraphrases of the same
+# question ("fee" / "tuition", "last date" / "deadline") embed alike
+_QUESTION_SYNONYMS = {
+    "tuition": ["fee", "fees", "tuition", "tuition fee", "tuition fees", "cost", "costs", "price", "charges"],
+    "living": ["living cost", "living costs", "cost of living", "living expenses", "expenses"],
+    "scholarship": ["scholarship", "scholarships", "funding", "financial aid", "grant", "grants", "stipend"],
+    "deadline": ["deadline", "deadlines", "last date", "due date", "closing date"],
+    "apply": ["apply", "application", "applications", "applying", "admission", "admissions"],
+    "requirement": [
+        "requirement", "requirements", "eligibility", "eligible", "criteria", "prerequisite",
+        "prerequisites", "required",
+    ],
+    "housing": ["housing", "accommodation", "hostel", "dorm", "dormitory", "residence"],
+    "visa": ["visa", "visas", "study permit", "permit"],
+    "duration": ["duration", "length", "long"],
+    "ranking": ["ranking", "rankings", "rank", "ranked"],
+    "job": ["job", "jobs", "placement", "placements", "employment", "career", "careers", "salary", "salaries"],
+}
+_SYNONYMS = {phrase: term for term, phrases in _QUESTION_SYNONYMS.items() for phrase in phrases}
+_MAX_SYNONYM_WORDS = max(len(phrase.split()) for phrase in _SYNONYMS)
+# Lower-case words allowed inside a multi-word name ("Technical University of Munich")
+_NAME_CONNECTORS = {"of", "de", "du", "der", "and", "the"}
+
+
+class QuestionKey:
+    """
+    What a question is about, split into the parts that must match exactly
+    (numbers and named entities) and the remaining intent words that are
+    compared by similarity.
+    """
+
+    def __init__(self, text: str):
+        tokens = [(m.group().replace("’", "").replace("'", ""), m.start()) for m in _TOKEN.finditer(text)]
+        self.numbers = frozenset(t.lower() for t, _ in tokens if any(c.isdigit() for c in t))
+        self.entities: List[Tuple[str, ...]] = []
+        words: List[str] = []
+        phrase: List[str] = []
+        for i, (token, _) in enumerate(tokens):
+            lower = token.lower()
+            if any(c.isdigit() for c in token):
+                continue
+            if token[0].isupper() and lower not in _STOPWORDS and lower not in _SYNONYMS:
+                phrase.append(token)
+                continue
+            following = tokens[i + 1][0] if i + 1 < len(tokens) else ""
+            if phrase and lower in _NAME_CONNECTORS and following[:1].isupper():
+                phrase.append(lower)
+                continue
+            if phrase:
+                self.entities.append(tuple(phrase))
+                phrase = []
+            words.append(lower)
+        if phrase:
+            self.entities.append(tuple(phrase))
+        self.words = self._canonical([w for w in words if w not in _STOPWORDS])
+
+    @staticmethod
+    def _canonical(words: List[str]) -> List[str]:
+        out: List[str] = []
+        i = 0
+        while i < len(words):
+            for size in range(min(_MAX_SYNONYM_WORDS, len(words) - i), 0, -1):
+                phrase = " ".join(words[i:i + size])
+                if phrase in _SYNONYMS:
+                    out.append(_SYNONYMS[phrase])
+                    i += size
+                    break
+            else:
+                out.append(words[i])
+                i += 1
+        return out
+
+    @staticmethod
+    def _same_name(a: Tuple[str, ...], b: Tuple[str, ...]) -> bool:
+        if [t.lower() for t in a] == [t.lower() for t in b]:
+            return True
+        # An abbreviation matches the initials of the full name ("TUM" / "TU Munich")
+        for short, full in ((a, b), (b, a)):
+            if len(short) == 1 and short[0].isupper() and len(full) > 1:
+                initials = "".join(t.lower() if t.isupper() else t[0].lower() for t in full if t not in _NAME_CONNECTORS)
+                if short[0].lower() == initials:
+                    return True
+        return False
+
+    def compatible(self, other: "QuestionKey") -> bool:
+        """True if both questions name the same numbers and entities and do not swap one unknown word for another."""
+        if self.numbers != other.numbers:
+            return False
+        for mine, theirs in ((self.entities, other.entities), (other.entities, self.entities)):
+            if not all(any(self._same_name(a, b) for b in theirs) for a in mine):
+                return False
+        # Lower-cased names slip past the entity check ("tu munich" / "tu berlin"):
+        # reject when each side has a word the other lacks that is not a known synonym
+        known = set(_QUESTION_SYNONYMS)
+        mine, theirs = set(self.words) - known, set(other.words) - known
+        return not (mine - theirs and theirs - mine)
+
+
+def embed_question(text: str) -> np.ndarray:
+    """
+    L2-normalised hashed bag of word unigrams/bigrams and character trigrams
+    over the question's intent words (see `QuestionKey`). Purely local and
+    deterministic, so vectors are comparable across processes.
+    """
+    return _embed_words(QuestionKey(text).words)
+
+
+def _embed_words(words: List[str]) -> np.ndarray:
+    features: List[str] = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f" {w} "
+        features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature in features:
+        vector[zlib.crc32(feature.encode("utf-8")) % EMBEDDING_DIM] += 1.0
+    np.log1p(vector, out=vector)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def context_fingerprint(context: Any, model_name: str = "") -> str:
+    payload = json.dumps(context, sort_keys=True, default=str) + "\0" + model_name
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Scope:
+    """Questions and answers cached for one context."""
+
+    def __init__(self):
+        self.vectors = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self.questions: List[str] = []
+        self.keys: List[QuestionKey] = []
+        self.answers: List[str] = []
+
+
+class SemanticAnswerCache:
+    """
+    Near-duplicate question cache for /qa.
+
+    Answers are only reused for the same context fingerprint (same profile and
+    agent outputs) when the cosine similarity of the questions' intent words
+    reaches `threshold` and both name the same numbers and entities, so
+    "fees at TU Munich" is never answered with the TU Berlin answer. Each context keeps its `per_context` most recent answers and
+    the least recently used contexts are dropped beyond `max_contexts`.
+    """
+
+    def __init__(
+        self,
+        threshold: float = QA_CACHE_THRESHOLD,
+        per_context: int = QA_CACHE_PER_CONTEXT,
+        max_contexts: int = QA_CACHE_MAX_CONTEXTS,
+    ):
+        self.threshold = threshold
+        self.per_context = per_context
+        self.max_contexts = max_contexts
+        self._scopes: "OrderedDict[str, _Scope]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Similar enough but about a different entity or number
+        self.rejected = 0
+
+    def lookup(self, fingerprint: str, question: str) -> Optional[Dict[str, Any]]:
+        key = QuestionKey(question)
+        vector = _embed_words(key.words)
+        with self._lock:
+            scope = self._scopes.get(fingerprint)
+            if scope is None or not scope.answers:
+                self.misses += 1
+                return None
+            self._scopes.move_to_end(fingerprint)
+            similarities = scope.vectors @ vector
+            for best in np.argsort(-similarities):
+                score = float(similarities[best])
+                if score < self.threshold:
+                    break
+                if not key.compatible(scope.keys[best]):
+                    self.rejected += 1
+                    continue
+                self.hits += 1
+                return {"answer": scope.answers[best], "matched_question": scope.questions[best], "similarity": round(score, 3)}
+            self.misses += 1
+            return None
+
+    def store(self, fingerprint: str, question: str, answer: str):
+        key = QuestionKey(question)
+        vector = _embed_words(key.words)
+        with self._lock:
+            scope = self._scopes.get(fingerprint)
+            if scope is None:
+                scope = _Scope()
+                self._scopes[fingerprint] = scope
+                while len(self._scopes) > self.max_contexts:
+                    self._scopes.popitem(last=False)
+            self._scopes.move_to_end(fingerprint)
+            scope.vectors = np.vstack([scope.vectors, vector])[-self.per_context:]
+            scope.questions = (scope.questions + [question])[-self.per_context:]
+            scope.keys = (scope.keys + [key])[-self.per_context:]
+            scope.answers = (scope.answers + [answer])[-self.per_context:]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "contexts": len(self._scopes),
+                "entries": sum(len(s.answers) for s in self._scopes.values()),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+qa_answer_cache = SemanticAnswerCache()
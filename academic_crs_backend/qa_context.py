@@ -0,0 +1,242 @@
+# qa_context.py
+"""
+Retrieval-based context compaction for /qa.
+
+Instead of pasting the whole profile and every agent output into the QA
+prompt, agent outputs are split into chunks, indexed with BM25, and only the
+chunks most relevant to the question (plus the core profile fields) are sent,
+within a token budget.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Tuple
+
+# Approximate prompt tokens allowed for the context; 0 sends the full context as before
+QA_CONTEXT_TOKENS = int(os.environ.get("CRS_QA_CONTEXT_TOKENS", "1500"))
+QA_CONTEXT_TOP_K = int(os.environ.get("CRS_QA_CONTEXT_TOP_K", "8"))
+QA_CHUNK_CHARS = int(os.environ.get("CRS_QA_CHUNK_CHARS", "800"))
+QA_INDEX_CACHE_SIZE = int(os.environ.get("CRS_QA_INDEX_CACHE_SIZE", "128"))
+
+# Profile fields always sent with the question
+CORE_PROFILE_FIELDS = [
+    "student_name", "academic_level", "current_degree", "graduation_year", "cgpa", "board", "class12_score",
+    "competitive_exams", "career_goal", "preferred_locations", "budget", "specialization",
+]
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "do", "does", "what", "how", "of", "for", "at", "in", "on",
+    "to", "me", "my", "i", "can", "you", "and", "or", "this", "that", "which", "with", "it", "its", "by",
+}
+# Blank lines, markdown headings and list items start a new block
+_BLOCK_BREAK = re.compile(r"\n\s*\n|\n(?=#{1,6} )|\n(?=\s*(?:[-*]|\d+[.)]) )")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _parse(value: Any) -> Any:
+    if isinstance(value, str):
+        stripped = value.strip()
+        if stripped.startswith("```"):
+            stripped = stripped.strip("`").partition("\n")[2]
+        if stripped[:1] in ("{", "["):
+            try:
+                return json.loads(stripped)
+            except ValueError:
+                pass
+    return value
+
+
+def chunk_value(value: Any, max_chars: int = QA_CHUNK_CHARS) -> List[str]:
+    """Split one agent output into retrievable chunks: JSON array items, or groups of text blocks."""
+    value = _parse(value)
+    if isinstance(value, list):
+        return [json.dumps(item, ensure_ascii=False) for item in value if item not in (None, "", {}, [])]
+    if isinstance(value, dict):
+        return [json.dumps({k: v}, ensure_ascii=False) for k, v in value.items() if v not in (None, "", {}, [])]
+    if value is None:
+        return []
+
+    chunks: List[str] = []
+    current = ""
+    for block in _BLOCK_BREAK.split(str(value)):
+        block = block.strip()
+        if not block:
+            continue
+        if current and len(current) + len(block) + 2 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{block}" if current else block
+        while len(current) > max_chars:
+            chunks.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a small in-memory list of documents."""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(_terms(doc)) for doc in documents]
+        self.lengths = [sum(tc.values()) for tc in self.term_counts]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        document_frequency: Counter = Counter()
+        for tc in self.term_counts:
+            document_frequency.update(tc.keys())
+        n = len(documents)
+        self.idf = {t: math.log(1 + (n - df + 0.5) / (df + 0.5)) for t, df in document_frequency.items()}
+
+    def scores(self, query: str) -> List[float]:
+        terms = [t for t in set(_terms(query)) if t in self.idf]
+        results = []
+        for tc, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for t in terms:
+                f = tc.get(t)
+                if f:
+                    score += self.idf[t] * f * (self.k1 + 1) / (f + norm)
+            results.append(score)
+        return results
+
+
+class _ContextIndex:
+    """Core profile plus the chunked, indexed agent outputs of one context."""
+
+    def __init__(self, context: Dict[str, Any]):
+        profile = _parse(context.get("profile"))
+        self.core: Dict[str, Any] = {}
+        self.chunks: List[Tuple[str, str]] = []
+        if isinstance(profile, dict):
+            self.core = {f: profile[f] for f in CORE_PROFILE_FIELDS if profile.get(f) not in (None, "", [])}
+        elif profile:
+            self.chunks += [("profile", c) for c in chunk_value(profile)]
+        for section, value in context.items():
+            if section != "profile":
+                self.chunks += [(section, c) for c in chunk_value(value)]
+        self.index = BM25Index([f"{section} {text}" for section, text in self.chunks])
+
+
+class ContextCompactor:
+    """Builds compact QA contexts, reusing each context's index across questions."""
+
+    def __init__(
+        self,
+        token_budget: int = QA_CONTEXT_TOKENS,
+        top_k: int = QA_CONTEXT_TOP_K,
+        cache_size: int = QA_INDEX_CACHE_SIZE,
+    ):
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.cache_size = cache_size
+        self._indexes: "OrderedDict[str, _ContextIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.full_tokens = 0
+        self.compact_tokens = 0
+        self.answer_seconds = 0.0
+        self.answers = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.token_budget > 0
+
+    def _index_for(self, context: Dict[str, Any]) -> _ContextIndex:
+        key = hashlib.sha256(json.dumps(context, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+        index = _ContextIndex(context)
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.cache_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def compact(self, context: Dict[str, Any], question: str) -> Tuple[str, Dict[str, Any]]:
+        """Return the context text for the QA prompt and a report of its size."""
+        started = time.perf_counter()
+        full_text = json.dumps(context)
+        if not self.enabled:
+            return full_text, self._report(full_text, full_text, started)
+
+        index = self._index_for(context)
+        core_text = json.dumps(index.core, ensure_ascii=False) if index.core else ""
+        remaining = self.token_budget - estimate_tokens(core_text)
+
+        scores = index.index.scores(question)
+        ranked = sorted((i for i in range(len(index.chunks)) if scores[i] > 0), key=lambda i: scores[i], reverse=True)
+        if not ranked:
+            # Nothing matches the question: give an overview, one chunk per section in order
+            seen = set()
+            ranked = [i for i, (section, _) in enumerate(index.chunks) if not (section in seen or seen.add(section))]
+
+        selected: List[int] = []
+        for i in ranked:
+            if len(selected) >= self.top_k:
+                break
+            cost = estimate_tokens(index.chunks[i][1]) + 4
+            if cost <= remaining:
+                selected.append(i)
+                remaining -= cost
+
+        parts = []
+        if core_text:
+            parts.append(f"STUDENT PROFILE:\n{core_text}")
+        if selected:
+            excerpts = "\n\n".join(f"[{index.chunks[i][0]}]\n{index.chunks[i][1]}" for i in sorted(selected))
+            parts.append(f"RELEVANT EXCERPTS:\n{excerpts}")
+        compact_text = "\n\n".join(parts)
+        report = self._report(full_text, compact_text, started)
+        report.update({"chunks_total": len(index.chunks), "chunks_used": len(selected)})
+        return compact_text, report
+
+    def _report(self, full_text: str, compact_text: str, started: float) -> Dict[str, Any]:
+        full_tokens, compact_tokens = estimate_tokens(full_text), estimate_tokens(compact_text)
+        with self._lock:
+            self.requests += 1
+            self.full_tokens += full_tokens
+            self.compact_tokens += compact_tokens
+        return {
+            "full_context_tokens": full_tokens,
+            "prompt_context_tokens": compact_tokens,
+            "compaction_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def record_answer(self, seconds: float):
+        with self._lock:
+            self.answers += 1
+            self.answer_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "indexed_contexts": len(self._indexes),
+                "requests": self.requests,
+                "avg_full_context_tokens": round(self.full_tokens / self.requests) if self.requests else 0,
+                "avg_prompt_context_tokens": round(self.compact_tokens / self.requests) if self.requests else 0,
+                "avg_answer_ms": round(self.answer_seconds / self.answers * 1000, 1) if self.answers else 0.0,
+            }
+
+
+context_compactor = ContextCompactor()
@@ -0,0 +1,125 @@
+# registry.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from agents import create_agent, create_llm, create_tools
+
+REGISTRY_MAX_ENTRIES = int(os.environ.get("CRS_REGISTRY_MAX_ENTRIES", "64"))
+REGISTRY_TTL_SECONDS = float(os.environ.get("CRS_REGISTRY_TTL_SECONDS", "1800"))
+
+
+def credential_fingerprint(*secrets: Optional[str]) -> str:
+    """Short, non-reversible fingerprint of the given credentials for use in cache keys."""
+    digest = hashlib.sha256("\0".join(s or "" for s in secrets).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class _Bundle:
+    """LLM, tools and lazily built agents for one (model, credentials) pair."""
+
+    def __init__(self, openrouter_api_key: str, serper_api_key: str, llm_model_name: str, stream: bool):
+        self.llm = create_llm(openrouter_api_key, llm_model_name, stream=stream)
+        self.tools = create_tools(serper_api_key)
+        self.agents: Dict[str, Any] = {}
+        self.locks: Dict[str, threading.Lock] = {}
+        self.last_used = time.monotonic()
+
+
+class AgentRegistry:
+    """
+    Process-level cache of CrewAI agents.
+
+    Entries are keyed by model name plus a fingerprint of the credentials and
+    hold one agent per stage, built on first use. Entries are evicted LRU-first
+    once `max_entries` is exceeded, or when idle for longer than `ttl_seconds`.
+
+    CrewAI agents keep per-run executor state, so a cached agent is only handed
+    to one run at a time; concurrent runs of the same stage get a copy instead.
+    """
+
+    def __init__(self, max_entries: int = REGISTRY_MAX_ENTRIES, ttl_seconds: float = REGISTRY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, _Bundle]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.contended = 0
+        self.evictions = 0
+
+    def _evict_expired(self, now: float):
+        expired = [k for k, b in self._entries.items() if now - b.last_used > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+            self.evictions += 1
+
+    def _get_agent(self, stage: str, openrouter_api_key: str, serper_api_key: str, llm_model_name: str, stream: bool):
+        key = (llm_model_name, credential_fingerprint(openrouter_api_key, serper_api_key), stream)
+        with self._lock:
+            now = time.monotonic()
+            self._evict_expired(now)
+
+            bundle = self._entries.get(key)
+            if bundle is None:
+                bundle = _Bundle(openrouter_api_key, serper_api_key, llm_model_name, stream)
+                self._entries[key] = bundle
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._entries.move_to_end(key)
+            bundle.last_used = now
+
+            agent = bundle.agents.get(stage)
+            if agent is None:
+                self.misses += 1
+                agent = create_agent(stage, bundle.llm, bundle.tools)
+                bundle.agents[stage] = agent
+                bundle.locks[stage] = threading.Lock()
+            else:
+                self.hits += 1
+            return agent, bundle.locks[stage]
+
+    @contextmanager
+    def lease(self, stage: str, openrouter_api_key: str, serper_api_key: str, llm_model_name: str, stream: bool = False):
+        """
+        Yield an agent for `stage` that is safe to run for the duration of the block.
+        With `stream=True` the agent's LLM streams tokens (kept as a separate entry).
+        """
+        agent, lock = self._get_agent(stage, openrouter_api_key, serper_api_key, llm_model_name, stream)
+
+        if not lock.acquire(blocking=False):
+            with self._lock:
+                self.contended += 1
+            yield agent.copy()
+            return
+        try:
+            yield agent
+        finally:
+            lock.release()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "contended": self.contended,
+                "evictions": self.evictions,
+            }
+
+
+agent_registry = AgentRegistry()
@@ -0,0 +1,256 @@
+# scheduler.py
+"""
+Rate-limit-aware scheduling of upstream calls (OpenRouter completions and
+Serper searches).
+
+Every call takes a token from the bucket of its (upstream, API key) pair.
+When callers have to wait, the highest priority class goes first: interactive
+requests (/qa, /extract-profile) before pipeline stages, and pipeline stages
+before bulk jobs. A 429 pauses that key's bucket with exponential backoff (or
+the server's Retry-After) and the call is retried.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Priority classes, most urgent first
+PRIORITIES = {"interactive": 0, "background": 1, "bulk": 2}
+# Priority of each key_pool endpoint; anything else runs as "background"
+ENDPOINT_PRIORITIES = {"qa": "interactive", "extract_profile": "interactive", "bulk_intake": "bulk"}
+
+
+def parse_rates(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "openrouter=20/60,serper=5/1" into {"openrouter": (20, 60), "serper": (5, 1)}."""
+    rates: Dict[str, Tuple[float, float]] = {}
+    for part in value.split(","):
+        name, _, rate = part.partition("=")
+        requests, _, seconds = rate.partition("/")
+        try:
+            rates[name.strip()] = (float(requests), float(seconds or 1))
+        except ValueError:
+            continue
+    return rates
+
+
+# Per-key request rates as requests/seconds; the request count is also the burst size
+SCHEDULER_RATES = parse_rates(os.environ.get("CRS_SCHEDULER_RATES", "openrouter=20/60,serper=5/1"))
+# Retries of a rate-limited call before the 429 is raised to the caller
+SCHEDULER_MAX_RETRIES = int(os.environ.get("CRS_SCHEDULER_MAX_RETRIES", "2"))
+SCHEDULER_BACKOFF_SECONDS = float(os.environ.get("CRS_SCHEDULER_BACKOFF_SECONDS", "2"))
+SCHEDULER_MAX_BACKOFF_SECONDS = float(os.environ.get("CRS_SCHEDULER_MAX_BACKOFF_SECONDS", "60"))
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("crs_priority", default="background")
+
+
+def is_rate_limit(error: BaseException) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return "ratelimit" in text or "rate limit" in text or "429" in text
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from the Retry-After header of the error's HTTP response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def priority(name: str):
+    """Run the enclosed upstream calls in priority class `name`."""
+    token = _priority.set(name if name in PRIORITIES else "background")
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def run_with_priority(name: str, fn: Callable, *args, **kwargs):
+    """`fn(*args, **kwargs)` in priority class `name`; module-level so the process pool can pickle it."""
+    with priority(name):
+        return fn(*args, **kwargs)
+
+
+class _Bucket:
+    """Token bucket, backoff state and priority-ordered waiters for one upstream key."""
+
+    def __init__(self, requests: float, seconds: float):
+        self.capacity = max(requests, 1.0)
+        self.refill_rate = requests / seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.backoffs = 0
+        self.waiters: List[Tuple[int, int]] = []
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until this bucket can hand out a token."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.refill_rate
+
+
+class _ClassStats:
+    def __init__(self):
+        self.calls = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "queue_depth": self.waiting,
+            "avg_wait_ms": round(self.total_wait / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+class UpstreamScheduler:
+    """
+    Token buckets per upstream key with priority queueing and 429 backoff.
+
+    Calls block the worker thread they run on while they wait. In process
+    executor mode each worker process schedules its own calls.
+    """
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_retries: int = SCHEDULER_MAX_RETRIES,
+        backoff_seconds: float = SCHEDULER_BACKOFF_SECONDS,
+        max_backoff_seconds: float = SCHEDULER_MAX_BACKOFF_SECONDS,
+    ):
+        self.rates = rates if rates is not None else dict(SCHEDULER_RATES)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        self._classes: Dict[Tuple[str, str], _ClassStats] = {}
+        self._cond = threading.Condition()
+        self._sequence = itertools.count()
+        self.rate_limited: Dict[str, int] = {}
+        self.retries: Dict[str, int] = {}
+
+    def _class_stats(self, upstream: str, name: str) -> _ClassStats:
+        stats = self._classes.get((upstream, name))
+        if stats is None:
+            stats = self._classes[(upstream, name)] = _ClassStats()
+        return stats
+
+    def acquire(self, upstream: str, api_key: str, priority_name: Optional[str] = None) -> float:
+        """Block until a token for `api_key` on `upstream` is available; returns the seconds waited."""
+        if upstream not in self.rates:
+            return 0.0
+        name = priority_name or current_priority()
+        entry = (PRIORITIES.get(name, PRIORITIES["background"]), next(self._sequence))
+        queued_at = time.monotonic()
+        with self._cond:
+            bucket = self._buckets.get((upstream, api_key))
+            if bucket is None:
+                bucket = self._buckets[(upstream, api_key)] = _Bucket(*self.rates[upstream])
+            stats = self._class_stats(upstream, name)
+            heapq.heappush(bucket.waiters, entry)
+            stats.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    bucket.refill(now)
+                    delay = bucket.delay(now)
+                    if bucket.waiters[0] == entry and delay == 0:
+                        heapq.heappop(bucket.waiters)
+                        bucket.tokens -= 1
+                        break
+                    # Only the head of the queue waits for the bucket; the rest wait to become head
+                    self._cond.wait(timeout=delay if bucket.waiters[0] == entry else None)
+            except BaseException:
+                bucket.waiters.remove(entry)
+                heapq.heapify(bucket.waiters)
+                raise
+            finally:
+                stats.waiting -= 1
+                self._cond.notify_all()
+
+            waited = time.monotonic() - queued_at
+            stats.calls += 1
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+        return waited
+
+    def backoff(self, upstream: str, api_key: str, error: BaseException):
+        """Pause `api_key` on `upstream` after a 429: Retry-After if given, else exponential."""
+        with self._cond:
+            bucket = self._buckets.get((upstream, api_key))
+            if bucket is None:
+                return
+            delay = retry_after(error)
+            if delay is None:
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** bucket.backoffs)
+            bucket.backoffs += 1
+            bucket.tokens = 0.0
+            bucket.paused_until = max(bucket.paused_until, time.monotonic() + delay)
+            self.rate_limited[upstream] = self.rate_limited.get(upstream, 0) + 1
+            self._cond.notify_all()
+        print(f"{upstream} rate limited, pausing key for {delay:.1f}s")
+
+    def _recovered(self, upstream: str, api_key: str):
+        with self._cond:
+            bucket = self._buckets.get((upstream, api_key))
+            if bucket is not None:
+                bucket.backoffs = 0
+
+    def call(self, upstream: str, api_key: str, fn: Callable[[], Any]):
+        """Run `fn()` once a token is available, backing off and retrying on 429."""
+        attempt = 0
+        while True:
+            self.acquire(upstream, api_key)
+            try:
+                result = fn()
+            except Exception as e:
+                if upstream not in self.rates or not is_rate_limit(e):
+                    raise
+                self.backoff(upstream, api_key, e)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                with self._cond:
+                    self.retries[upstream] = self.retries.get(upstream, 0) + 1
+                continue
+            if attempt:
+                self._recovered(upstream, api_key)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._cond:
+            upstreams: Dict[str, Any] = {}
+            for upstream, (requests, seconds) in self.rates.items():
+                buckets = [b for (u, _), b in self._buckets.items() if u == upstream]
+                upstreams[upstream] = {
+                    "rate": f"{requests:g}/{seconds:g}s",
+                    "keys": len(buckets),
+                    "paused_keys": sum(1 for b in buckets if now < b.paused_until),
+                    "rate_limited": self.rate_limited.get(upstream, 0),
+                    "retries": self.retries.get(upstream, 0),
+                    "priorities": {
+                        name: stats.stats() for (u, name), stats in self._classes.items() if u == upstream
+                    },
+                }
+            return upstreams
+
+
+upstream_scheduler = UpstreamScheduler()
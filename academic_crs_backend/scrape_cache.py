@@ -0,0 +1,188 @@
+# scrape_cache.py
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import requests
+from bs4 import BeautifulSoup
+
+from cache_backends import SingleFlight, SQLiteTTLCache
+from http_clients import HTTP_SCRAPE_TIMEOUT, http_clients
+
+SCRAPE_CACHE_PATH = os.environ.get("CRS_SCRAPE_CACHE_PATH", "scrape_cache.sqlite3")
+# Pages younger than this are served without contacting the site at all
+SCRAPE_FRESH_SECONDS = float(os.environ.get("CRS_SCRAPE_FRESH_SECONDS", str(24 * 3600)))
+# Older pages are revalidated with ETag/Last-Modified until they are dropped
+SCRAPE_MAX_AGE_SECONDS = float(os.environ.get("CRS_SCRAPE_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+SCRAPE_MAX_ENTRIES = int(os.environ.get("CRS_SCRAPE_MAX_ENTRIES", "5000"))
+# Stop downloading a page after this many bytes of HTML
+SCRAPE_MAX_BYTES = int(os.environ.get("CRS_SCRAPE_MAX_BYTES", str(2 * 1024 * 1024)))
+# Characters of extracted text handed to the agent per scrape
+SCRAPE_WINDOW_CHARS = int(os.environ.get("CRS_SCRAPE_WINDOW_CHARS", "6000"))
+
+_BOILERPLATE_TAGS = ["script", "style", "noscript", "svg", "nav", "header", "footer", "aside", "form", "iframe"]
+_WORD = re.compile(r"[a-z0-9]{3,}")
+
+
+def extract_main_text(html: str) -> str:
+    """Visible text of the page's main content, one block per line."""
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(_BOILERPLATE_TAGS):
+        tag.decompose()
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    text = root.get_text("\n")
+    lines = (re.sub(r"[ \t\xa0]+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def relevant_window(text: str, query: Optional[str], max_chars: int = SCRAPE_WINDOW_CHARS) -> str:
+    """
+    The contiguous run of lines, at most `max_chars` long, that mentions the
+    query terms most often. Without a query the start of the page is returned.
+    """
+    if len(text) <= max_chars:
+        return text
+    lines = text.split("\n")
+    terms = set(_WORD.findall((query or "").lower()))
+    if not terms:
+        return text[:max_chars]
+
+    scores = [sum(1 for w in _WORD.findall(line.lower()) if w in terms) for line in lines]
+    best_score, best_start, best_end = -1, 0, 0
+    start, size, score = 0, 0, 0
+    for end, line in enumerate(lines):
+        size += len(line) + 1
+        score += scores[end]
+        while size > max_chars and start <= end:
+            size -= len(lines[start]) + 1
+            score -= scores[start]
+            start += 1
+        if score > best_score:
+            best_score, best_start, best_end = score, start, end + 1
+
+    # Re-centre the window on the matching lines so they get context on both sides
+    hits = [i for i in range(best_start, best_end) if scores[i]]
+    if hits:
+        best_start, best_end = hits[0], hits[-1] + 1
+        size = sum(len(line) + 1 for line in lines[best_start:best_end])
+        grew = True
+        while grew:
+            grew = False
+            if best_start > 0 and size + len(lines[best_start - 1]) + 1 <= max_chars:
+                best_start -= 1
+                size += len(lines[best_start]) + 1
+                grew = True
+            if best_end < len(lines) and size + len(lines[best_end]) + 1 <= max_chars:
+                size += len(lines[best_end]) + 1
+                best_end += 1
+                grew = True
+
+    window = "\n".join(lines[best_start:best_end]) or text[:max_chars]
+    prefix = "...\n" if best_start > 0 else ""
+    suffix = "\n..." if best_end < len(lines) else ""
+    return prefix + window + suffix
+
+
+def _read_capped(response: requests.Response, max_bytes: int) -> bytes:
+    chunks: List[bytes] = []
+    size = 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            break
+    return b"".join(chunks)[:max_bytes]
+
+
+class PageCache:
+    """
+    Cache of extracted page text, stored zlib-compressed in SQLite.
+
+    Fresh pages are served from disk; stale ones are revalidated with a
+    conditional GET so unchanged pages are not downloaded or parsed again.
+    """
+
+    def __init__(
+        self,
+        path: str = SCRAPE_CACHE_PATH,
+        fresh_seconds: float = SCRAPE_FRESH_SECONDS,
+        max_age_seconds: float = SCRAPE_MAX_AGE_SECONDS,
+        max_entries: int = SCRAPE_MAX_ENTRIES,
+        max_bytes: int = SCRAPE_MAX_BYTES,
+    ):
+        self.store = SQLiteTTLCache(path, table="pages", ttl_seconds=max_age_seconds, max_entries=max_entries)
+        self.fresh_seconds = fresh_seconds
+        self.max_bytes = max_bytes
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.fetches = 0
+        self.errors = 0
+
+    def _load(self, url: str) -> Optional[Dict[str, Any]]:
+        blob = self.store.get(url)
+        return json.loads(zlib.decompress(blob)) if blob is not None else None
+
+    def _save(self, url: str, record: Dict[str, Any]):
+        self.store.set(url, zlib.compress(json.dumps(record).encode("utf-8")))
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_text(self, url: str, headers: Optional[Dict[str, str]] = None, cookies: Optional[dict] = None) -> str:
+        record = self._load(url)
+        if record and time.time() - record["fetched_at"] < self.fresh_seconds:
+            self._count("hits")
+            return record["text"]
+        text, _ = self._flight.do(url, lambda: self._fetch(url, record, headers or {}, cookies or {}))
+        return text
+
+    def _fetch(self, url: str, record: Optional[Dict[str, Any]], headers: Dict[str, str], cookies: dict) -> str:
+        request_headers = dict(headers)
+        if record and record.get("etag"):
+            request_headers["If-None-Match"] = record["etag"]
+        if record and record.get("last_modified"):
+            request_headers["If-Modified-Since"] = record["last_modified"]
+
+        try:
+            session = http_clients.scrape
+            with session.get(url, timeout=HTTP_SCRAPE_TIMEOUT, headers=request_headers, cookies=cookies, stream=True) as page:
+                if page.status_code == 304 and record:
+                    record["fetched_at"] = time.time()
+                    self._save(url, record)
+                    self._count("revalidated")
+                    return record["text"]
+                page.raise_for_status()
+                raw = _read_capped(page, self.max_bytes)
+                # requests falls back to ISO-8859-1 when no charset is declared; most pages are UTF-8
+                declared = "charset" in page.headers.get("Content-Type", "").lower()
+                encoding = page.encoding if declared and page.encoding else "utf-8"
+                etag = page.headers.get("ETag")
+                last_modified = page.headers.get("Last-Modified")
+        except Exception:
+            self._count("errors")
+            raise
+
+        text = extract_main_text(raw.decode(encoding, errors="replace"))
+        self._save(url, {"text": text, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()})
+        self._count("fetches")
+        return text
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self.store),
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "fetches": self.fetches,
+                "errors": self.errors,
+            }
+
+
+page_cache = PageCache()
@@ -0,0 +1,94 @@
+# search_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from cache_backends import SingleFlight, SQLiteTTLCache
+
+SEARCH_CACHE_PATH = os.environ.get("CRS_SEARCH_CACHE_PATH", "search_cache.sqlite3")
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("CRS_SEARCH_CACHE_TTL_SECONDS", str(3 * 24 * 3600)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("CRS_SEARCH_CACHE_MAX_ENTRIES", "20000"))
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace/quoting so trivially different queries share a cache entry."""
+    query = query.lower().replace('"', " ").replace("'", " ")
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def search_cache_key(query: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps({"q": normalize_query(query), **params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """
+    Persistent cache for Serper responses, shared by every agent and request.
+
+    Identical searches issued concurrently are coalesced into one upstream call.
+    Responses are not tied to an API key, so results are shared across users.
+    """
+
+    def __init__(
+        self,
+        path: str = SEARCH_CACHE_PATH,
+        ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+    ):
+        self.store = SQLiteTTLCache(path, table="serper_results", ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.upstream_seconds = 0.0
+
+    def get_or_fetch(self, query: str, params: Dict[str, Any], fetch: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the cached response for `query`/`params`, calling `fetch()` on a miss."""
+        key = search_cache_key(query, params)
+        cached = self.store.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return json.loads(cached)
+
+        def fetch_and_store():
+            started = time.perf_counter()
+            try:
+                results = fetch()
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            with self._lock:
+                self.misses += 1
+                self.upstream_seconds += time.perf_counter() - started
+            self.store.set(key, json.dumps(results))
+            return results
+
+        results, shared = self._flight.do(key, fetch_and_store)
+        if shared:
+            with self._lock:
+                self.coalesced += 1
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self.store),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+                "avg_upstream_ms": round(self.upstream_seconds / self.misses * 1000, 1) if self.misses else 0.0,
+            }
+
+
+search_cache = SearchCache()
@@ -0,0 +1,126 @@
+# session_store.py
+import copy
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from cache_backends import MemoryLRUCache, SQLiteTTLCache
+
+SESSION_PATH = os.environ.get("CRS_SESSION_PATH", "sessions.sqlite3")
+# Sessions expire this long after their last update
+SESSION_TTL_SECONDS = float(os.environ.get("CRS_SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_MEMORY_ENTRIES = int(os.environ.get("CRS_SESSION_MEMORY_ENTRIES", "512"))
+SESSION_MAX_ENTRIES = int(os.environ.get("CRS_SESSION_MAX_ENTRIES", "20000"))
+
+
+class SessionStore:
+    """
+    Server-side student sessions: the profile plus each stage's output.
+
+    Recently used sessions are served from an in-memory LRU; every write goes
+    through to SQLite so sessions survive restarts until they expire.
+    """
+
+    def __init__(
+        self,
+        path: str = SESSION_PATH,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        memory_entries: int = SESSION_MEMORY_ENTRIES,
+        max_entries: int = SESSION_MAX_ENTRIES,
+    ):
+        self.memory = MemoryLRUCache(ttl_seconds=ttl_seconds, max_entries=memory_entries)
+        self.store = SQLiteTTLCache(path, table="sessions", ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self.memory.get(session_id)
+        if session is not None:
+            self.memory_hits += 1
+            return session
+        raw = self.store.get(session_id)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        session = json.loads(raw)
+        self.memory.set(session_id, session)
+        return session
+
+    def _save(self, session_id: str, session: Dict[str, Any]):
+        session["updated_at"] = time.time()
+        self.store.set(session_id, json.dumps(session))
+        self.memory.set(session_id, session)
+
+    def create(self, profile: Optional[Dict[str, Any]] = None) -> str:
+        session_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._save(session_id, {"profile": dict(profile or {}), "results": {}, "created_at": time.time()})
+            self.created += 1
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._load(session_id)
+            return copy.deepcopy(session) if session is not None else None
+
+    def update(
+        self,
+        session_id: str,
+        profile: Optional[Dict[str, Any]] = None,
+        results: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Merge profile fields and stage results into the session; None values remove keys."""
+        with self._lock:
+            session = self._load(session_id)
+            if session is None:
+                return None
+            for target, changes in (("profile", profile), ("results", results)):
+                for key, value in (changes or {}).items():
+                    if value is None:
+                        session[target].pop(key, None)
+                    else:
+                        session[target][key] = value
+            self._save(session_id, session)
+            return copy.deepcopy(session)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self.memory.delete(session_id)
+            self.store.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_memory": len(self.memory),
+                "stored": len(self.store),
+                "created": self.created,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+
+def stage_input(session: Dict[str, Any], delta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """What the frontend used to send to /run-agent: profile, all stage results, then the request's delta."""
+    return {**session["profile"], **session["results"], **(delta or {})}
+
+
+def qa_context(session: Dict[str, Any]) -> Dict[str, Any]:
+    """The /qa context the frontend used to assemble from its agent results."""
+    results = session["results"]
+    return {
+        "profile": results.get("normalized_profile") or session["profile"],
+        "programs": results.get("ranked_programs"),
+        "scholarships": results.get("scholarships"),
+        "reviews": results.get("reviews"),
+    }
+
+
+session_store = SessionStore()
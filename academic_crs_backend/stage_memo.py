@@ -0,0 +1,77 @@
+# stage_memo.py
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from cache_backends import MemoryLRUCache, SQLiteTTLCache
+
+STAGE_MEMO_ENABLED = os.environ.get("CRS_STAGE_MEMO", "1") != "0"
+STAGE_MEMO_BACKEND = os.environ.get("CRS_STAGE_MEMO_BACKEND", "memory")  # "memory" or "sqlite"
+STAGE_MEMO_PATH = os.environ.get("CRS_STAGE_MEMO_PATH", "stage_memo.sqlite3")
+STAGE_MEMO_TTL_SECONDS = float(os.environ.get("CRS_STAGE_MEMO_TTL_SECONDS", str(6 * 3600)))
+STAGE_MEMO_MAX_ENTRIES = int(os.environ.get("CRS_STAGE_MEMO_MAX_ENTRIES", "2000"))
+
+
+class StageMemo:
+    """
+    Pipeline stage outputs memoized by a hash of the stage's consumed input
+    (see `pipeline.consumed_input`) and the model that produced them.
+
+    Because every stage's input includes its upstream outputs, a changed
+    stage changes the keys of everything downstream of it, so reruns only
+    recompute the stale part of the graph.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = STAGE_MEMO_ENABLED,
+        backend: str = STAGE_MEMO_BACKEND,
+        ttl_seconds: float = STAGE_MEMO_TTL_SECONDS,
+        max_entries: int = STAGE_MEMO_MAX_ENTRIES,
+        path: str = STAGE_MEMO_PATH,
+    ):
+        self.enabled = enabled
+        self.backend = backend
+        if backend == "sqlite":
+            self.store = SQLiteTTLCache(path, table="stage_outputs", ttl_seconds=ttl_seconds, max_entries=max_entries)
+        else:
+            self.store = MemoryLRUCache(ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @staticmethod
+    def make_key(stage: str, consumed: Dict[str, Any], model_name: str, engine: str = "") -> str:
+        payload = json.dumps(
+            {"stage": stage, "model": model_name, "engine": engine, "input": consumed},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, stage: str, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self.store.get(key)
+        counters = self.misses if value is None else self.hits
+        with self._lock:
+            counters[stage] = counters.get(stage, 0) + 1
+        return value
+
+    def set(self, key: str, value: str):
+        if self.enabled and isinstance(value, str) and value:
+            self.store.set(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "backend": self.backend,
+                "entries": len(self.store),
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+
+stage_memo = StageMemo()
@@ -0,0 +1,125 @@
+# streaming.py
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, Tuple
+
+from crewai.events import crewai_event_bus
+from crewai.events.types.llm_events import LLMCallType, LLMStreamChunkEvent
+from crewai.events.types.tool_usage_events import ToolUsageStartedEvent
+
+from executor import crew_executor
+from program_parser import ProgramStreamParser
+
+# Stages whose streamed tokens are also parsed into records as they arrive
+RECORD_PARSERS = {"matcher": ProgramStreamParser}
+
+
+class EventChannel:
+    """
+    Carries progress events for one streaming request from worker threads back
+    to the event loop that serves the SSE response.
+
+    The channel holds the event loop and cannot be pickled, so only pass it to
+    worker code through `worker_channel`: in process mode the crew runs without
+    it and only the stage events emitted on the event loop are streamed.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (event, data))
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+
+def worker_channel(channel: Optional[EventChannel]) -> Optional[EventChannel]:
+    """The channel to hand to a crew run: None when crews run in worker processes."""
+    return None if crew_executor.mode == "process" else channel
+
+
+# task id -> (channel, stage, record parser or None) for tasks whose events should be forwarded
+_watched: Dict[str, Tuple[EventChannel, str, Any]] = {}
+_watched_lock = threading.Lock()
+
+
+@contextmanager
+def watch_task(task, channel: Optional[EventChannel], stage: str):
+    """
+    Forward LLM token and tool-call events raised by `task` to `channel`. For
+    stages in RECORD_PARSERS each record is also sent as soon as it is complete.
+    """
+    if channel is None:
+        yield
+        return
+    task_id = str(task.id)
+    parser = RECORD_PARSERS[stage]() if stage in RECORD_PARSERS else None
+    with _watched_lock:
+        _watched[task_id] = (channel, stage, parser)
+    try:
+        yield
+    finally:
+        with _watched_lock:
+            _watched.pop(task_id, None)
+
+
+def _lookup(task_id: Optional[str]):
+    if not task_id:
+        return None
+    with _watched_lock:
+        return _watched.get(task_id)
+
+
+@crewai_event_bus.on(LLMStreamChunkEvent)
+def _forward_token(source, event: LLMStreamChunkEvent):
+    watched = _lookup(event.task_id)
+    if watched and event.call_type != LLMCallType.TOOL_CALL:
+        channel, stage, parser = watched
+        channel.emit("token", {"stage": stage, "text": event.chunk})
+        if parser is not None:
+            with _watched_lock:
+                first = len(parser.programs)
+                items = parser.feed(event.chunk)
+            # Only valid records are streamed; the stage result is the authoritative, repaired list
+            programs = [item[1] for item in items if item[0] == "program"]
+            for offset, program in enumerate(programs):
+                channel.emit("program", {"stage": stage, "index": first + offset, "program": program})
+
+
+@crewai_event_bus.on(ToolUsageStartedEvent)
+def _forward_tool_call(source, event: ToolUsageStartedEvent):
+    watched = _lookup(event.task_id)
+    if watched:
+        channel, stage, _ = watched
+        channel.emit("tool_call", {"stage": stage, "tool": event.tool_name, "args": event.tool_args})
+
+
+async def event_stream(channel: EventChannel, work: Awaitable[Any]) -> AsyncIterator[Dict[str, str]]:
+    """
+    Run `work` and yield SSE events from `channel` until it finishes, ending
+    with a `result` (or `error`) event. The run is cancelled if the client
+    disconnects.
+    """
+    async def runner():
+        try:
+            channel.emit("result", {"result": await work})
+        except Exception as e:
+            channel.emit("error", {"error": str(e)})
+        finally:
+            channel.close()
+
+    task = asyncio.ensure_future(runner())
+    try:
+        while True:
+            item = await channel.queue.get()
+            if item is None:
+                break
+            event, data = item
+            yield {"event": event, "data": json.dumps(data)}
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,27 @@
+import json
+
+from fanout import merge_outputs
+
+
+def test_json_list_outputs_merge_into_one_array():
+    parts = [
+        ("TU Munich", '```json\n[{"name": "Deutschlandstipendium", "amount": "EUR 300/month"}]\n```', None),
+        ("RWTH Aachen", 'Here you go:\n[{"name": "DAAD", "university": "RWTH Aachen University"}]', None),
+        ("KIT", None, "timed out after 180s"),
+    ]
+    merged = json.loads(merge_outputs("scholarship", parts))
+    assert merged[0] == {"university": "TU Munich", "name": "Deutschlandstipendium", "amount": "EUR 300/month"}
+    assert merged[1]["university"] == "RWTH Aachen University"
+    assert merged[2]["university"] == "KIT" and "timed out" in merged[2]["error"]
+
+
+def test_wrapped_review_lists_are_unwrapped():
+    parts = [("TU Munich", '{"reviews": [{"sentiment": "Positive"}]}', None), ("KIT", "[]", None)]
+    assert json.loads(merge_outputs("reviews", parts)) == [{"university": "TU Munich", "sentiment": "Positive"}]
+
+
+def test_free_text_outputs_merge_into_sections():
+    parts = [("TU Munich", "- Deutschlandstipendium", None), ("KIT", '[{"name": "DAAD"}]', None)]
+    merged = merge_outputs("scholarship", parts)
+    assert merged.startswith("### TU Munich\n\n- Deutschlandstipendium")
+    assert "### KIT" in merged
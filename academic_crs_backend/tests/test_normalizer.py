@@ -0,0 +1,20 @@
+from normalizer import normalize_exams, normalize_profile
+from utils import extract_info_from_text
+
+
+def test_regex_exam_details_survive_normalization():
+    profile = extract_info_from_text("JEE Main 95 percentile, BITSAT 300")
+    normalized, unresolved = normalize_profile(profile)
+    assert normalized["competitive_exams"] == ["JEE MAIN: 95 percentile, BITSAT 300"]
+    assert unresolved == []
+
+
+def test_exam_values_are_rendered():
+    assert normalize_exams([{"name": "GRE", "score": 320}, {"exam": "JEE Advanced", "rank": 1500}]) == [
+        "GRE: 320", "JEE Advanced: Rank 1500",
+    ]
+
+
+def test_unknown_exam_keys_leave_the_field_unresolved():
+    normalized, unresolved = normalize_profile({"competitive_exams": [{"name": "GRE", "verbal": 160}]})
+    assert "competitive_exams" in unresolved
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from program_catalog import ProgramCatalog, build_match_query
+
+RWTH = {
+    "university": "RWTH Aachen University",
+    "program": "M.Sc. Computer Science",
+    "degree_level": "Master",
+    "location": "Aachen, Germany",
+    "tuition": "No tuition fees",
+}
+KIT = {
+    "university": "Karlsruhe Institute of Technology",
+    "program": "MSc CS",
+    "degree_level": "Master",
+    "location": "Karlsruhe, Germany",
+}
+TORONTO = {
+    "university": "University of Toronto",
+    "program": "BSc Computer Science",
+    "degree_level": "Bachelor",
+    "location": "Toronto, Canada",
+}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = ProgramCatalog(path=str(tmp_path / "catalog.sqlite3"), seed_files=[])
+    catalog.add_programs([RWTH, KIT, TORONTO])
+    return catalog
+
+
+def universities(catalog, query):
+    fresh, _ = catalog.search(query)
+    return {record["university"] for record in fresh}
+
+
+@pytest.mark.parametrize("query", [
+    "MS CS Germany",
+    "MS in Computer Science Germany",
+    "Masters in CS Germany",
+    "computer science masters in Germany",
+    "master's Germany",
+    "M.Sc. computer science programs in Germany",
+])
+def test_natural_phrasings_find_both_german_masters(catalog, query):
+    assert universities(catalog, query) == {"RWTH Aachen University", "Karlsruhe Institute of Technology"}
+
+
+def test_spelled_out_subject_matches_abbreviated_records(catalog):
+    assert "Karlsruhe Institute of Technology" in universities(catalog, "computer science Karlsruhe")
+
+
+def test_other_degree_or_country_does_not_match(catalog):
+    assert universities(catalog, "bachelors computer science Canada") == {"University of Toronto"}
+    assert universities(catalog, "MS CS Canada") == set()
+
+
+def test_stopwords_and_single_letters_are_not_required_terms():
+    assert build_match_query("a in the of") is None
+    assert build_match_query("master's in Germany") == build_match_query("masters Germany")
+
+
+def test_stale_entries_are_not_served(tmp_path):
+    catalog = ProgramCatalog(path=str(tmp_path / "catalog.sqlite3"), max_age_seconds=60, seed_files=[])
+    catalog.add_programs([{**RWTH, "updated_at": 0}])
+    fresh, stale = catalog.search("MS CS Germany")
+    assert fresh == [] and [r["university"] for r in stale] == ["RWTH Aachen University"]
+
+
+def test_served_then_echoed_record_keeps_its_timestamp(tmp_path):
+    catalog = ProgramCatalog(path=str(tmp_path / "catalog.sqlite3"), seed_files=[])
+    checked = time.time() - 29 * 24 * 3600
+    catalog.add_programs([{**RWTH, "updated_at": checked}])
+
+    fresh, _ = catalog.search("MS CS Germany")
+    # The matcher copies the lookup result into its answer, with or without the "updated" date
+    assert catalog.add_programs(fresh) == 0
+    assert catalog.add_programs([{k: v for k, v in fresh[0].items() if k != "updated"}]) == 0
+
+    fresh, _ = catalog.search("MS CS Germany")
+    assert fresh[0]["updated"] == time.strftime("%Y-%m-%d", time.gmtime(checked))
+    catalog.max_age_seconds = 28 * 24 * 3600
+    assert catalog.search("MS CS Germany") == ([], fresh)
+
+
+def test_changed_values_refresh_the_record(tmp_path):
+    catalog = ProgramCatalog(path=str(tmp_path / "catalog.sqlite3"), seed_files=[])
+    catalog.add_programs([{**RWTH, "updated_at": time.time() - 29 * 24 * 3600}])
+    assert catalog.add_programs([{**RWTH, "tuition": "EUR 1,500 per semester"}]) == 1
+    fresh, _ = catalog.search("MS CS Germany")
+    assert fresh[0]["tuition"] == "EUR 1,500 per semester"
+    assert fresh[0]["updated"] == time.strftime("%Y-%m-%d", time.gmtime())
@@ -0,0 +1,45 @@
+import pytest
+
+from qa_cache import SemanticAnswerCache
+
+
+def cached_answer(stored: str, asked: str):
+    cache = SemanticAnswerCache()
+    cache.store("ctx", stored, "cached answer")
+    return cache.lookup("ctx", asked)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What's the fee at TUM?", "How much is tuition for TU Munich?"),
+    ("What is the tuition at Technical University of Munich?", "What's the fee at TUM?"),
+    ("When is the application deadline for TUM?", "What's the last date to apply to TUM?"),
+    ("What are the living costs in Munich?", "How much are living expenses in Munich?"),
+    ("Which scholarships can I get?", "What funding is there?"),
+])
+def test_paraphrases_hit(stored, asked):
+    assert cached_answer(stored, asked)["answer"] == "cached answer"
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What are the tuition fees at TU Munich?", "What are the tuition fees at TU Berlin?"),
+    ("Is there a scholarship at Toronto?", "Is there a scholarship at Waterloo?"),
+    ("What is the deadline for the 2025 intake?", "What is the deadline for the 2026 intake?"),
+    ("Is IELTS 6.5 enough?", "Is IELTS 7 enough?"),
+    ("tu munich fees", "tu berlin fees"),
+])
+def test_different_entity_or_number_misses(stored, asked):
+    assert cached_answer(stored, asked) is None
+
+
+def test_near_miss_is_counted_as_rejected():
+    cache = SemanticAnswerCache()
+    cache.store("ctx", "What are the tuition fees at TU Munich?", "Munich answer")
+    assert cache.lookup("ctx", "What are the tuition fees at TU Berlin?") is None
+    stats = cache.stats()
+    assert stats["rejected"] == 1 and stats["misses"] == 1 and stats["hits"] == 0
+
+
+def test_hits_are_scoped_to_the_context():
+    cache = SemanticAnswerCache()
+    cache.store("ctx", "What's the fee at TUM?", "cached answer")
+    assert cache.lookup("other", "What's the fee at TUM?") is None
@@ -0,0 +1,55 @@
+from tool_budget import TOOL_SEARCH_BUDGETS, ToolBudgets, is_budget_exhausted
+
+
+def run_all(call, queries):
+    return [call(q) for q in queries]
+
+
+def test_batch_stages_fit_a_full_batch_of_five():
+    for stage in ("matcher", "scholarship", "reviews"):
+        assert TOOL_SEARCH_BUDGETS[stage] >= 5
+
+
+def test_batch_beyond_the_budget_marks_skipped_queries():
+    budgets = ToolBudgets(search_budgets={"matcher": 3})
+    queries = ["tum informatics tuition", "rwth data science fees", "kit ms cs deadline", "tu berlin ms cs"]
+    with budgets.task("matcher"):
+        results = budgets.guard_batch("search", queries, lambda q: {"q": q}, run_all)
+    assert [is_budget_exhausted(r) for r in results] == [False, False, False, True]
+    assert budgets.stats()["stages"]["matcher"]["blocked"] == 1
+
+
+def test_duplicate_queries_do_not_use_budget():
+    budgets = ToolBudgets(search_budgets={"matcher": 2})
+    with budgets.task("matcher"):
+        results = budgets.guard_batch(
+            "search", ["tum tuition fees", "TUM tuition fees", "rwth fees"], lambda q: {"q": q}, run_all,
+        )
+    assert not any(is_budget_exhausted(r) for r in results)
+    assert results[1] == results[0]
+
+
+def test_queries_for_different_universities_are_both_run():
+    budgets = ToolBudgets(search_budgets={"matcher": 6})
+    queries = [
+        "University of Toronto MS Computer Science tuition fees international students 2024",
+        "University of Waterloo MS Computer Science tuition fees international students 2024",
+        "TU Munich MS Computer Science tuition fees",
+        "TU Berlin MS Computer Science tuition fees",
+        "tu munich ms computer science tuition fees",
+    ]
+    calls = []
+    with budgets.task("matcher"):
+        results = budgets.guard_batch("search", queries, lambda q: calls.append(q) or {"q": q}, run_all)
+        single = budgets.guard("search", "University of Waterloo MS CS tuition fees", lambda: {"q": "waterloo"})
+    assert calls == queries[:4]
+    assert [r["q"] for r in results] == queries[:4] + [queries[2]]
+    assert single == {"q": "waterloo"}
+
+
+def test_reworded_query_for_the_same_university_is_deduplicated():
+    budgets = ToolBudgets(search_budgets={"matcher": 6})
+    with budgets.task("matcher") as budget:
+        budgets.guard("search", "TU Munich MS Computer Science tuition fees", lambda: "first")
+        again = budgets.guard("search", "TU Munich MS Computer Science official tuition fees", lambda: "second")
+    assert again == "first" and budget.deduped == 1
@@ -0,0 +1,15 @@
+import pytest
+
+from utils import extract_info_with_confidence
+
+
+@pytest.mark.parametrize("text, locations", [
+    ("help us find colleges in Germany", ["Germany"]),
+    ("HELP US FIND COLLEGES", None),
+    ("I want to study in the US or UK", ["USA", "United Kingdom"]),
+    ("Germany or the U.S.", ["Germany", "USA"]),
+    ("usa please", ["USA"]),
+])
+def test_us_abbreviation_is_not_the_pronoun(text, locations):
+    info, _ = extract_info_with_confidence(text)
+    assert info.get("preferred_locations") == locations
@@ -0,0 +1,221 @@
+# tool_budget.py
+"""
+Per-task quotas for search and scrape tool calls.
+
+A crew run opens a budget for its stage with `tool_budgets.task(stage)`; the
+tools then route every call through `tool_budgets.guard` (or `guard_batch`
+for several queries at once). Repeated or
+near-identical calls within the task get the first call's result, and once
+the stage's quota is used up the agent is told to answer instead of getting
+another result, which bounds a stage's worst-case latency.
+"""
+import contextvars
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from executor import parse_limits
+from qa_cache import QuestionKey
+from search_cache import normalize_query
+
+# Search/scrape calls allowed per task, by stage (each query of a batch search counts);
+# stages not listed are unlimited. The batch-search stages get one full batch
+# (CRS_BATCH_SEARCH_MAX_QUERIES, 5) plus a follow-up search.
+TOOL_SEARCH_BUDGETS = parse_limits(os.environ.get("CRS_TOOL_SEARCH_BUDGETS", "matcher=6,scholarship=6,reviews=6,qa=3"))
+TOOL_SCRAPE_BUDGETS = parse_limits(os.environ.get("CRS_TOOL_SCRAPE_BUDGETS", "qa=2"))
+# Queries whose word sets overlap at least this much (Jaccard) count as the same search,
+# provided they also name the same entities and numbers
+TOOL_DEDUP_THRESHOLD = float(os.environ.get("CRS_TOOL_DEDUP_THRESHOLD", "0.8"))
+
+BUDGET_EXHAUSTED = (
+    "Tool budget exhausted: this task has already used its {limit} {kind} call(s). "
+    "Do not call any more tools. Write your final answer now from the information you already have."
+)
+
+def is_budget_exhausted(result: Any) -> bool:
+    """True if a guarded call was refused because the task's budget was used up."""
+    return isinstance(result, str) and result.startswith(BUDGET_EXHAUSTED.split(":", 1)[0] + ":")
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar("crs_tool_budget", default=None)
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return len(a & b) / len(a | b)
+
+
+class TaskBudget:
+    """Tool calls made by one task: counts per kind and earlier results for dedup."""
+
+    def __init__(self, stage: str, limits: Dict[str, int], dedup_threshold: float = TOOL_DEDUP_THRESHOLD):
+        self.stage = stage
+        self.limits = limits
+        self.dedup_threshold = dedup_threshold
+        self.used: Counter = Counter()
+        self.deduped = 0
+        self.blocked = 0
+        self._results: List[Tuple[str, str, Any]] = []
+
+    def same_query(self, kind: str, a: str, b: str) -> bool:
+        normalized_a, normalized_b = normalize_query(a), normalize_query(b)
+        # Scrapes must match exactly; searches may differ by a word or two
+        if normalized_a == normalized_b:
+            return True
+        if kind != "search":
+            return False
+        words_a, words_b = frozenset(normalized_a.split()), frozenset(normalized_b.split())
+        if _similarity(words_a, words_b) < self.dedup_threshold:
+            return False
+        # One query per university differs only in the name: those are different searches
+        return QuestionKey(a).compatible(QuestionKey(b))
+
+    def lookup(self, kind: str, query: str) -> Optional[Any]:
+        for seen_kind, seen_query, result in self._results:
+            if seen_kind == kind and self.same_query(kind, query, seen_query):
+                return result
+        return None
+
+    def exhausted(self, kind: str, pending: int = 0) -> bool:
+        limit = self.limits.get(kind)
+        return limit is not None and self.used[kind] + pending >= limit
+
+    def record(self, kind: str, query: str, result: Any):
+        self.used[kind] += 1
+        self._results.append((kind, query, result))
+
+
+class _StageStats:
+    def __init__(self):
+        self.tasks = 0
+        self.calls: Counter = Counter()
+        self.deduped = 0
+        self.blocked = 0
+        self.max_calls = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tasks": self.tasks,
+            "calls": dict(self.calls),
+            "avg_calls_per_task": round(sum(self.calls.values()) / self.tasks, 2) if self.tasks else 0.0,
+            "max_calls_per_task": self.max_calls,
+            "deduped": self.deduped,
+            "blocked": self.blocked,
+        }
+
+
+class ToolBudgets:
+    """Opens task budgets and records per-stage tool-call counts."""
+
+    def __init__(
+        self,
+        search_budgets: Optional[Dict[str, int]] = None,
+        scrape_budgets: Optional[Dict[str, int]] = None,
+    ):
+        self.search_budgets = search_budgets if search_budgets is not None else dict(TOOL_SEARCH_BUDGETS)
+        self.scrape_budgets = scrape_budgets if scrape_budgets is not None else dict(TOOL_SCRAPE_BUDGETS)
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+
+    def limits_for(self, stage: str) -> Dict[str, int]:
+        limits = {}
+        if stage in self.search_budgets:
+            limits["search"] = self.search_budgets[stage]
+        if stage in self.scrape_budgets:
+            limits["scrape"] = self.scrape_budgets[stage]
+        return limits
+
+    @contextmanager
+    def task(self, stage: str):
+        """Budget the tool calls made on this thread until the block exits."""
+        budget = TaskBudget(stage, self.limits_for(stage))
+        token = _current.set(budget)
+        try:
+            yield budget
+        finally:
+            _current.reset(token)
+            with self._lock:
+                stats = self._stages.get(stage)
+                if stats is None:
+                    stats = self._stages[stage] = _StageStats()
+                stats.tasks += 1
+                stats.calls.update(budget.used)
+                stats.deduped += budget.deduped
+                stats.blocked += budget.blocked
+                stats.max_calls = max(stats.max_calls, sum(budget.used.values()))
+
+    def guard(self, kind: str, query: str, call: Callable[[], Any]) -> Any:
+        """
+        Run a "search" or "scrape" tool call under the current task's budget.
+        Outside a task (e.g. scripts) calls are not limited.
+        """
+        budget: Optional[TaskBudget] = _current.get()
+        if budget is None:
+            return call()
+        earlier = budget.lookup(kind, query)
+        if earlier is not None:
+            budget.deduped += 1
+            return earlier
+        if budget.exhausted(kind):
+            budget.blocked += 1
+            print(f"{budget.stage}: {kind} budget exhausted, asking the agent to answer")
+            return BUDGET_EXHAUSTED.format(limit=budget.limits[kind], kind=kind)
+        result = call()
+        budget.record(kind, query, result)
+        return result
+
+    def guard_batch(
+        self, kind: str, queries: List[str], call: Callable[[str], Any],
+        run_all: Callable[[Callable[[str], Any], List[str]], List[Any]],
+    ) -> List[Any]:
+        """
+        `guard` for several queries at once. Dedup (against earlier calls and
+        within the batch) and the quota are settled up front, in order; the
+        remaining queries are then run together with `run_all(call, queries)`.
+        """
+        budget: Optional[TaskBudget] = _current.get()
+        if budget is None:
+            return run_all(call, queries)
+        outcomes: List[Any] = [None] * len(queries)
+        to_run: List[int] = []
+        aliases: Dict[int, int] = {}
+        blocked = 0
+        for i, query in enumerate(queries):
+            earlier = budget.lookup(kind, query)
+            if earlier is not None:
+                budget.deduped += 1
+                outcomes[i] = earlier
+                continue
+            same = next((j for j in to_run if budget.same_query(kind, query, queries[j])), None)
+            if same is not None:
+                budget.deduped += 1
+                aliases[i] = same
+            elif budget.exhausted(kind, pending=len(to_run)):
+                blocked += 1
+                outcomes[i] = BUDGET_EXHAUSTED.format(limit=budget.limits[kind], kind=kind)
+            else:
+                to_run.append(i)
+
+        budget.blocked += blocked
+        if blocked:
+            print(f"{budget.stage}: {kind} budget exhausted, skipped {blocked} batched call(s)")
+        for i, result in zip(to_run, run_all(call, [queries[i] for i in to_run])):
+            budget.record(kind, queries[i], result)
+            outcomes[i] = result
+        for i, j in aliases.items():
+            outcomes[i] = outcomes[j]
+        return outcomes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "search_budgets": self.search_budgets,
+                "scrape_budgets": self.scrape_budgets,
+                "stages": {stage: stats.stats() for stage, stats in self._stages.items()},
+            }
+
+
+tool_budgets = ToolBudgets()
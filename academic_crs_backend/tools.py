@@ -0,0 +1,286 @@
+# tools.py
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from crewai.tools import BaseTool
+from crewai_tools import ScrapeWebsiteTool, SerperDevTool
+from pydantic import BaseModel, Field
+
+from http_clients import http_clients
+from program_catalog import program_catalog
+from scheduler import upstream_scheduler
+from scrape_cache import SCRAPE_WINDOW_CHARS, page_cache, relevant_window
+from search_cache import search_cache
+from tool_budget import is_budget_exhausted, tool_budgets
+
+logger = logging.getLogger(__name__)
+
+# Batch search: queries per call, results kept per query, snippet length in the observation
+BATCH_SEARCH_MAX_QUERIES = int(os.environ.get("CRS_BATCH_SEARCH_MAX_QUERIES", "5"))
+BATCH_SEARCH_RESULTS_PER_QUERY = int(os.environ.get("CRS_BATCH_SEARCH_RESULTS_PER_QUERY", "4"))
+BATCH_SEARCH_SNIPPET_CHARS = int(os.environ.get("CRS_BATCH_SEARCH_SNIPPET_CHARS", "240"))
+
+
+class SerperSearchTool(SerperDevTool):
+    """
+    SerperDevTool that uses the API key it was built with instead of reading
+    SERPER_API_KEY from the process environment, so concurrent requests with
+    different keys never see each other's credentials.
+
+    Responses go through the shared `search_cache` unless `use_cache` is off;
+    upstream requests are rate limited per key by `upstream_scheduler`. Calls
+    count against the running task's search budget (`tool_budgets`).
+    """
+
+    api_key: str = Field(default="", exclude=True, repr=False)
+    env_vars: list = Field(default_factory=list)
+    use_cache: bool = True
+
+    def _run(self, **kwargs: Any) -> Any:
+        query = str(kwargs.get("search_query") or kwargs.get("query") or "")
+        return tool_budgets.guard("search", query, lambda: super(SerperSearchTool, self)._run(**kwargs))
+
+    def _make_api_request(self, search_query: str, search_type: str) -> Dict[str, Any]:
+        search_url = self._get_search_url(search_type)
+        payload = {"q": search_query, "num": self.n_results}
+
+        if self.country != "":
+            payload["gl"] = self.country
+        if self.location != "":
+            payload["location"] = self.location
+        if self.locale != "":
+            payload["hl"] = self.locale
+
+        if not self.use_cache:
+            return self._post(search_url, payload)
+        params = {k: v for k, v in payload.items() if k != "q"}
+        params["type"] = search_type
+        return search_cache.get_or_fetch(search_query, params, lambda: self._post(search_url, payload))
+
+    def _post(self, search_url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {
+            "X-API-KEY": self.api_key,
+            "content-type": "application/json",
+        }
+
+        def post():
+            # Shared keep-alive client: no TLS handshake per search
+            response = http_clients.search.post(search_url, headers=headers, json=payload)
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError:
+                logger.error(f"Error making request to Serper API: {response.content.decode('utf-8', errors='replace')}")
+                raise
+            return response.json()
+
+        results = upstream_scheduler.call("serper", self.api_key, post)
+        if not results:
+            raise ValueError("Empty response from Serper API")
+        return results
+
+
+def run_concurrently(call: Callable[[str], Any], items: List[str]) -> List[Any]:
+    """
+    `[call(item) for item in items]`, run side by side with asyncio. Each call
+    runs in a thread (asyncio.to_thread copies the context, so the scheduler
+    priority and tool budget carry over).
+    """
+    if len(items) <= 1:
+        return [call(item) for item in items]
+
+    async def gather():
+        return await asyncio.gather(*(asyncio.to_thread(call, item) for item in items))
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return list(asyncio.run(gather()))
+    # Already inside an event loop on this thread: fall back to running in order
+    return [call(item) for item in items]
+
+
+def _trim(text: str, max_chars: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= max_chars else text[: max_chars - 3].rstrip() + "..."
+
+
+def format_batch_results(
+    queries: List[str], results: List[Any],
+    per_query: int = BATCH_SEARCH_RESULTS_PER_QUERY, snippet_chars: int = BATCH_SEARCH_SNIPPET_CHARS,
+) -> str:
+    """One observation for a batch: each query's top results, links already shown once are skipped."""
+    seen_links = set()
+    sections = []
+    for query, result in zip(queries, results):
+        lines = [f"## {query}"]
+        if not isinstance(result, dict):
+            # Budget message or an earlier formatted observation
+            lines.append(_trim(result, snippet_chars * 2))
+        elif "error" in result:
+            lines.append(f"(search failed: {result['error']})")
+        else:
+            answer = result.get("answerBox") or {}
+            if answer.get("answer") or answer.get("snippet"):
+                lines.append(f"Answer: {_trim(answer.get('answer') or answer.get('snippet'), snippet_chars)}")
+            shown = duplicates = 0
+            for item in result.get("organic") or []:
+                if shown >= per_query:
+                    break
+                link = item.get("link")
+                if link in seen_links:
+                    duplicates += 1
+                    continue
+                seen_links.add(link)
+                shown += 1
+                lines.append(f"- {item.get('title', '')} | {link}")
+                if item.get("snippet"):
+                    lines.append(f"  {_trim(item['snippet'], snippet_chars)}")
+            if duplicates:
+                lines.append(f"({duplicates} result(s) already listed above)")
+            elif not shown and len(lines) == 1:
+                lines.append("(no results)")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+
+class BatchSearchToolSchema(BaseModel):
+    """Input for BatchSearchTool."""
+
+    queries: List[str] = Field(
+        ...,
+        description=(
+            f"Up to {BATCH_SEARCH_MAX_QUERIES} search queries to run at once, e.g. "
+            "[\"<University> <Program> tuition fees\", \"<University> <Program> admission requirements\"]"
+        ),
+    )
+
+
+class BatchSearchTool(BaseTool):
+    """
+    Runs several Serper searches concurrently and returns their merged,
+    deduplicated and trimmed results as one observation, so an agent needs one
+    reasoning step instead of one per query. Each query still goes through the
+    search cache, the upstream scheduler and the task's search budget.
+    """
+
+    name: str = "Batch search the internet"
+    description: str = (
+        "Search the internet for several queries in ONE step. Pass every query you need as a list; "
+        "returns the top results for each query. Prefer this over single searches."
+    )
+    args_schema: type[BaseModel] = BatchSearchToolSchema
+    search_tool: SerperSearchTool = Field(exclude=True, repr=False)
+    max_queries: int = BATCH_SEARCH_MAX_QUERIES
+
+    def _run(self, **kwargs: Any) -> Any:
+        queries = kwargs.get("queries") or []
+        if isinstance(queries, str):
+            queries = [queries]
+        queries = list(dict.fromkeys(q.strip() for q in queries if isinstance(q, str) and q.strip()))
+        queries, over_limit = queries[: self.max_queries], queries[self.max_queries:]
+        if not queries:
+            return "Provide at least one search query."
+
+        def search(query: str) -> Any:
+            try:
+                return self.search_tool._make_api_request(query, "search")
+            except Exception as e:
+                return {"error": str(e)}
+
+        results = tool_budgets.guard_batch("search", queries, search, run_concurrently)
+        searched = [(q, r) for q, r in zip(queries, results) if not is_budget_exhausted(r)]
+        over_budget = [q for q, r in zip(queries, results) if is_budget_exhausted(r)]
+
+        parts = []
+        if searched:
+            parts.append(format_batch_results([q for q, _ in searched], [r for _, r in searched]))
+        if over_limit:
+            parts.append(
+                f"NOT searched (only {self.max_queries} queries per batch): "
+                + "; ".join(f'"{q}"' for q in over_limit)
+            )
+        if over_budget:
+            parts.append(
+                "NOT searched (this task's search budget is used up): "
+                + "; ".join(f'"{q}"' for q in over_budget)
+                + ". Do not search again; write your final answer from the results you have."
+            )
+        return "\n\n".join(parts)
+
+
+class CatalogLookupToolSchema(BaseModel):
+    """Input for CatalogLookupTool."""
+
+    query: str = Field(
+        ...,
+        description='Degree, subject, country or university to look up, e.g. "MS Computer Science Germany"',
+    )
+
+
+class CatalogLookupTool(BaseTool):
+    """
+    Looks programs up in the local `program_catalog` (no network call and no
+    search budget). Only fresh entries are returned; stale ones are named so
+    the agent re-checks them with a live search.
+    """
+
+    name: str = "Look up the local program catalog"
+    description: str = (
+        "Look up known university programs (fees, duration, location, requirements, website) from earlier "
+        "verified searches. Use this FIRST; only search the internet for programs or details it does not have."
+    )
+    args_schema: type[BaseModel] = CatalogLookupToolSchema
+
+    def _run(self, **kwargs: Any) -> Any:
+        query = str(kwargs.get("query") or "").strip()
+        fresh, stale = program_catalog.search(query)
+        lines = []
+        if fresh:
+            lines.append(f"Catalog entries for '{query}' (from earlier verified searches):")
+            lines += [json.dumps(record, ensure_ascii=False) for record in fresh]
+        else:
+            lines.append(f"No up-to-date catalog entries for '{query}'. Use the search tool.")
+        if stale:
+            names = ", ".join(f"{r['university']} - {r['program']} (last checked {r['updated']})" for r in stale)
+            lines.append(f"Outdated entries, re-check with a search before using: {names}")
+        return "\n".join(lines)
+
+
+class CachedScrapeToolSchema(BaseModel):
+    """Input for CachedScrapeTool."""
+
+    website_url: str = Field(..., description="Mandatory website url to read the file")
+    query: Optional[str] = Field(
+        default=None,
+        description="What you are looking for on the page (e.g. 'tuition fees'); only the most relevant part is returned",
+    )
+
+
+class CachedScrapeTool(ScrapeWebsiteTool):
+    """
+    ScrapeWebsiteTool backed by `page_cache`: pages are fetched and reduced to
+    their main text once, and only a window of at most `window_chars`
+    characters around the query terms is returned to the agent. Calls count
+    against the running task's scrape budget.
+    """
+
+    args_schema: type[BaseModel] = CachedScrapeToolSchema
+    window_chars: int = SCRAPE_WINDOW_CHARS
+
+    def _run(self, **kwargs: Any) -> Any:
+        website_url: Optional[str] = kwargs.get("website_url", self.website_url)
+        if website_url is None:
+            raise ValueError("Website URL must be provided.")
+
+        query = kwargs.get("query")
+
+        def scrape():
+            text = page_cache.get_text(website_url, headers=self.headers, cookies=self.cookies)
+            window = relevant_window(text, query, self.window_chars)
+            return "The following text is scraped website content:\n\n" + window
+
+        return tool_budgets.guard("scrape", f"{website_url} {query or ''}", scrape)
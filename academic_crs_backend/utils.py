@@ -1,223 +1,371 @@
 # utils.py
 import re
 import json
-from typing import Dict, Any, List, Optional
+from collections import deque
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
 
-def _infer_academic_level_from_text(text: str) -> Optional[str]:
+
+# ==========================================
+# KEYWORD AUTOMATON
+# ==========================================
+class _KeywordAutomaton:
+    """
+    Aho-Corasick matcher over a fixed keyword set, so every keyword list used
+    by the extractor is checked in a single pass over the lowercased text.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for kw in keywords:
+            self._add(kw)
+        self._build()
+
+    def _add(self, keyword: str):
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(keyword)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fallback = self._goto[f].get(ch, 0)
+                self._fail[nxt] = fallback if fallback != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield `(start, keyword)` for every (possibly overlapping) occurrence."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for kw in out[state]:
+                yield i - len(kw) + 1, kw
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _bounded(text: str, start: int, end: int) -> bool:
+    """True if text[start:end] has a regex word boundary on both sides."""
+    return (start == 0 or not _is_word_char(text[start - 1])) and (end == len(text) or not _is_word_char(text[end]))
+
+
+_HIGH_SCHOOL_KEYWORDS = [
+    "12th", "class 12", "class xii", "higher secondary", "plus two", "hsc",
+    "intermediate", "puc", "pre-university"
+]
+# Avoid misclassifying people clearly talking about 'completed bachelor's'
+_COMPLETED_BACHELOR_KEYWORDS = ["b.tech", "btech", "bachelor"]
+_UNDERGRAD_KEYWORDS = [
+    "b.tech", "btech", "b.e", "b.e.", "bachelor of", "bachelors in",
+    "bsc", "b.sc", "bca", "bcom", "b.com", "ba ", "b.a "
+]
+_POSTGRAD_KEYWORDS = [
+    "m.tech", "mtech", "m.e", "master of", "ms in", "m.s.", "msc", "m.sc",
+    "mba", "pgdm"
+]
+_WORKING_KEYWORDS = [
+    "working", "work experience", "software engineer", "developer at",
+    "currently employed", "full-time job"
+]
+_BOARD_KEYWORDS = [
+    ("CBSE", ["cbse"]),
+    ("ICSE", ["icse"]),
+    ("State Board", ["state board", "stateboard"]),
+    ("HSC", ["hsc", "higher secondary"]),
+    ("PUC", ["puc", "pre-university"]),
+]
+_CLASS12_KEYWORDS = ["12th", "class 12", "class xii", "higher secondary", "hsc"]
+# Prefixes of every exam in _EXAM_PATTERN; only need a word boundary on the left
+_EXAM_KEYWORDS = ["jee", "neet", "sat", "act", "bitsat", "viteee", "comedk", "mht", "kcet", "cuet"]
+# "us" is deliberately absent: lowercase it is the pronoun ("help us find colleges"),
+# so the abbreviation is only matched case-sensitively by _US_PATTERN
+_COUNTRY_KEYWORDS = {
+    "usa": "USA", "canada": "Canada", "germany": "Germany", "uk": "United Kingdom",
+    "united kingdom": "United Kingdom", "australia": "Australia", "france": "France",
+    "singapore": "Singapore", "netherlands": "Netherlands", "ireland": "Ireland", "india": "India",
+}
+
+_AUTOMATON = _KeywordAutomaton(set(
+    _HIGH_SCHOOL_KEYWORDS + _COMPLETED_BACHELOR_KEYWORDS + _UNDERGRAD_KEYWORDS + _POSTGRAD_KEYWORDS
+    + _WORKING_KEYWORDS + [kw for _, kws in _BOARD_KEYWORDS for kw in kws]
+    + _EXAM_KEYWORDS + list(_COUNTRY_KEYWORDS)
+))
+_EXAM_KEYWORD_SET = set(_EXAM_KEYWORDS)
+_US_PATTERN = re.compile(r"(?<![A-Za-z.])U\.?S\.?(?![A-Za-z])")
+
+
+class _Scan:
+    """Result of one automaton pass over a text."""
+
+    def __init__(self, text: str):
+        lowered = text.lower()
+        self.found: Set[str] = set()
+        self.exam_candidate = False
+        mentions: List[Tuple[int, str]] = []
+        for start, kw in _AUTOMATON.finditer(lowered):
+            self.found.add(kw)
+            end = start + len(kw)
+            if kw in _EXAM_KEYWORD_SET and (start == 0 or not _is_word_char(lowered[start - 1])):
+                self.exam_candidate = True
+            country = _COUNTRY_KEYWORDS.get(kw)
+            if country and _bounded(lowered, start, end):
+                mentions.append((start, country))
+        # All-caps text ("HELP US FIND ...") cannot tell the abbreviation from the pronoun
+        if not text.isupper():
+            mentions += [(m.start(), "USA") for m in _US_PATTERN.finditer(text)]
+        self.countries: List[str] = list(dict.fromkeys(country for _, country in sorted(mentions)))
+
+    def any(self, keywords: Iterable[str]) -> bool:
+        return any(kw in self.found for kw in keywords)
+
+
+# ==========================================
+# PRECOMPILED PATTERNS
+# ==========================================
+_NAME_PATTERN = re.compile(r"\b(?:my name is)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)", re.IGNORECASE)
+_DEGREE_PATTERN = re.compile(
+    r"(b\.tech|btech|engineering|bachelor|bachelors|bsc|b\.?e\.?|ba|bcom|bca|computer science|information technology|mechanical|civil)",
+    re.IGNORECASE
+)
+_YEAR_PATTERN = re.compile(r"(?:graduat\w*|finish\w*|complet\w*|passed out|year)\s*(?:in|year)?\s*(\d{4}|\d{2})", re.IGNORECASE)
+_ANY_YEAR_PATTERN = re.compile(r"\b(\d{4})\b")
+_CGPA_PATTERN = re.compile(r"cgpa\s*(?:is|:|of)?\s*([\d.]+(?:\s*/\s*\d+(?:\.\d+)?)?)", re.IGNORECASE)
+_GOAL_PATTERN = re.compile(
+    r"(?:goal|want|aspire|aim|plan)\s*(?:to\s+)?(?:become|be|pursue)?\s*(?:a\s+)?(\w+(?:\s+\w+)*?\s*(?:engineer|scientist|developer|researcher|specialist|expert|manager|analyst))",
+    re.IGNORECASE
+)
+_BUDGET_PATTERN = re.compile(r"(\d{1,3}\s*lakhs?)", re.IGNORECASE)
+_SPEC_PATTERN = re.compile(
+    r"(?:speciali[sz]e?|specialization|field|major|focus)\s*(?:in\s+)?((?:ai|ml|machine learning|computer science|cs|data science|data analytics|software engineering|mechanical engineering|civil engineering|electronics|ece))",
+    re.IGNORECASE
+)
+_EXAM_PATTERN = re.compile(
+    r"\b(JEE(?:\s*Main|\s*Advanced)?|NEET|SAT|ACT|BITSAT|VITEEE|COMEDK|MHT[-\s]?CET|KCET|CUET)\b[^.\n]*",
+    re.IGNORECASE
+)
+# Look for patterns like "12th ... 92%" or "class 12 ... 480/500"
+_CLASS12_PATTERNS = [
+    re.compile(r"(?:12th|class 12|class xii|higher secondary|hsc)[^.\n%]*?(\d{2,3}(?:\.\d+)?)\s*%", re.IGNORECASE),
+    re.compile(r"(?:12th|class 12|class xii|higher secondary|hsc)[^.\n]*?(\d{2,4}\/\d{2,4})", re.IGNORECASE),
+]
+_CLASS12_LINE_PATTERN = re.compile(r".*(12th|class 12|class xii|higher secondary|hsc).*\n?", re.IGNORECASE)
+_PERCENT_PATTERN = re.compile(r"(\d{2,3}(?:\.\d+)?)\s*%")
+
+_SPEC_ALIASES = {
+    "ml": "Machine Learning",
+    "machine learning": "Machine Learning",
+    "ai": "Artificial Intelligence",
+    "cs": "Computer Science",
+    "computer science": "Computer Science",
+    "ece": "Electronics and Communication",
+    "electronics": "Electronics and Communication",
+}
+
+
+def _infer_academic_level_from_text(scan: _Scan) -> Optional[str]:
     """Very lightweight heuristic to guess academic level from free text."""
-    t = text.lower()
-
-    # High-school patterns
-    if any(kw in t for kw in [
-        "12th", "class 12", "class xii", "higher secondary", "plus two", "hsc",
-        "intermediate", "puc", "pre-university"
-    ]):
-        # Avoid misclassifying people clearly talking about 'completed bachelor's'
-        if "b.tech" not in t and "btech" not in t and "bachelor" not in t:
-            return "high_school"
-
-    # Undergrad patterns
-    if any(kw in t for kw in [
-        "b.tech", "btech", "b.e", "b.e.", "bachelor of", "bachelors in",
-        "bsc", "b.sc", "bca", "bcom", "b.com", "ba ", "b.a "
-    ]):
+    if scan.any(_HIGH_SCHOOL_KEYWORDS) and not scan.any(_COMPLETED_BACHELOR_KEYWORDS):
+        return "high_school"
+    if scan.any(_UNDERGRAD_KEYWORDS):
         return "undergraduate"
-
-    # Postgrad patterns
-    if any(kw in t for kw in [
-        "m.tech", "mtech", "m.e", "master of", "ms in", "m.s.", "msc", "m.sc",
-        "mba", "pgdm"
-    ]):
+    if scan.any(_POSTGRAD_KEYWORDS):
         return "postgraduate"
-
-    # Working professional hints
-    if any(kw in t for kw in [
-        "working", "work experience", "software engineer", "developer at",
-        "currently employed", "full-time job"
-    ]):
+    if scan.any(_WORKING_KEYWORDS):
         return "working_professional"
-
     return None
 
 
-def _extract_competitive_exams(text: str) -> Optional[List[Dict[str, str]]]:
+def _extract_competitive_exams(text: str, scan: _Scan) -> Optional[List[Dict[str, str]]]:
     """
     Extract mentions of common competitive exams with a small context snippet.
     We don't over-parse; we just keep free-text details for downstream reasoning.
     """
-    exam_pattern = r"\b(JEE(?:\s*Main|\s*Advanced)?|NEET|SAT|ACT|BITSAT|VITEEE|COMEDK|MHT[-\s]?CET|KCET|CUET)\b[^.\n]*"
+    if not scan.exam_candidate:
+        return None
     exams: List[Dict[str, str]] = []
-    for m in re.finditer(exam_pattern, text, re.IGNORECASE):
-        full_snippet = m.group(0).strip()
-        exam_name = m.group(1).strip().upper()
+    for m in _EXAM_PATTERN.finditer(text):
         exams.append({
-            "exam_name": exam_name,
-            "details": full_snippet
+            "exam_name": m.group(1).strip().upper(),
+            "details": m.group(0).strip()
         })
     return exams or None
 
 
-def _extract_board(text: str) -> Optional[str]:
-    t = text.lower()
-    if "cbse" in t:
-        return "CBSE"
-    if "icse" in t:
-        return "ICSE"
-    if "state board" in t or "stateboard" in t:
-        return "State Board"
-    if "hsc" in t or "higher secondary" in t:
-        return "HSC"
-    if "puc" in t or "pre-university" in t:
-        return "PUC"
+def _extract_board(scan: _Scan) -> Optional[str]:
+    for board, keywords in _BOARD_KEYWORDS:
+        if scan.any(keywords):
+            return board
     return None
 
 
-def _extract_class12_score(text: str) -> Optional[str]:
+def _extract_class12_score(text: str, scan: _Scan) -> Optional[str]:
     """
     Try to find a 12th/HS score as a percentage or marks.
     We keep it as free-text, not normalized.
     """
-    # Look for patterns like "12th ... 92%" or "class 12 ... 480/500"
-    patterns = [
-        r"(?:12th|class 12|class xii|higher secondary|hsc)[^.\n%]*?(\d{2,3}(?:\.\d+)?)\s*%",
-        r"(?:12th|class 12|class xii|higher secondary|hsc)[^.\n]*?(\d{2,3,4}\/\d{2,3,4})"
-    ]
-    for p in patterns:
-        m = re.search(p, text, re.IGNORECASE)
+    if not scan.any(_CLASS12_KEYWORDS):
+        return None
+    for p in _CLASS12_PATTERNS:
+        m = p.search(text)
         if m:
             return m.group(1).strip()
 
     # Fallback: any percentage mentioned with "12th" nearby in the same line
-    line_pattern = r".*(12th|class 12|class xii|higher secondary|hsc).*\n?"
-    for line_match in re.finditer(line_pattern, text, re.IGNORECASE):
-        line = line_match.group(0)
-        perc = re.search(r"(\d{2,3}(?:\.\d+)?)\s*%", line)
+    for line_match in _CLASS12_LINE_PATTERN.finditer(text):
+        perc = _PERCENT_PATTERN.search(line_match.group(0))
         if perc:
             return perc.group(1).strip() + "%"
 
     return None
 
 
-def extract_info_from_text(text: str) -> Dict[str, Any]:
+# Confidence of a regex-extracted field, by how it was matched. Values at or
+# above the bypass threshold are trusted without a second opinion from the LLM.
+_CONFIDENCE_EXPLICIT = 0.9      # anchored on an explicit cue ("my name is", "cgpa", "lakh")
+_CONFIDENCE_KEYWORD = 0.8       # keyword/alias lookup
+_CONFIDENCE_INFERRED = 0.7      # inferred from indirect cues
+_CONFIDENCE_GUESS = 0.4         # loose fallback match
+
+
+def _degree_confidence(match: "re.Match", text: str) -> float:
+    # Short alternatives ("ba", "be") also match inside ordinary words like "database"
+    value = match.group(1)
+    if len(value.replace(".", "")) <= 3:
+        before = text[match.start(1) - 1] if match.start(1) > 0 else " "
+        after = text[match.end(1)] if match.end(1) < len(text) else " "
+        if before.isalnum() or after.isalnum():
+            return _CONFIDENCE_GUESS - 0.2
+        return _CONFIDENCE_INFERRED
+    return _CONFIDENCE_KEYWORD
+
+
+def extract_info_with_confidence(text: str) -> Tuple[Dict[str, Any], Dict[str, float]]:
     """
     Heuristic, non-LLM extractor from free text.
     This is intentionally *best-effort* and does NOT try to be complete.
     Missing fields are simply omitted; downstream logic can still use raw text.
+
+    Returns the extracted fields and a 0..1 confidence per extracted field.
     """
     info: Dict[str, Any] = {}
+    confidence: Dict[str, float] = {}
+    lowered = text.lower()
+    scan = _Scan(text)
 
     # Basic fields via regex or keywords
-    name_match = re.search(
-        r"\b(?:my name is)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
-        text,
-        re.IGNORECASE
-    )
-    if name_match:
-        info["student_name"] = name_match.group(1).strip()
+    if "my name is" in lowered:
+        name_match = _NAME_PATTERN.search(text)
+        if name_match:
+            info["student_name"] = name_match.group(1).strip()
+            confidence["student_name"] = _CONFIDENCE_EXPLICIT
 
-    degree_match = re.search(
-        r"(b\.tech|btech|engineering|bachelor|bachelors|bsc|b\.?e\.?|ba|bcom|bca|computer science|information technology|mechanical|civil)",
-        text,
-        re.IGNORECASE
-    )
+    degree_match = _DEGREE_PATTERN.search(text)
     if degree_match:
         info["current_degree"] = degree_match.group(1).strip()
+        confidence["current_degree"] = _degree_confidence(degree_match, text)
 
     # Year (grad / passing / exam year) – still best-effort
-    year_match = re.search(
-        r"(?:graduat|finish|complete|passed out|year)\s*(?:in|year)?\s*(\d{4}|\d{2})",
-        text,
-        re.IGNORECASE
-    )
+    # Fallback to any 4-digit year
+    year_match = _YEAR_PATTERN.search(text)
+    year_confidence = _CONFIDENCE_KEYWORD
     if not year_match:
-        # Fallback to any 4-digit year
-        year_match = re.search(r"\b(\d{4})\b", text)
+        year_match = _ANY_YEAR_PATTERN.search(text)
+        year_confidence = _CONFIDENCE_GUESS
     if year_match:
         year = year_match.group(1).strip()
         if len(year) == 2:
             year = "20" + year  # Assume 20xx
         info["graduation_year"] = year
+        confidence["graduation_year"] = year_confidence
 
-    cgpa_match = re.search(r"cgpa\s*(?:is|:|of)?\s*([\d.]+(?:\s*/\s*\d+(?:\.\d+)?)?)", text, re.IGNORECASE)
-    if cgpa_match:
-        info["cgpa"] = cgpa_match.group(1).strip()
+    if "cgpa" in lowered:
+        cgpa_match = _CGPA_PATTERN.search(text)
+        if cgpa_match:
+            info["cgpa"] = cgpa_match.group(1).strip()
+            confidence["cgpa"] = _CONFIDENCE_EXPLICIT
 
     # Career goal
-    goal_match = re.search(
-        r"(?:goal|want|aspire|aim|plan)\s*(?:to\s+)?(?:be|become|pursue)?\s*(?:a\s+)?(\w+(?:\s+\w+)*?\s*(?:engineer|scientist|developer|researcher|specialist|expert|manager|analyst))",
-        text,
-        re.IGNORECASE
-    )
+    goal_match = _GOAL_PATTERN.search(text)
     if goal_match:
-        info["career_goal"] = goal_match.group(1).strip()
+        goal = goal_match.group(1).strip()
+        info["career_goal"] = goal
+        # The lazy prefix can swallow unrelated words before the role noun
+        confidence["career_goal"] = _CONFIDENCE_KEYWORD if len(goal.split()) <= 4 else _CONFIDENCE_GUESS
 
     # Budget – keep as free text: "20 lakhs", "15-20 lakhs", etc.
-    budget_match = re.search(r"(\d{1,3}\s*lakhs?)", text, re.IGNORECASE)
-    if budget_match:
-        info["budget"] = budget_match.group(1).strip()
+    if "lakh" in lowered:
+        budget_match = _BUDGET_PATTERN.search(text)
+        if budget_match:
+            info["budget"] = budget_match.group(1).strip()
+            confidence["budget"] = _CONFIDENCE_EXPLICIT
 
     # Preferred locations / countries (very simple)
-    countries_match = re.findall(
-        r"\b(US|USA|Canada|Germany|UK|United Kingdom|Australia|France|Singapore|Netherlands|Ireland|India)\b",
-        text,
-        re.IGNORECASE
-    )
-    if countries_match:
-        cleaned = []
-        for c in countries_match:
-            c = c.strip()
-            if not c:
-                continue
-            c_up = c.upper()
-            if c_up == "US":
-                c_norm = "USA"
-            elif c_up == "UK":
-                c_norm = "United Kingdom"
-            else:
-                c_norm = c.title()
-            if c_norm not in cleaned:
-                cleaned.append(c_norm)
-        info["preferred_locations"] = cleaned
+    if scan.countries:
+        info["preferred_locations"] = list(scan.countries)
+        confidence["preferred_locations"] = _CONFIDENCE_KEYWORD
 
     # Specialization – broadened with AI/ML/Data Science, etc.
-    spec_match = re.search(
-        r"(?:speciali[sz]e?|specialization|field|major|focus)\s*(?:in\s+)?((?:ai|ml|machine learning|computer science|cs|data science|data analytics|software engineering|mechanical engineering|civil engineering|electronics|ece))",
-        text,
-        re.IGNORECASE
-    )
+    spec_match = _SPEC_PATTERN.search(text)
     if spec_match:
         spec = spec_match.group(1).strip()
-        lower = spec.lower()
-        if lower in {"ml", "machine learning"}:
-            spec = "Machine Learning"
-        elif lower in {"ai"}:
-            spec = "Artificial Intelligence"
-        elif lower in {"cs", "computer science"}:
-            spec = "Computer Science"
-        elif lower in {"ece", "electronics"}:
-            spec = "Electronics and Communication"
-        info["specialization"] = spec
-
-    # NEW: Academic level (high_school / undergraduate / postgraduate / working_professional)
-    academic_level = _infer_academic_level_from_text(text)
+        info["specialization"] = _SPEC_ALIASES.get(spec.lower(), spec)
+        confidence["specialization"] = _CONFIDENCE_KEYWORD
+
+    # Academic level (high_school / undergraduate / postgraduate / working_professional)
+    academic_level = _infer_academic_level_from_text(scan)
     if academic_level:
         info["academic_level"] = academic_level
+        confidence["academic_level"] = _CONFIDENCE_INFERRED
 
-    # NEW: Board and Class 12 score (for high-school students)
-    board = _extract_board(text)
+    # Board and Class 12 score (for high-school students)
+    board = _extract_board(scan)
     if board:
         info["board"] = board
+        confidence["board"] = _CONFIDENCE_EXPLICIT
 
-    class12_score = _extract_class12_score(text)
+    class12_score = _extract_class12_score(text, scan)
     if class12_score:
         info["class12_score"] = class12_score
+        confidence["class12_score"] = _CONFIDENCE_KEYWORD
 
-    # NEW: Competitive exams (JEE, NEET, SAT, etc.)
-    exams = _extract_competitive_exams(text)
+    # Competitive exams (JEE, NEET, SAT, etc.)
+    exams = _extract_competitive_exams(text, scan)
     if exams:
         info["competitive_exams"] = exams
+        confidence["competitive_exams"] = _CONFIDENCE_KEYWORD
+
+    return info, confidence
+
+
+def extract_info_from_text(text: str) -> Dict[str, Any]:
+    """Best-effort regex extraction; see `extract_info_with_confidence`."""
+    return extract_info_with_confidence(text)[0]
 
-    return info
+
+def extract_info_from_texts(texts: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Batch form of `extract_info_from_text`; lazily yields one profile per input text."""
+    for text in texts:
+        yield extract_info_from_text(text)
 
 
 def clean_user_pref_locations(value: Any) -> Optional[List[str]]:
@@ -301,3 +449,26 @@ def validate_profile_completeness(profile: Dict[str, Any]) -> Dict[str, str]:
             missing_fields[field] = question
 
     return missing_fields
+
+
+def assess_regex_extraction(
+    profile: Dict[str, Any], confidence: Dict[str, float], threshold: float
+) -> Dict[str, Any]:
+    """
+    Decide whether a regex-extracted profile is good enough to skip the LLM.
+
+    It is sufficient when `validate_profile_completeness` finds nothing missing
+    for the profile's academic level and every required field was extracted
+    with at least `threshold` confidence.
+    """
+    missing = validate_profile_completeness(profile)
+    # Every field required at this academic level, i.e. what an empty profile would miss
+    required = validate_profile_completeness({"academic_level": profile.get("academic_level")})
+    low_confidence = sorted(
+        f for f in required if f not in missing and confidence.get(f, 0.0) < threshold
+    )
+    return {
+        "sufficient": not missing and not low_confidence,
+        "missing_fields": sorted(missing),
+        "low_confidence_fields": low_confidence,
+    }